@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import DashboardStatsView
+from .views import DashboardStatsView, CatalogCacheStatsView
 
 urlpatterns = [
     path('dashboard-stats/', DashboardStatsView.as_view(), name='dashboard-stats'),
+    path('cache-stats/', CatalogCacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
@@ -6,6 +6,7 @@ from django.utils import timezone
 from datetime import timedelta
 from orders.models import Order
 from products.models import Product
+from products.cache import get_cache_stats
 from users.models import User
 
 
@@ -39,4 +40,12 @@ class DashboardStatsView(APIView):
             'pending_orders': pending_orders,
             'total_products': total_products,
             'total_customers': total_customers,
-        })
\ No newline at end of file
+        })
+
+
+class CatalogCacheStatsView(APIView):
+    """Aciertos y fallos de las respuestas cacheadas del catálogo"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(get_cache_stats())
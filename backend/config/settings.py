@@ -17,6 +17,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Búsqueda de texto completo y trigramas
 
     # Third party
     'rest_framework',
@@ -87,6 +88,41 @@ CHANNEL_LAYERS = {
     },
 }
 
+# CACHE
+# Redis compartido entre procesos (contadores, caché de catálogo); en
+# desarrollo se usa memoria local por proceso
+if config('USE_REDIS_CACHE', default=False, cast=bool):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': f'redis://{REDIS_HOST}:{REDIS_PORT}/1',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Worker id (0-1023) para los números de orden; sin valor se asigna con un
+# contador en caché al iniciar cada proceso (ver orders/numbers.py)
+ORDER_NUMBER_WORKER_ID = config('ORDER_NUMBER_WORKER_ID', default=None)
+
+# Procesar los comprobantes de pago en un hilo del proceso tras la subida;
+# con False se procesan en la misma petición (ver orders/proofs.py)
+PAYMENT_PROOF_ASYNC = config('PAYMENT_PROOF_ASYNC', default=True, cast=bool)
+
+# Despachar el outbox de notificaciones en un hilo del proceso al confirmar
+# cada transacción; con False se despacha en la misma petición. El comando
+# dispatch_notifications --loop puede correr como worker dedicado
+NOTIFICATION_OUTBOX_ASYNC = config('NOTIFICATION_OUTBOX_ASYNC', default=True, cast=bool)
+
+# Aplicar las vistas acumuladas de productos en un hilo del proceso; con False
+# se aplican en la misma petición (ver products/counters.py)
+PRODUCT_VIEWS_FLUSH_ASYNC = config('PRODUCT_VIEWS_FLUSH_ASYNC', default=True, cast=bool)
+
 # DATABASE
 DATABASES = {
     # 'default': {
@@ -137,7 +173,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.HybridPagination',  # ?pagination=cursor para keyset
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -148,11 +184,15 @@ REST_FRAMEWORK = {
 }
 
 # CORS (para desarrollo)
+from corsheaders.defaults import default_headers
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
     'http://127.0.0.1:3000',
 ]
 
+# Cabecera para reintentos seguros de POST (ver core/idempotency.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 # CUSTOM USER MODEL (lo configuraremos después)
 AUTH_USER_MODEL = 'users.User'
 
@@ -7,7 +7,7 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 from products.views import CategoryViewSet, BrandViewSet, ProductViewSet, ReviewViewSet
-from orders.views import CartViewSet, OrderViewSet, ShippingZoneViewSet, PaymentMethodViewSet, calculate_shipping, payment_methods_list
+from orders.views import CartViewSet, OrderViewSet, ShippingZoneViewSet, PaymentMethodViewSet, calculate_shipping, calculate_shipping_batch, payment_methods_list
 from users.views import LoginView
 from permissions.views import RoleViewSet, PermissionViewSet, UserRoleViewSet, PermissionLogViewSet
 from coupons.views import CouponViewSet, CouponUsageViewSet
@@ -55,6 +55,7 @@ urlpatterns = [
     
     # Shipping
     path('api/calculate-shipping/', calculate_shipping, name='calculate-shipping'),
+    path('api/calculate-shipping/batch/', calculate_shipping_batch, name='calculate-shipping-batch'),
 
     # Payment Methods
     path('api/payment-methods/', payment_methods_list, name='payment-methods'),
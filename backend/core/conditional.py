@@ -0,0 +1,47 @@
+"""
+GET condicional (ETag / Last-Modified) para endpoints de detalle
+
+La vista calcula los validadores con una consulta liviana (id, updated_at)
+más las versiones de caché de lo que el detalle incluye, y responde
+304 Not Modified antes de cargar relaciones y serializar.
+"""
+
+import hashlib
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """ETag fuerte a partir de las partes que determinan la representación"""
+    raw = ':'.join(str(part) for part in parts)
+    return '"{}"'.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def check_not_modified(request, etag, last_modified=None, private=False):
+    """
+    Respuesta 304 si el cliente ya tiene esta versión, si no None.
+    If-None-Match tiene prioridad sobre If-Modified-Since.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None and response.status_code == 304:
+        set_validators(response, etag, last_modified, private)
+        return response
+    return None
+
+
+def set_validators(response, etag, last_modified=None, private=False):
+    """Agregar ETag/Last-Modified y obligar a revalidar antes de reutilizar"""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    if private:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
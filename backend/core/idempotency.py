@@ -0,0 +1,129 @@
+"""
+Soporte de la cabecera Idempotency-Key en endpoints POST
+
+Con la cabecera, la vista corre dentro de una transacción que primero
+inserta la clave (usuario, endpoint, clave). La primera petición guarda el
+código y el cuerpo de su respuesta antes de confirmar; un reintento con la
+misma clave devuelve esa respuesta sin volver a ejecutar la vista.
+
+Dos duplicados simultáneos no compiten: el INSERT del segundo espera en el
+índice único hasta que la primera transacción confirme, y entonces lee la
+respuesta guardada. Si la primera falla (excepción), su fila se revierte y
+el reintento se procesa como nuevo.
+
+Reusar una clave con otro contenido devuelve 422. Las claves vencen a las
+IDEMPOTENCY_TTL y se purgan con el comando purge_idempotency_keys.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request):
+    """Hash del cuerpo de la petición (los archivos cuentan por nombre, tamaño y contenido)"""
+    digest = hashlib.sha256()
+    data = {
+        name: request.data.getlist(name) if hasattr(request.data, 'getlist') else request.data[name]
+        for name in request.data
+        if name not in request.FILES
+    }
+    digest.update(json.dumps(data, sort_keys=True, cls=JSONEncoder).encode())
+    for name in sorted(request.FILES):
+        for upload in request.FILES.getlist(name):
+            digest.update(f'{name}:{upload.name}:{upload.size}'.encode())
+            for chunk in upload.chunks():
+                digest.update(chunk)
+            upload.seek(0)
+    return digest.hexdigest()
+
+
+def claim_key(request, scope, key, fingerprint):
+    """
+    Insertar la clave o, si ya existe, devolver la fila existente.
+    Devuelve (registro, creado)
+    """
+    now = timezone.now()
+    lookup = {'user': request.user, 'scope': scope, 'key': key}
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                **lookup, fingerprint=fingerprint, expires_at=now + IDEMPOTENCY_TTL
+            ), True
+    except IntegrityError:
+        record = IdempotencyKey.objects.select_for_update().get(**lookup)
+
+    if record.expires_at <= now:
+        # Vencida: se reutiliza como si fuera nueva
+        record.fingerprint = fingerprint
+        record.status_code = None
+        record.response_body = None
+        record.expires_at = now + IDEMPOTENCY_TTL
+        record.save()
+        return record, True
+    return record, False
+
+
+def replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {'error': f'La cabecera {HEADER} ya se usó con otro contenido'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record.status_code is None:
+        # Solo posible si el motor no bloquea el índice único (la otra petición sigue en curso)
+        return Response(
+            {'error': 'Hay una petición con la misma clave en proceso'},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response(record.response_body, status=record.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(scope):
+    """Decorador para acciones POST de un ViewSet"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return view(self, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'{HEADER} no puede superar {MAX_KEY_LENGTH} caracteres'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            fingerprint = request_fingerprint(request)
+            with transaction.atomic():
+                record, created = claim_key(request, scope, key, fingerprint)
+                if not created:
+                    return replay(record, fingerprint)
+
+                response = view(self, request, *args, **kwargs)
+                if response.status_code >= 500:
+                    # No guardar errores del servidor: el reintento debe poder ejecutarse
+                    transaction.set_rollback(True)
+                    return response
+
+                record.status_code = response.status_code
+                record.response_body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+                record.save(update_fields=['status_code', 'response_body'])
+                return response
+        return wrapper
+    return decorator
+
+
+def purge_expired_keys(now=None):
+    """Borrar claves vencidas. Devuelve cuántas"""
+    return IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
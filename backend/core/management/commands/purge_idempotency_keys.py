@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Borrar las claves de idempotencia vencidas'
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f'✅ {deleted} claves borradas'))
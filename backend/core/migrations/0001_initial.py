@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=100, verbose_name='Endpoint')),
+                ('key', models.CharField(max_length=255, verbose_name='Clave')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Huella de la petición')),
+                ('status_code', models.PositiveSmallIntegerField(null=True, verbose_name='Código de respuesta')),
+                ('response_body', models.JSONField(null=True, verbose_name='Respuesta')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(verbose_name='Vence')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Clave de idempotencia',
+                'verbose_name_plural': 'Claves de idempotencia',
+                'indexes': [models.Index(fields=['expires_at'], name='core_idempo_expires_6bf43d_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'scope', 'key'), name='core_idempotency_key_unique')],
+            },
+        ),
+    ]
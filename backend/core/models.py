@@ -1,3 +1,34 @@
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+
+class IdempotencyKey(models.Model):
+    """
+    Respuesta guardada de un POST con cabecera Idempotency-Key.
+    Mientras la primera petición se procesa, la fila queda bloqueada por su
+    transacción y los duplicados concurrentes esperan (ver idempotency.py).
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys')
+    scope = models.CharField('Endpoint', max_length=100)
+    key = models.CharField('Clave', max_length=255)
+    fingerprint = models.CharField('Huella de la petición', max_length=64)
+
+    status_code = models.PositiveSmallIntegerField('Código de respuesta', null=True)
+    response_body = models.JSONField('Respuesta', null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField('Vence')
+
+    class Meta:
+        verbose_name = 'Clave de idempotencia'
+        verbose_name_plural = 'Claves de idempotencia'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='core_idempotency_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
@@ -0,0 +1,168 @@
+"""
+Paginación compartida de la API
+
+HybridPagination mantiene el comportamiento por defecto (PageNumberPagination
+con count) y permite a cada request optar por paginación por cursor (keyset)
+con ?pagination=cursor o enviando ?cursor=...
+
+En modo cursor la página siguiente se obtiene con un WHERE sobre
+(campo de orden, id) en lugar de OFFSET, por lo que el costo no crece con la
+profundidad, y no se ejecuta COUNT(*) salvo que se pida ?with_count=true.
+"""
+
+import base64
+import json
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class HybridPagination(PageNumberPagination):
+    """Paginación por número de página con modo cursor opcional"""
+
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'with_count'
+
+    # Campos por los que se puede paginar con cursor; la vista puede
+    # restringirlos con el atributo cursor_ordering_fields
+    cursor_ordering_fields = ('created_at',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.is_cursor_request(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+
+        field, descending = self.get_keyset_ordering(queryset, view)
+        self.key_field = field
+        self.descending = descending
+
+        queryset = queryset.order_by(*self.get_order_by(field, descending))
+
+        if self.wants_count(request):
+            self.count = queryset.count()
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(field, descending, position))
+
+        # Pedir un registro extra para saber si hay página siguiente
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page_results = results[:self.page_size]
+        return self.page_results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+
+        payload = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
+
+    def get_next_link(self):
+        if not getattr(self, 'cursor_mode', False):
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+
+        last = self.page_results[-1]
+        cursor = self.encode_cursor(getattr(last, self.key_field), last.pk)
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count']['description'] = (
+            'Solo en modo página, o en modo cursor con with_count=true'
+        )
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Usar "cursor" para paginación keyset sin COUNT(*)',
+                'schema': {'type': 'string', 'enum': ['page', 'cursor']},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor devuelto en el campo next',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Incluir count en modo cursor',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+        return parameters
+
+    # Helpers del modo cursor
+
+    def is_cursor_request(self, request):
+        if request.query_params.get(self.cursor_query_param):
+            return True
+        return request.query_params.get(self.mode_query_param) == 'cursor'
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true')
+
+    def get_keyset_ordering(self, queryset, view):
+        """Obtener el campo de orden principal y su dirección"""
+        allowed = getattr(view, 'cursor_ordering_fields', self.cursor_ordering_fields)
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        first = ordering[0] if ordering else '-created_at'
+
+        if not isinstance(first, str):
+            raise ValidationError({'pagination': 'Este orden no admite paginación por cursor'})
+
+        descending = first.startswith('-')
+        field = first.lstrip('-')
+        if field not in allowed:
+            raise ValidationError({
+                'pagination': f'La paginación por cursor solo admite ordenar por: {", ".join(allowed)}'
+            })
+        return field, descending
+
+    def get_order_by(self, field, descending):
+        prefix = '-' if descending else ''
+        return [f'{prefix}{field}', f'{prefix}id']
+
+    def get_keyset_filter(self, field, descending, position):
+        """WHERE (field, id) < / > (valor, id) expresado con Q"""
+        value, pk = position
+        op = 'lt' if descending else 'gt'
+        return Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk})
+
+    def encode_cursor(self, value, pk):
+        raw = json.dumps([str(value) if value is not None else None, pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padding = '=' * (-len(encoded) % 4)
+            value, pk = json.loads(base64.urlsafe_b64decode(encoded + padding).decode())
+            value = model._meta.get_field(self.key_field).to_python(value)
+            return value, int(pk)
+        except (ValueError, TypeError, DjangoValidationError):
+            raise NotFound('Cursor inválido')
@@ -1,3 +1,64 @@
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from products.models import Category, Product
 
-# Create your tests here.
+
+class HybridPaginationTests(APITestCase):
+    """Paginación por cursor opcional sobre el listado de productos"""
+
+    def setUp(self):
+        category = Category.objects.create(name='General')
+        for index in range(45):
+            Product.objects.create(
+                name=f'Producto {index}',
+                sku=f'SKU-{index}',
+                description='Descripción',
+                category=category,
+                price=10 + (index % 7),
+            )
+
+    def collect(self, params):
+        ids = []
+        response = self.client.get('/api/products/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            ids.extend(product['id'] for product in response.data['results'])
+            if not response.data['next']:
+                return ids, response
+            response = self.client.get(response.data['next'])
+
+    def test_page_number_is_default(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.data['count'], 45)
+        self.assertIn('previous', response.data)
+
+    def test_cursor_walks_all_rows_without_count(self):
+        ids, response = self.collect({'pagination': 'cursor'})
+        self.assertEqual(len(ids), 45)
+        self.assertEqual(len(set(ids)), 45)
+        self.assertNotIn('count', response.data)
+
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_with_price_ordering_and_ties(self):
+        ids, _ = self.collect({'pagination': 'cursor', 'ordering': 'price'})
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_skips_count_query(self):
+        with CaptureQueriesContext(connection) as context:
+            self.client.get('/api/products/', {'pagination': 'cursor'})
+        self.assertFalse(any('"__count"' in query['sql'] for query in context.captured_queries))
+
+        response = self.client.get('/api/products/', {'pagination': 'cursor', 'with_count': 'true'})
+        self.assertEqual(response.data['count'], 45)
+
+    def test_cursor_rejects_unsupported_ordering(self):
+        response = self.client.get('/api/products/', {'pagination': 'cursor', 'ordering': 'name'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,14 @@
+"""
+Normalización de texto compartida entre apps
+
+Quita tildes y pasa a minúsculas, igual que f_unaccent(lower()) en
+PostgreSQL, para comparar nombres y departamentos escritos a mano.
+"""
+
+import unicodedata
+
+
+def normalize(text):
+    """Minúsculas y sin tildes ("Cámara" -> "camara")"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
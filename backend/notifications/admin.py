@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Notification
+from django.utils import timezone
+from .models import Notification, NotificationOutbox
 
 
 @admin.register(Notification)
@@ -33,3 +34,20 @@ class NotificationAdmin(admin.ModelAdmin):
             return qs
         # Los staff solo ven sus propias notificaciones
         return qs.filter(user=request.user)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event', 'status', 'attempts', 'available_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'event')
+    readonly_fields = ('event', 'payload', 'status', 'attempts', 'available_at', 'last_error', 'deliveries', 'created_at', 'sent_at')
+    date_hierarchy = 'created_at'
+    actions = ['retry']
+
+    @admin.action(description='Reintentar eventos fallidos')
+    def retry(self, request, queryset):
+        updated = queryset.filter(status='failed').update(status='pending', attempts=0, available_at=timezone.now())
+        self.message_user(request, f'{updated} eventos vuelven a la cola')
+
+    def has_add_permission(self, request):
+        return False
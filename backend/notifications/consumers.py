@@ -1,8 +1,10 @@
 import json
+from datetime import datetime
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from asgiref.sync import sync_to_async
+from .wire import Raw, encode_items, frame, with_state
 import logging
 
 logger = logging.getLogger(__name__)
@@ -27,6 +29,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             
+            # Broadcasts: un solo mensaje para todos los conectados
+            self.public_group_name = 'notifications_public'
+            await self.channel_layer.group_add(
+                self.public_group_name,
+                self.channel_name
+            )
+            
             # Si es admin, añadir al grupo de admins
             if await self.is_admin():
                 self.admin_group_name = 'notifications_admins'
@@ -68,6 +77,12 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
         
+        if hasattr(self, 'public_group_name'):
+            await self.channel_layer.group_discard(
+                self.public_group_name,
+                self.channel_name
+            )
+        
         # Si es admin, remover del grupo de admins
         if hasattr(self, 'admin_group_name'):
             await self.channel_layer.group_discard(
@@ -133,18 +148,29 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     # Métodos para recibir mensajes del channel layer
     async def notification_message(self, event):
         """Manejar mensaje de notificación enviado desde el channel layer"""
-        # Enviar mensaje al WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'notification',
-            'notification': event['notification']
-        }))
+        # Enviar mensaje al WebSocket (ya codificado en utils; 'notification' para mensajes manuales)
+        if 'wire' in event:
+            await self.send(text_data=frame('notification', notification=Raw(event['wire'])))
+            return
+        await self.send(text_data=frame('notification', notification=event['notification']))
+
+    async def bulk_notification_message(self, event):
+        """Notificación en lote (send_bulk_notification): usar el id de la fila de este usuario"""
+        notification_id = event['recipients'].get(str(self.user.id))
+        if notification_id is None:
+            return
+        await self.send(text_data=frame(
+            'notification', notification=Raw(with_state(event['body'], notification_id))
+        ))
 
     async def broadcast_message(self, event):
-        """Manejar mensaje broadcast"""
-        await self.send(text_data=json.dumps({
-            'type': 'broadcast',
-            'message': event['message']
-        }))
+        """Manejar mensaje broadcast (los usuarios lo reciben como una notificación más)"""
+        if self.user.is_authenticated:
+            if not self.accepts_broadcast(event['created_at']):
+                return
+            await self.send(text_data=frame('notification', notification=Raw(event['wire'])))
+            return
+        await self.send(text_data=frame('broadcast', message=Raw(event['wire'])))
 
     # Métodos auxiliares con acceso a base de datos
     @database_sync_to_async
@@ -152,115 +178,62 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         """Verificar si el usuario es admin"""
         return self.user.is_staff or self.user.is_superuser
 
+    def accepts_broadcast(self, created_at):
+        """Los broadcasts anteriores al registro del usuario no le corresponden"""
+        return datetime.fromisoformat(created_at) >= self.user.date_joined
+
     @database_sync_to_async
     def get_unread_count(self):
         """Obtener cantidad de notificaciones no leídas"""
-        from .models import Notification
-        return Notification.objects.filter(
-            user=self.user,
-            read=False
-        ).count()
+        from .counters import unread_count
+        return unread_count(self.user)
 
     @database_sync_to_async
     def mark_notification_as_read(self, notification_id):
         """Marcar una notificación como leída"""
-        from .models import Notification
-        try:
-            notification = Notification.objects.get(
-                id=notification_id,
-                user=self.user
-            )
-            notification.mark_as_read()
-            return True
-        except Notification.DoesNotExist:
+        from .inbox import mark_read, visible_to
+        notification = visible_to(self.user).filter(id=notification_id).first()
+        if notification is None:
             return False
+        return mark_read(self.user, notification)
 
     @database_sync_to_async
     def mark_all_notifications_as_read(self):
         """Marcar todas las notificaciones como leídas"""
-        from .models import Notification
-        from django.utils import timezone
-        
-        updated = Notification.objects.filter(
-            user=self.user,
-            read=False
-        ).update(
-            read=True,
-            read_at=timezone.now()
-        )
-        return updated
+        from .inbox import mark_all_read
+        return mark_all_read(self.user)
 
     @database_sync_to_async
     def get_unread_notifications(self):
         """Obtener notificaciones no leídas"""
-        from .models import Notification
-        from .serializers import NotificationSerializer
+        from .inbox import unread_for
         
-        notifications = Notification.objects.filter(
-            user=self.user,
-            read=False
-        ).order_by('-created_at')[:20]
+        notifications = list(unread_for(self.user).order_by('-created_at')[:20])
         
-        # Serializar las notificaciones
-        serialized = []
-        for notification in notifications:
-            serialized.append({
-                'id': notification.id,
-                'type': notification.type,
-                'title': notification.title,
-                'message': notification.message,
-                'icon': notification.type_icon,
-                'priority': notification.priority,
-                'priority_color': notification.priority_color,
-                'action_url': notification.action_url,
-                'created_at': notification.created_at.isoformat(),
-                'read': notification.read
-            })
-        
-        return serialized
+        # Bodies desde la caché (ver wire.py); solo se agrega la lectura del usuario
+        return encode_items(notifications)
 
     async def send_unread_notifications(self):
         """Enviar notificaciones no leídas al conectarse"""
         notifications = await self.get_unread_notifications()
         count = await self.get_unread_count()
         
-        await self.send(text_data=json.dumps({
-            'type': 'initial_notifications',
-            'notifications': notifications,
-            'unread_count': count
-        }))
+        await self.send(text_data=frame(
+            'initial_notifications', notifications=Raw(notifications), unread_count=count
+        ))
 
     @database_sync_to_async
     def get_paginated_notifications(self, page, limit):
         """Obtener notificaciones paginadas"""
-        from .models import Notification
+        from .inbox import visible_to
         
         offset = (page - 1) * limit
-        notifications = Notification.objects.filter(
-            user=self.user
-        ).order_by('-created_at')[offset:offset + limit]
+        notifications = list(visible_to(self.user).order_by('-created_at')[offset:offset + limit])
         
-        # Serializar
-        serialized = []
-        for notification in notifications:
-            serialized.append({
-                'id': notification.id,
-                'type': notification.type,
-                'title': notification.title,
-                'message': notification.message,
-                'icon': notification.type_icon,
-                'priority': notification.priority,
-                'priority_color': notification.priority_color,
-                'action_url': notification.action_url,
-                'created_at': notification.created_at.isoformat(),
-                'read': notification.read,
-                'read_at': notification.read_at.isoformat() if notification.read_at else None
-            })
-        
-        total = Notification.objects.filter(user=self.user).count()
+        total = visible_to(self.user).count()
         
         return {
-            'notifications': serialized,
+            'notifications': Raw(encode_items(notifications)),
             'page': page,
             'limit': limit,
             'total': total,
@@ -271,7 +244,4 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         """Enviar notificaciones paginadas"""
         data = await self.get_paginated_notifications(page, limit)
         
-        await self.send(text_data=json.dumps({
-            'type': 'notifications_page',
-            **data
-        }))
+        await self.send(text_data=frame('notifications_page', **data))
@@ -0,0 +1,105 @@
+"""
+Contadores de no leídas en caché
+
+unread_count(user) lee el contador de la caché; solo si falta (primera
+lectura, expiró o se invalidó) cuenta en la base con inbox.unread_for y lo
+guarda. Las escrituras lo mantienen:
+- crear notificaciones: +1 por usuario (al confirmar la transacción)
+- leer o descartar una no leída: -1
+- leer todo o limpiar: 0
+- editar por la API: se invalida (se recuenta en la próxima lectura)
+
+Los broadcasts suman a la vez a todos los usuarios, así que en lugar de
+tocar un contador por usuario se incrementa BROADCAST_VERSION_KEY, que
+forma parte de la clave: los contadores anteriores quedan huérfanos y cada
+usuario recuenta una vez.
+
+Las claves expiran a los UNREAD_TTL segundos; así cualquier desvío (un
+incremento perdido, un broadcast que venció) se corrige solo al recontar.
+El comando reconcile_unread_counts recuenta a los usuarios con actividad
+reciente sin esperar la expiración.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+
+UNREAD_KEY = 'notifications_unread:{}:{}'
+BROADCAST_VERSION_KEY = 'notifications_broadcast_version'
+
+# Reconciliación con la base (segundos)
+UNREAD_TTL = 60 * 60
+
+
+def broadcast_version():
+    version = cache.get(BROADCAST_VERSION_KEY)
+    if version is None:
+        cache.add(BROADCAST_VERSION_KEY, 1, timeout=None)
+        version = cache.get(BROADCAST_VERSION_KEY, 1)
+    return version
+
+
+def bump_broadcast_version():
+    """Un broadcast nuevo: todos los contadores se recuentan"""
+    try:
+        cache.incr(BROADCAST_VERSION_KEY)
+    except ValueError:
+        cache.set(BROADCAST_VERSION_KEY, 2, timeout=None)
+
+
+def unread_key(user_id, version=None):
+    return UNREAD_KEY.format(version or broadcast_version(), user_id)
+
+
+def count_from_db(user):
+    from .inbox import unread_for
+    return unread_for(user).count()
+
+
+def unread_count(user):
+    """No leídas del usuario (propias y broadcasts)"""
+    key = unread_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = count_from_db(user)
+        cache.add(key, count, timeout=UNREAD_TTL)
+    return count
+
+
+def adjust(user_ids, delta):
+    """Sumar delta a los contadores existentes (los que faltan se recuentan al leerse)"""
+    version = broadcast_version()
+    for user_id in user_ids:
+        key = unread_key(user_id, version)
+        try:
+            if cache.incr(key, delta) < 0:
+                cache.delete(key)
+        except ValueError:
+            pass
+
+
+def incr_unread(user_ids):
+    """Notificaciones nuevas; se cuentan al confirmar la transacción que las creó"""
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if user_ids:
+        transaction.on_commit(lambda: adjust(user_ids, 1))
+
+
+def decr_unread(user_id):
+    transaction.on_commit(lambda: adjust([user_id], -1))
+
+
+def reset_unread(user_id):
+    """Todo leído o limpiado"""
+    transaction.on_commit(lambda: cache.set(unread_key(user_id), 0, timeout=UNREAD_TTL))
+
+
+def invalidate_unread(user_id):
+    transaction.on_commit(lambda: cache.delete(unread_key(user_id)))
+
+
+def reconcile(users):
+    """Recontar en la base y guardar los contadores. Devuelve cuántos"""
+    version = broadcast_version()
+    counts = {unread_key(user.pk, version): count_from_db(user) for user in users}
+    cache.set_many(counts, timeout=UNREAD_TTL)
+    return len(counts)
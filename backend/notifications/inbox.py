@@ -0,0 +1,115 @@
+"""
+Bandeja de cada usuario: sus notificaciones más los broadcasts
+
+Un broadcast se guarda una sola vez (user=None, is_broadcast=True) y se
+envía una vez al grupo notifications_public. Cada usuario lo ve si se creó
+después de su registro, no venció y no lo descartó. Leerlo o descartarlo
+crea su NotificationReceipt; quien nunca lo tocó no tiene fila.
+
+visible_to() une ambas fuentes en una consulta y anota receipt_read_at, que
+Notification.is_read / user_read_at usan para los broadcasts. Las acciones
+(leer, leer todo, descartar, limpiar) escriben en Notification para las
+propias y en NotificationReceipt para los broadcasts, y mantienen los
+contadores de no leídas (notifications/counters.py).
+"""
+
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+from .counters import decr_unread, reset_unread
+from .models import Notification, NotificationReceipt
+
+
+def receipts(user):
+    return NotificationReceipt.objects.filter(user=user, notification=OuterRef('pk'))
+
+
+def broadcasts_for(user, now=None):
+    """Condición de los broadcasts que le corresponden al usuario"""
+    now = now or timezone.now()
+    return (
+        Q(is_broadcast=True, created_at__gte=user.date_joined)
+        & (Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        & ~Q(Exists(receipts(user).filter(dismissed_at__isnull=False)))
+    )
+
+
+def visible_to(user):
+    """Notificaciones propias y broadcasts vigentes, con la lectura del usuario anotada"""
+    return Notification.objects.filter(Q(user=user) | broadcasts_for(user)).annotate(
+        receipt_read_at=Subquery(receipts(user).values('read_at')[:1])
+    )
+
+
+def unread_for(user):
+    return visible_to(user).filter(
+        Q(user=user, read=False)
+        | Q(is_broadcast=True, receipt_read_at__isnull=True)
+    )
+
+
+def mark_read(user, notification):
+    """Marcar como leída para el usuario. Devuelve True si estaba sin leer"""
+    now = timezone.now()
+    if not notification.is_broadcast:
+        updated = Notification.objects.filter(pk=notification.pk, user=user, read=False).update(read=True, read_at=now)
+        if updated:
+            notification.read, notification.read_at = True, now
+            decr_unread(user.pk)
+        return bool(updated)
+
+    receipt, created = NotificationReceipt.objects.get_or_create(
+        user=user, notification=notification, defaults={'read_at': now}
+    )
+    if not created and receipt.read_at is None:
+        receipt.read_at = now
+        receipt.save(update_fields=['read_at'])
+        created = True
+    notification.receipt_read_at = receipt.read_at
+    if created:
+        decr_unread(user.pk)
+    return created
+
+
+def mark_all_read(user):
+    """Marcar todo como leído. Devuelve cuántas notificaciones cambiaron"""
+    now = timezone.now()
+    updated = Notification.objects.filter(user=user, read=False).update(read=True, read_at=now)
+
+    # Los broadcasts sin leer no tienen recibo (el descarte los oculta)
+    broadcast_ids = list(
+        unread_for(user).filter(is_broadcast=True).values_list('id', flat=True)
+    )
+    NotificationReceipt.objects.bulk_create(
+        [NotificationReceipt(user=user, notification_id=pk, read_at=now) for pk in broadcast_ids],
+        update_conflicts=True, unique_fields=['user', 'notification'], update_fields=['read_at'],
+    )
+    reset_unread(user.pk)
+    return updated + len(broadcast_ids)
+
+
+def dismiss(user, notification):
+    """Borrar una notificación propia u ocultar un broadcast"""
+    if not notification.is_read:
+        decr_unread(user.pk)
+    if not notification.is_broadcast:
+        notification.delete()
+        return
+    NotificationReceipt.objects.update_or_create(
+        user=user, notification=notification, defaults={'dismissed_at': timezone.now()}
+    )
+
+
+def clear_all(user):
+    """Borrar las propias y ocultar los broadcasts visibles. Devuelve cuántas"""
+    now = timezone.now()
+    deleted, _ = Notification.objects.filter(user=user).delete()
+
+    broadcast_ids = list(
+        Notification.objects.filter(broadcasts_for(user, now)).values_list('id', flat=True)
+    )
+    NotificationReceipt.objects.bulk_create(
+        [NotificationReceipt(user=user, notification_id=pk, dismissed_at=now) for pk in broadcast_ids],
+        update_conflicts=True, unique_fields=['user', 'notification'], update_fields=['dismissed_at'],
+    )
+    reset_unread(user.pk)
+    return deleted + len(broadcast_ids)
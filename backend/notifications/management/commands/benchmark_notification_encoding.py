@@ -0,0 +1,90 @@
+import json
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from notifications import wire
+from notifications.models import Notification, NotificationPriority, NotificationType
+
+
+class Command(BaseCommand):
+    help = 'Medir la codificación de notificaciones para el WebSocket (sin base de datos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help='Notificaciones por mensaje (carga inicial: 20)')
+        parser.add_argument('--rounds', type=int, default=2000, help='Mensajes codificados por caso')
+
+    def sample(self, count):
+        now = timezone.now()
+        types, priorities = NotificationType.values, NotificationPriority.values
+        return [
+            Notification(
+                id=index + 1,
+                user_id=1,
+                type=types[index % len(types)],
+                title=f'Nueva Orden #ORD-0A8BZKK3W{index:04d}',
+                message='Se ha recibido una nueva orden de María Pérez por S/ 149.90',
+                priority=priorities[index % len(priorities)],
+                action_url=f'/admin/ordenes/ORD-0A8BZKK3W{index:04d}',
+                metadata={'order_number': f'ORD-0A8BZKK3W{index:04d}', 'total_amount': '149.90', 'items_count': 3},
+                created_at=now - timedelta(minutes=index),
+            )
+            for index in range(count)
+        ]
+
+    def legacy(self, notifications):
+        """Camino anterior: dict por fila y json.dumps del mensaje"""
+        return json.dumps({
+            'type': 'initial_notifications',
+            'notifications': [
+                {
+                    'id': n.id, 'type': n.type, 'title': n.title, 'message': n.message,
+                    'icon': n.type_icon, 'priority': n.priority, 'priority_color': n.priority_color,
+                    'action_url': n.action_url, 'created_at': n.created_at.isoformat(), 'read': n.read,
+                }
+                for n in notifications
+            ],
+            'unread_count': len(notifications),
+        })
+
+    def canonical(self, notifications, bodies=None):
+        bodies = bodies or [wire.body(n) for n in notifications]
+        items = b'[' + b','.join(
+            wire.with_state(encoded, n.pk, n.read, n.read_at) for encoded, n in zip(bodies, notifications)
+        ) + b']'
+        return wire.frame('initial_notifications', notifications=wire.Raw(items), unread_count=len(notifications))
+
+    def measure(self, label, func, rounds, count):
+        func()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            func()
+        elapsed = time.perf_counter() - start
+        rate = rounds * count / elapsed
+        self.stdout.write(f'{label:<42} {rate:>12,.0f} notificaciones/s  {elapsed / rounds * 1e6:>8.1f} µs/mensaje')
+        return rate
+
+    def handle(self, *args, **options):
+        count, rounds = options['count'], options['rounds']
+        notifications = self.sample(count)
+        cached = [wire.body(n) for n in notifications]
+
+        backends = [('orjson', wire.orjson)] if wire.orjson is not None else []
+        backends.append(('json', None))
+        original = wire.orjson
+
+        self.stdout.write(f'{count} notificaciones por mensaje, {rounds} mensajes por caso')
+        baseline = self.measure('anterior (dict por fila + json.dumps)', lambda: self.legacy(notifications), rounds, count)
+        try:
+            for name, module in backends:
+                wire.orjson = module
+                rate = self.measure(f'canónico {name}, codificando', lambda: self.canonical(notifications), rounds, count)
+                self.stdout.write(f'{"":<42} x{rate / baseline:.1f}')
+                rate = self.measure(
+                    f'canónico {name}, bodies en caché', lambda: self.canonical(notifications, cached), rounds, count
+                )
+                self.stdout.write(f'{"":<42} x{rate / baseline:.1f}')
+        finally:
+            wire.orjson = original
+
+        self.stdout.write(self.style.SUCCESS('✅ Benchmark terminado'))
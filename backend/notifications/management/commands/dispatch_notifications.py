@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand
+from notifications.outbox import DISPATCH_BATCH_SIZE, KEEP_SENT_DAYS, dispatch_all, purge_sent
+
+
+class Command(BaseCommand):
+    help = 'Enviar las notificaciones pendientes del outbox (una pasada o como worker con --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DISPATCH_BATCH_SIZE,
+            help='Eventos por transacción',
+        )
+        parser.add_argument('--loop', action='store_true', help='Seguir revisando la cola (worker)')
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Segundos de espera entre pasadas con la cola vacía (con --loop)',
+        )
+        parser.add_argument(
+            '--purge-days',
+            type=int,
+            default=KEEP_SENT_DAYS,
+            help='Borrar los eventos enviados hace más de N días',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if not options['loop']:
+            sent, failed = dispatch_all(batch_size)
+            purged = purge_sent(options['purge_days'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {sent} eventos enviados, {failed} con error, {purged} eventos antiguos borrados'
+            ))
+            return
+
+        self.stdout.write(f'Despachando notificaciones cada {options["interval"]}s (Ctrl+C para salir)')
+        try:
+            while True:
+                sent, failed = dispatch_all(batch_size)
+                if sent or failed:
+                    self.stdout.write(f'{sent} enviados, {failed} con error')
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            purge_sent(options['purge_days'])
+            self.stdout.write(self.style.SUCCESS('✅ Dispatcher detenido'))
@@ -0,0 +1,35 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from notifications.counters import reconcile
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Recontar en la base los contadores de no leídas de los usuarios con actividad reciente'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Usuarios que iniciaron sesión o recibieron notificaciones en los últimos N días',
+        )
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        users = get_user_model().objects.filter(
+            Q(last_login__gte=since) | Q(notifications__created_at__gte=since)
+        ).distinct().order_by('pk')
+
+        reconciled, batch = 0, []
+        for user in users.iterator(chunk_size=BATCH_SIZE):
+            batch.append(user)
+            if len(batch) == BATCH_SIZE:
+                reconciled += reconcile(batch)
+                batch = []
+        reconciled += reconcile(batch)
+        self.stdout.write(self.style.SUCCESS(f'✅ {reconciled} contadores de no leídas recontados'))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_broadcast_receipts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationoutbox',
+            name='deliveries',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -29,6 +29,29 @@ class NotificationPriority(models.TextChoices):
     URGENT = 'urgent', 'Urgente'
 
 
+PRIORITY_COLORS = {
+    'low': 'gray',
+    'medium': 'blue',
+    'high': 'yellow',
+    'urgent': 'red'
+}
+
+TYPE_ICONS = {
+    'new_order': 'shopping-cart',
+    'order_status': 'package',
+    'payment_confirmed': 'credit-card',
+    'payment_failed': 'alert-circle',
+    'low_stock': 'alert-triangle',
+    'out_of_stock': 'x-circle',
+    'new_user': 'user-plus',
+    'new_review': 'star',
+    'new_message': 'message-circle',
+    'system': 'info',
+    'promotion': 'tag',
+    'coupon_used': 'ticket'
+}
+
+
 class Notification(models.Model):
     """Modelo de notificaciones"""
     # Receptor
@@ -106,6 +129,13 @@ class Notification(models.Model):
             models.Index(fields=['-created_at', 'user']),
             models.Index(fields=['read', 'user']),
             models.Index(fields=['type']),
+            # Paginación por cursor del usuario: (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id']),
+            # Broadcasts vigentes (una fila por envío, ver NotificationReceipt)
+            models.Index(
+                fields=['-created_at'], name='notif_broadcast_created_idx',
+                condition=models.Q(is_broadcast=True)
+            ),
         ]
 
     def __str__(self):
@@ -120,6 +150,22 @@ class Notification(models.Model):
             return True
         return False
 
+    @property
+    def user_read_at(self):
+        """
+        read_at para quien consulta: en los broadcast sale de su
+        NotificationReceipt (anotado por inbox.visible_to)
+        """
+        if self.is_broadcast:
+            return getattr(self, 'receipt_read_at', None)
+        return self.read_at
+
+    @property
+    def is_read(self):
+        if self.is_broadcast:
+            return self.user_read_at is not None
+        return self.read
+
     @property
     def is_expired(self):
         """Verificar si la notificación expiró"""
@@ -130,32 +176,42 @@ class Notification(models.Model):
     @property
     def priority_color(self):
         """Obtener color según prioridad"""
-        colors = {
-            'low': 'gray',
-            'medium': 'blue',
-            'high': 'yellow',
-            'urgent': 'red'
-        }
-        return colors.get(self.priority, 'blue')
+        return PRIORITY_COLORS.get(self.priority, 'blue')
 
     @property
     def type_icon(self):
         """Obtener icono según tipo"""
-        icons = {
-            'new_order': 'shopping-cart',
-            'order_status': 'package',
-            'payment_confirmed': 'credit-card',
-            'payment_failed': 'alert-circle',
-            'low_stock': 'alert-triangle',
-            'out_of_stock': 'x-circle',
-            'new_user': 'user-plus',
-            'new_review': 'star',
-            'new_message': 'message-circle',
-            'system': 'info',
-            'promotion': 'tag',
-            'coupon_used': 'ticket'
-        }
-        return icons.get(self.type, self.icon)
+        return TYPE_ICONS.get(self.type, self.icon)
+
+
+class NotificationReceipt(models.Model):
+    """
+    Lectura o descarte de un broadcast por un usuario. El broadcast se guarda
+    una sola vez (user=None); solo hay recibo para quien lo leyó o descartó.
+    """
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        related_name='receipts'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notification_receipts'
+    )
+    read_at = models.DateTimeField(null=True, blank=True)
+    dismissed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'notification_receipts'
+        verbose_name = 'Recibo de Notificación'
+        verbose_name_plural = 'Recibos de Notificación'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'notification'], name='unique_notification_receipt'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.notification_id}"
 
 
 class NotificationPreference(models.Model):
@@ -212,3 +268,39 @@ class NotificationPreference(models.Model):
             NotificationType.SYSTEM: self.system_updates,
         }
         return type_map.get(notification_type, True)
+
+
+class NotificationOutbox(models.Model):
+    """
+    Notificación pendiente de enviar, escrita en la misma transacción que el
+    cambio que la origina (ver notifications/outbox.py)
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('sent', 'Enviado'),
+        ('failed', 'Fallido'),
+    ]
+
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # Envíos pendientes al channel layer una vez guardadas las notificaciones
+    # (None: el handler todavía no corrió)
+    deliveries = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'notification_outbox'
+        verbose_name = 'Evento de Notificación'
+        verbose_name_plural = 'Bandeja de Salida de Notificaciones'
+        indexes = [
+            # Cola del dispatcher: pendientes por orden de disponibilidad
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event} ({self.get_status_display()})"
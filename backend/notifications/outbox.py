@@ -0,0 +1,265 @@
+"""
+Bandeja de salida (outbox) de notificaciones
+
+Los signals y los módulos de órdenes no notifican directamente: publish()
+escribe un NotificationOutbox en la transacción en curso. Si la transacción
+se revierte el evento desaparece con ella, así nunca se avisa de una orden
+que no existe; si se confirma, el evento queda guardado aunque el proceso
+muera antes de enviarlo.
+
+Al confirmar se despierta el dispatcher (dispatch_pending), que fuera de la
+petición toma los eventos por lotes (select_for_update con skip_locked, así
+varios workers no repiten eventos), ejecuta el handler de cada uno y los
+marca como enviados. Si un handler falla, el evento se reintenta con espera
+exponencial hasta MAX_ATTEMPTS y luego queda como failed.
+
+Cada evento se procesa en dos pasos para que el reintento no duplique nada:
+el handler guarda las notificaciones (en un savepoint: si falla no queda
+ninguna fila) y devuelve los envíos al channel layer, que se guardan en
+NotificationOutbox.deliveries. Luego se publican uno a uno (utils.deliver);
+si el channel layer falla, el reintento solo publica los que faltan.
+
+Con NOTIFICATION_OUTBOX_ASYNC el dispatcher corre en un hilo del proceso;
+el comando dispatch_notifications --loop sirve como worker dedicado y
+recoge lo que quede pendiente tras un reinicio.
+
+Los handlers releen los objetos por id al despachar, por eso los payloads
+solo llevan ids y los valores que pueden cambiar después (estado anterior).
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .models import NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+
+# Espera antes del reintento N: RETRY_BASE * 2^(N-1), hasta RETRY_MAX
+RETRY_BASE = timedelta(seconds=5)
+RETRY_MAX = timedelta(minutes=30)
+
+# Eventos enviados que se conservan (días)
+KEEP_SENT_DAYS = 7
+
+HANDLERS = {}
+
+_executor = None
+_kick_lock = threading.Lock()
+_kick_pending = False
+
+
+def handler(event):
+    """Registrar el handler de un tipo de evento"""
+    def register(func):
+        HANDLERS[event] = func
+        return func
+    return register
+
+
+def publish(event, **payload):
+    """Guardar un evento en la transacción actual; se envía al confirmar"""
+    if event not in HANDLERS:
+        raise ValueError(f'Evento de notificación desconocido: {event}')
+    entry = NotificationOutbox.objects.create(event=event, payload=payload)
+    transaction.on_commit(wake_dispatcher)
+    return entry
+
+
+def publish_many(event, payloads):
+    """Varios eventos del mismo tipo con un solo INSERT"""
+    if event not in HANDLERS:
+        raise ValueError(f'Evento de notificación desconocido: {event}')
+    entries = NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(event=event, payload=payload) for payload in payloads
+    ])
+    if entries:
+        transaction.on_commit(wake_dispatcher)
+    return entries
+
+
+def wake_dispatcher():
+    """Callback de on_commit: un fallo del envío no afecta a quien confirmó"""
+    if not getattr(settings, 'NOTIFICATION_OUTBOX_ASYNC', True):
+        try:
+            dispatch_all()
+        except Exception:
+            logger.exception("Error despachando notificaciones")
+        return
+
+    global _executor, _kick_pending
+    with _kick_lock:
+        # Varios commits seguidos comparten una misma pasada
+        if _kick_pending:
+            return
+        _kick_pending = True
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notification-outbox')
+    _executor.submit(run_in_thread)
+
+
+def run_in_thread():
+    global _kick_pending
+    with _kick_lock:
+        _kick_pending = False
+    close_old_connections()
+    try:
+        dispatch_all()
+    except Exception:
+        logger.exception("Error despachando notificaciones")
+    finally:
+        close_old_connections()
+
+
+def retry_delay(attempts):
+    return min(RETRY_BASE * (2 ** (attempts - 1)), RETRY_MAX)
+
+
+def record_failure(entry, error, now):
+    """Anotar el intento fallido en su propio savepoint: un error aquí no revierte el lote"""
+    entry.attempts += 1
+    entry.last_error = str(error)[:1000]
+    if entry.attempts >= MAX_ATTEMPTS:
+        entry.status = 'failed'
+        logger.error(f"Evento {entry.event} #{entry.pk} descartado tras {entry.attempts} intentos: {str(error)}")
+    else:
+        entry.available_at = now + retry_delay(entry.attempts)
+        logger.warning(f"Evento {entry.event} #{entry.pk} falló, se reintenta: {str(error)}")
+    try:
+        with transaction.atomic():
+            entry.save(update_fields=['attempts', 'last_error', 'status', 'available_at', 'deliveries'])
+    except Exception:
+        # Queda como estaba (pendiente) y se vuelve a tomar en la próxima pasada
+        logger.exception(f"No se pudo registrar el fallo del evento {entry.event} #{entry.pk}")
+
+
+def dispatch_pending(batch_size=DISPATCH_BATCH_SIZE):
+    """Despachar un lote de eventos disponibles. Devuelve (enviados, fallidos)"""
+    from .utils import deliver
+    now = timezone.now()
+    sent, failed = [], 0
+    with transaction.atomic():
+        entries = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', available_at__lte=now)
+            .order_by('available_at', 'id')[:batch_size]
+        )
+        for entry in entries:
+            try:
+                if entry.deliveries is None:
+                    # Un savepoint por evento: si falla no arrastra a los demás
+                    with transaction.atomic():
+                        deliveries = HANDLERS[entry.event](**entry.payload) or []
+                        if not isinstance(deliveries, list):
+                            raise TypeError(f'El handler de {entry.event} debe devolver una lista de envíos')
+                    entry.deliveries = deliveries
+                while entry.deliveries:
+                    deliver(entry.deliveries[0])
+                    entry.deliveries.pop(0)
+            except Exception as e:
+                failed += 1
+                record_failure(entry, e, now)
+            else:
+                sent.append(entry.pk)
+
+        if sent:
+            NotificationOutbox.objects.filter(pk__in=sent).update(status='sent', sent_at=timezone.now())
+    return len(sent), failed
+
+
+def dispatch_all(batch_size=DISPATCH_BATCH_SIZE):
+    """Despachar lotes hasta vaciar la cola disponible. Devuelve (enviados, fallidos)"""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = dispatch_pending(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < batch_size:
+            return total_sent, total_failed
+
+
+def purge_sent(days=KEEP_SENT_DAYS):
+    """Borrar los eventos enviados hace más de N días. Devuelve cuántos"""
+    deleted, _ = NotificationOutbox.objects.filter(
+        status='sent', sent_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
+
+
+# Handlers: devuelven los envíos de las notificaciones que guardaron
+
+@handler('new_order')
+def dispatch_new_order(order_id):
+    from orders.models import Order
+    from .utils import notify_new_order
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order:
+        return notify_new_order(order)
+
+
+@handler('order_status')
+def dispatch_order_status(order_id, old_status, status):
+    from orders.models import Order
+    from .utils import notify_order_status_change
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order:
+        # El estado de este cambio, aunque la orden ya haya avanzado
+        order.status = status
+        return notify_order_status_change(order, old_status)
+
+
+@handler('order_status_changes')
+def dispatch_order_status_changes(status, changes):
+    """changes: lista de [id de orden, estado anterior, estado de pago anterior]"""
+    from orders.models import Order
+    from .utils import notify_order_status_changes
+    orders = Order.objects.select_related('user').in_bulk([order_id for order_id, _, _ in changes])
+    batch = []
+    for order_id, old_status, old_payment_status in changes:
+        order = orders.get(order_id)
+        if order:
+            order.status = status
+            batch.append((order, old_status, old_payment_status))
+    return notify_order_status_changes(batch)
+
+
+@handler('payment_status')
+def dispatch_payment_status(order_id, status):
+    from orders.models import Order
+    from .utils import notify_payment_status
+    order = Order.objects.select_related('user').filter(pk=order_id).first()
+    if order:
+        return notify_payment_status(order, status)
+
+
+@handler('low_stock')
+def dispatch_low_stock(product_id):
+    from products.models import Product
+    from .utils import notify_low_stock
+    product = Product.objects.filter(pk=product_id).first()
+    if product:
+        return notify_low_stock(product)
+
+
+@handler('new_user')
+def dispatch_new_user(user_id):
+    from django.contrib.auth import get_user_model
+    from .utils import notify_new_user
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user:
+        return notify_new_user(user)
+
+
+@handler('coupon_used')
+def dispatch_coupon_used(usage_id):
+    from coupons.models import CouponUsage
+    from .utils import notify_coupon_used
+    usage = CouponUsage.objects.select_related('coupon', 'user').filter(pk=usage_id).first()
+    if usage:
+        return notify_coupon_used(usage)
@@ -21,6 +21,14 @@ class NotificationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'read_at']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.is_broadcast:
+            # La fila es compartida: la lectura es la del usuario (NotificationReceipt)
+            data['read'] = instance.is_read
+            data['read_at'] = self.fields['read_at'].to_representation(instance.user_read_at) if instance.user_read_at else None
+        return data
+
 
 class NotificationMarkReadSerializer(serializers.Serializer):
     """Serializer para marcar notificaciones como leídas"""
@@ -0,0 +1,395 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import AsyncMock, patch
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from orders.models import Order
+from django.test import TestCase, override_settings
+from . import wire
+from .consumers import NotificationConsumer
+from .counters import unread_count
+from .inbox import mark_read, unread_for, visible_to
+from .models import Notification, NotificationOutbox, NotificationReceipt, NotificationType
+from .outbox import MAX_ATTEMPTS, dispatch_pending
+from .utils import broadcast_promotion, channel_layer, notify_admins, send_notification
+
+User = get_user_model()
+
+
+class AdminFanOutTests(TestCase):
+    """Notificaciones a admins: un INSERT y un envío al grupo"""
+
+    def setUp(self):
+        self.admins = [
+            User.objects.create_user(username=f'admin{index}', email=f'admin{index}@example.com', is_staff=True)
+            for index in range(5)
+        ]
+
+    def test_one_insert_and_one_group_message(self):
+        with patch.object(channel_layer, 'group_send', new_callable=AsyncMock) as group_send:
+            with self.assertNumQueries(2):  # ids de admins + bulk_create
+                created = notify_admins(notification_type=NotificationType.LOW_STOCK, title='Stock Bajo', message='x')
+
+        self.assertEqual(len(created), 5)
+        self.assertEqual(
+            set(Notification.objects.filter(title='Stock Bajo').values_list('user_id', flat=True)),
+            {admin.id for admin in self.admins}
+        )
+        group_send.assert_awaited_once()
+        group, event = group_send.await_args.args
+        self.assertEqual(group, 'notifications_admins')
+        self.assertEqual(event['recipients'], {str(n.user_id): n.id for n in created})
+
+    @override_settings(NOTIFICATION_OUTBOX_ASYNC=False)
+    def test_new_user_notifies_admins_and_welcomes_user(self):
+        with patch.object(channel_layer, 'group_send', new_callable=AsyncMock):
+            with self.captureOnCommitCallbacks(execute=True):
+                user = User.objects.create_user(username='cliente', email='cliente@example.com')
+
+        admin_rows = Notification.objects.filter(type=NotificationType.NEW_USER)
+        self.assertEqual(admin_rows.count(), 5)
+        self.assertEqual(admin_rows.first().metadata['user_id'], user.id)
+        self.assertTrue(Notification.objects.filter(user=user, title='¡Bienvenido!').exists())
+
+    def test_without_admins_nothing_is_sent(self):
+        User.objects.filter(is_staff=True).update(is_staff=False)
+        with patch.object(channel_layer, 'group_send', new_callable=AsyncMock) as group_send:
+            self.assertEqual(notify_admins(title='x', message='y'), [])
+        group_send.assert_not_awaited()
+
+    def test_consumer_sends_own_row_id(self):
+        with patch.object(channel_layer, 'group_send', new_callable=AsyncMock) as group_send:
+            created = notify_admins(title='Pago', message='y')
+        event = group_send.await_args.args[1]
+
+        consumer = NotificationConsumer()
+        consumer.user = self.admins[2]
+        consumer.send = AsyncMock()
+        async_to_sync(consumer.bulk_notification_message)(event)
+        frame = json.loads(consumer.send.await_args.kwargs['text_data'])
+        self.assertEqual(frame['notification']['id'], created[2].id)
+
+        consumer.user = User.objects.create_superuser(username='root', email='root@example.com', password='x')
+        consumer.send.reset_mock()
+        async_to_sync(consumer.bulk_notification_message)(event)
+        consumer.send.assert_not_awaited()
+
+
+@override_settings(NOTIFICATION_OUTBOX_ASYNC=False)
+class OutboxTests(TestCase):
+    """Notificaciones escritas en la transacción y enviadas al confirmar"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', is_staff=True)
+        self.customer = User.objects.create_user(username='cliente', email='cliente@example.com')
+        NotificationOutbox.objects.all().delete()
+
+    def create_order(self):
+        return Order.objects.create(
+            user=self.customer, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10, payment_method='yape',
+        )
+
+    def test_nothing_is_sent_before_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            order = self.create_order()
+            self.assertEqual(NotificationOutbox.objects.get().event, 'new_order')
+            self.assertFalse(Notification.objects.filter(order_id=order.id).exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(NotificationOutbox.objects.get().status, 'sent')
+        self.assertEqual(
+            set(Notification.objects.filter(order_id=order.id).values_list('user_id', flat=True)),
+            {self.admin.id, self.customer.id}
+        )
+
+    def test_rolled_back_order_leaves_no_event(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.create_order()
+                    raise ValueError('checkout abortado')
+            except ValueError:
+                pass
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertFalse(Notification.objects.filter(type=NotificationType.NEW_ORDER).exists())
+
+    def test_failed_events_are_retried_with_backoff(self):
+        with patch('notifications.utils.notify_new_order', side_effect=RuntimeError('redis caído')):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.create_order()
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+        self.assertIn('redis', entry.last_error)
+        self.assertEqual(dispatch_pending(), (0, 0))  # todavía en espera
+
+        NotificationOutbox.objects.update(available_at=timezone.now())
+        out = StringIO()
+        call_command('dispatch_notifications', stdout=out)
+        self.assertIn('1 eventos enviados', out.getvalue())
+        self.assertTrue(Notification.objects.filter(type=NotificationType.NEW_ORDER, user=self.admin).exists())
+
+    def test_channel_failure_is_retried_without_duplicates(self):
+        # Admins se publica, el envío al cliente falla
+        with patch.object(channel_layer, 'group_send', new_callable=AsyncMock,
+                          side_effect=[None, ConnectionError('redis caído')]):
+            with self.captureOnCommitCallbacks(execute=True):
+                order = self.create_order()
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('pending', 1))
+        self.assertIn('redis', entry.last_error)
+        self.assertEqual([delivery['group'] for delivery in entry.deliveries], [f'notifications_user_{self.customer.id}'])
+
+        NotificationOutbox.objects.update(available_at=timezone.now())
+        with patch.object(channel_layer, 'group_send', new_callable=AsyncMock) as group_send:
+            self.assertEqual(dispatch_pending(), (1, 0))
+        # Solo se repite el envío que faltaba; las filas no se vuelven a crear
+        group_send.assert_awaited_once()
+        group, event = group_send.await_args.args
+        self.assertEqual(group, f'notifications_user_{self.customer.id}')
+        customer_notification = Notification.objects.get(order_id=order.id, user=self.customer)
+        self.assertEqual(json.loads(event['wire'])['id'], customer_notification.id)
+        self.assertEqual(Notification.objects.filter(order_id=order.id).count(), 2)
+        self.assertEqual(NotificationOutbox.objects.get().status, 'sent')
+
+    def test_bad_handler_result_does_not_undo_the_batch(self):
+        with patch('notifications.utils.notify_new_user', return_value=object()):
+            with self.captureOnCommitCallbacks(execute=True):
+                order = self.create_order()
+                User.objects.create_user(username='otro', email='otro@example.com')
+
+        entries = {entry.event: entry for entry in NotificationOutbox.objects.all()}
+        self.assertEqual(entries['new_order'].status, 'sent')
+        self.assertEqual(Notification.objects.filter(order_id=order.id).count(), 2)
+        failed = entries['new_user']
+        self.assertEqual((failed.status, failed.attempts, failed.deliveries), ('pending', 1, None))
+        self.assertIn('lista de envíos', failed.last_error)
+
+    def test_gives_up_after_max_attempts(self):
+        with patch('notifications.utils.notify_new_user', side_effect=RuntimeError('error')):
+            with self.captureOnCommitCallbacks(execute=True):
+                User.objects.create_user(username='otro', email='otro@example.com')
+            for _ in range(MAX_ATTEMPTS - 1):
+                NotificationOutbox.objects.update(available_at=timezone.now())
+                dispatch_pending()
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual((entry.status, entry.attempts), ('failed', MAX_ATTEMPTS))
+
+    def test_status_change_uses_state_of_the_event(self):
+        order = self.create_order()
+        with self.captureOnCommitCallbacks() as callbacks:
+            order.status = 'processing'
+            order.save()
+            Order.objects.filter(pk=order.pk).update(status='shipped')
+        for callback in callbacks:
+            callback()
+        notification = Notification.objects.get(type=NotificationType.ORDER_STATUS)
+        self.assertEqual(notification.metadata['new_status'], 'processing')
+
+
+class BroadcastInboxTests(APITestCase):
+    """Broadcasts guardados una vez, con recibos de lectura por usuario"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com')
+        self.other = User.objects.create_user(username='otro', email='otro@example.com')
+        self.client.force_authenticate(self.user)
+        self.personal = Notification.objects.create(user=self.user, title='Tu orden', message='x')
+        with patch.object(channel_layer, 'group_send', new_callable=AsyncMock) as group_send:
+            self.promo = broadcast_promotion('Promo', '20% en todo')
+        self.group_send = group_send
+
+    def ids(self, response):
+        return [row['id'] for row in response.data['results']]
+
+    def test_stored_once_and_sent_once(self):
+        self.assertEqual(Notification.objects.filter(type=NotificationType.PROMOTION).count(), 1)
+        self.group_send.assert_awaited_once()
+        self.assertEqual(self.group_send.await_args.args[0], 'notifications_public')
+
+    def test_list_merges_personal_and_broadcast(self):
+        response = self.client.get('/api/notifications/')
+        self.assertEqual(self.ids(response), [self.promo.id, self.personal.id])
+        self.assertEqual(self.client.get('/api/notifications/count_unread/').data['count'], 2)
+
+    def test_read_is_per_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/notifications/{self.promo.id}/mark_as_read/')
+        self.assertTrue(response.data['read'])
+        self.assertEqual(self.client.get('/api/notifications/count_unread/').data['count'], 1)
+
+        self.promo.refresh_from_db()
+        self.assertFalse(self.promo.read)
+        self.assertEqual(unread_for(self.other).get(), self.promo)
+
+    def test_mark_all_and_clear_all(self):
+        response = self.client.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(unread_for(self.user).count(), 0)
+        self.assertEqual(NotificationReceipt.objects.get().user, self.user)
+
+        response = self.client.delete('/api/notifications/clear_all/')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.ids(self.client.get('/api/notifications/')), [])
+        self.assertTrue(Notification.objects.filter(pk=self.promo.pk).exists())
+        self.assertEqual(visible_to(self.other).get(), self.promo)
+
+    def test_dismiss_hides_broadcast_only_for_user(self):
+        self.client.delete(f'/api/notifications/{self.promo.id}/dismiss/')
+        self.assertEqual(self.ids(self.client.get('/api/notifications/')), [self.personal.id])
+        self.assertTrue(visible_to(self.other).filter(pk=self.promo.pk).exists())
+
+        response = self.client.patch(f'/api/notifications/{self.personal.id}/', {'title': 'x'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.other)
+        response = self.client.patch(f'/api/notifications/{self.promo.id}/', {'title': 'x'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_new_users_and_expired_broadcasts(self):
+        Notification.objects.filter(pk=self.promo.pk).update(created_at=timezone.now() - timedelta(days=1))
+        newcomer = User.objects.create_user(username='nuevo', email='nuevo@example.com')
+        self.assertFalse(visible_to(newcomer).exists())
+
+        Notification.objects.filter(pk=self.promo.pk).update(expires_at=timezone.now())
+        self.assertFalse(visible_to(self.user).filter(pk=self.promo.pk).exists())
+
+    def test_consumer_delivers_broadcast_as_notification(self):
+        consumer = NotificationConsumer()
+        consumer.user = self.user
+        consumer.send = AsyncMock()
+        event = self.group_send.await_args.args[1]
+        async_to_sync(consumer.broadcast_message)(event)
+        frame = json.loads(consumer.send.await_args.kwargs['text_data'])
+        self.assertEqual((frame['type'], frame['notification']['id']), ('notification', self.promo.id))
+
+        consumer.user = User(username='nuevo', date_joined=timezone.now() + timedelta(minutes=1))
+        consumer.send.reset_mock()
+        async_to_sync(consumer.broadcast_message)(event)
+        consumer.send.assert_not_awaited()
+
+
+class UnreadCounterTests(APITestCase):
+    """Contadores de no leídas mantenidos en caché"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com')
+        self.client.force_authenticate(self.user)
+        self.group_send = patch.object(channel_layer, 'group_send', new_callable=AsyncMock)
+        self.group_send.start()
+        self.addCleanup(self.group_send.stop)
+
+    def notify(self, title='Aviso'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return send_notification(user=self.user, title=title, message='x')
+
+    def count(self):
+        return self.client.get('/api/notifications/count_unread/').data['count']
+
+    def test_reads_do_not_hit_the_table(self):
+        self.notify()
+        self.assertEqual(self.count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.user), 1)
+
+    def test_writes_keep_the_counter(self):
+        first, second, third = self.notify('1'), self.notify('2'), self.notify('3')
+        self.assertEqual(self.count(), 3)
+
+        self.notify('4')
+        self.assertEqual(self.count(), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{first.id}/mark_as_read/')
+            self.client.post(f'/api/notifications/{first.id}/mark_as_read/')
+        self.assertEqual(self.count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/notifications/{second.id}/dismiss/')
+            self.client.delete(f'/api/notifications/{first.id}/dismiss/')
+        self.assertEqual(self.count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(unread_for(self.user).count(), 0)
+
+    def test_broadcast_invalidates_every_counter(self):
+        self.notify()
+        self.assertEqual(self.count(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            broadcast_promotion('Promo', '20%')
+        self.assertEqual(self.count(), 2)
+
+    def test_reconcile_command_fixes_drift(self):
+        self.notify()
+        self.assertEqual(self.count(), 1)
+        Notification.objects.filter(user=self.user).update(read=True)
+        self.assertEqual(self.count(), 1)
+
+        out = StringIO()
+        call_command('reconcile_unread_counts', stdout=out)
+        self.assertIn('1 contadores', out.getvalue())
+        self.assertEqual(self.count(), 0)
+
+
+class WireEncodingTests(APITestCase):
+    """Formato único del WebSocket, codificado una vez al crear"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com')
+        group_send = patch.object(channel_layer, 'group_send', new_callable=AsyncMock)
+        self.group_send = group_send.start()
+        self.addCleanup(group_send.stop)
+
+    def notify(self, **fields):
+        return send_notification(user=self.user, title='Pago Confirmado', message='Tu pago de S/ 10 ñandú', **fields)
+
+    def test_push_and_initial_load_share_the_encoding(self):
+        notification = self.notify(metadata={'order_number': 'ORD-1'})
+        pushed = json.loads(wire.frame('notification', notification=wire.Raw(self.group_send.await_args.args[1]['wire'])))
+        self.assertEqual(pushed['notification']['id'], notification.id)
+        self.assertEqual(pushed['notification']['metadata'], {'order_number': 'ORD-1'})
+        self.assertEqual(pushed['notification']['message'], 'Tu pago de S/ 10 ñandú')
+
+        # La carga inicial toma el body de la caché: no se vuelve a renderizar
+        with patch('notifications.wire.render') as render:
+            items = json.loads(wire.encode_items(list(unread_for(self.user))))
+        render.assert_not_called()
+        self.assertEqual(items, [pushed['notification']])
+
+    def test_read_state_is_per_user(self):
+        notification = self.notify()
+        mark_read(self.user, notification)
+        item, = json.loads(wire.encode_items(list(visible_to(self.user))))
+        self.assertTrue(item['read'])
+        self.assertEqual(item['read_at'], notification.read_at.isoformat())
+
+    def test_edits_invalidate_the_cached_body(self):
+        notification = self.notify()
+        self.client.force_authenticate(self.user)
+        self.client.patch(f'/api/notifications/{notification.id}/', {'title': 'Corregido'}, format='json')
+        item, = json.loads(wire.encode_items(list(visible_to(self.user))))
+        self.assertEqual(item['title'], 'Corregido')
+
+    def test_stdlib_fallback_matches_orjson(self):
+        notification = self.notify(metadata={'total': '10.00', 'items': [1, 2]})
+        encoded = wire.body(notification)
+        with patch.object(wire, 'orjson', None):
+            fallback = wire.body(notification)
+            frame = wire.frame('notifications_page', notifications=wire.Raw(b'[]'), page=1, has_more=False)
+        self.assertEqual(json.loads(fallback), json.loads(encoded))
+        self.assertEqual(json.loads(frame), {'type': 'notifications_page', 'notifications': [], 'page': 1, 'has_more': False})
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_notification_encoding', count=5, rounds=10, stdout=out)
+        self.assertIn('bodies en caché', out.getvalue())
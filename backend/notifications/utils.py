@@ -1,5 +1,8 @@
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.db import transaction
+from . import wire
+from .counters import bump_broadcast_version, incr_unread
 from .models import Notification, NotificationType, NotificationPriority
 import logging
 
@@ -7,7 +10,33 @@ logger = logging.getLogger(__name__)
 channel_layer = get_channel_layer()
 
 
-def send_notification(
+def user_delivery(user_id, notification_id):
+    return {'group': f'notifications_user_{user_id}', 'type': 'notification_message', 'id': notification_id}
+
+
+def admins_delivery(notification_id):
+    return {'group': 'notifications_admins', 'type': 'notification_message', 'id': notification_id}
+
+
+def deliver(delivery):
+    """
+    Publicar un envío en el channel layer. Los envíos solo llevan ids (se
+    guardan en el outbox para reintentar); el body sale de la caché de wire.
+    No captura errores.
+    """
+    message = dict(delivery)
+    group = message.pop('group')
+    notification_id = message.pop('id')
+    encoded = wire.body_by_id(notification_id)
+    if message['type'] == 'bulk_notification_message':
+        # Cada conexión toma el id de su fila de recipients
+        message['body'] = encoded
+    else:
+        message['wire'] = wire.with_state(encoded, notification_id)
+    async_to_sync(channel_layer.group_send)(group, message)
+
+
+def create_notification(
     user=None,
     notification_type=NotificationType.SYSTEM,
     title="",
@@ -18,6 +47,54 @@ def send_notification(
     is_broadcast=False,
     **kwargs
 ):
+    """
+    Guardar una notificación sin enviarla. No captura errores (la usa el
+    outbox, que reintenta); los argumentos son los de send_notification.
+
+    Returns:
+        tuple: (Notification, lista de envíos para deliver)
+    """
+    notification = Notification.objects.create(
+        user=user if not is_broadcast else None,
+        type=notification_type,
+        title=title,
+        message=message,
+        priority=priority,
+        action_url=action_url,
+        metadata=metadata or {},
+        is_broadcast=is_broadcast,
+        **kwargs
+    )
+
+    # Contadores de no leídas (ver notifications/counters.py)
+    if is_broadcast:
+        transaction.on_commit(bump_broadcast_version)
+    elif user:
+        incr_unread([user.id])
+
+    # Codificar una vez para el WebSocket (queda en caché para el envío y la carga inicial)
+    wire.remember([notification])
+
+    if is_broadcast:
+        # Un solo envío: todas las conexiones (también las de usuarios) están en el grupo público
+        deliveries = [{
+            'group': 'notifications_public',
+            'type': 'broadcast_message',
+            'id': notification.id,
+            'created_at': notification.created_at.isoformat()
+        }]
+    elif user:
+        deliveries = [user_delivery(user.id, notification.id)]
+        # Si es una notificación importante, también enviar a admins
+        if priority in [NotificationPriority.HIGH, NotificationPriority.URGENT]:
+            deliveries.append(admins_delivery(notification.id))
+    else:
+        # Enviar solo a admins si no hay usuario específico
+        deliveries = [admins_delivery(notification.id)]
+    return notification, deliveries
+
+
+def send_notification(**fields):
     """
     Crear y enviar notificación en tiempo real
     
@@ -33,118 +110,135 @@ def send_notification(
         **kwargs: Campos adicionales (order_id, product_id, etc.)
     
     Returns:
-        Notification: Objeto de notificación creado
+        Notification: Objeto de notificación creado (None si hubo un error)
     """
     try:
-        # Crear notificación en la base de datos
-        notification = Notification.objects.create(
-            user=user if not is_broadcast else None,
+        notification, deliveries = create_notification(**fields)
+        for delivery in deliveries:
+            deliver(delivery)
+        logger.info(f"Notificación enviada: {notification.title}")
+        return notification
+        
+    except Exception as e:
+        logger.error(f"Error enviando notificación: {str(e)}")
+        return None
+
+
+def staff_ids():
+    from django.contrib.auth import get_user_model
+    User = get_user_model()
+    return list(User.objects.filter(is_staff=True).values_list('id', flat=True))
+
+
+def create_bulk_notification(
+    recipients,
+    notification_type=NotificationType.SYSTEM,
+    title="",
+    message="",
+    priority=NotificationPriority.MEDIUM,
+    action_url=None,
+    metadata=None,
+    group=None,
+    **kwargs
+):
+    """
+    Misma notificación para varios usuarios: un solo INSERT (bulk_create) y,
+    con grupo, un solo envío al channel layer. No captura errores.
+
+    Args:
+        recipients: Usuarios o ids de usuario
+        group: Grupo al que se publica una vez (p. ej. notifications_admins).
+            Sin grupo se envía al canal de cada usuario.
+        Resto: como en send_notification
+
+    Returns:
+        tuple: (notificaciones creadas, una por usuario; lista de envíos)
+    """
+    user_ids = list(dict.fromkeys(getattr(recipient, 'pk', recipient) for recipient in recipients))
+    if not user_ids:
+        return [], []
+    created = Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id,
             type=notification_type,
             title=title,
             message=message,
             priority=priority,
             action_url=action_url,
             metadata=metadata or {},
-            is_broadcast=is_broadcast,
             **kwargs
         )
-        
-        # Preparar datos para WebSocket
-        notification_data = {
-            'id': notification.id,
-            'type': notification.type,
-            'title': notification.title,
-            'message': notification.message,
-            'icon': notification.type_icon,
-            'priority': notification.priority,
-            'priority_color': notification.priority_color,
-            'action_url': notification.action_url,
-            'created_at': notification.created_at.isoformat(),
-            'read': notification.read,
-            'metadata': notification.metadata
-        }
-        
-        # Enviar por WebSocket
-        if is_broadcast:
-            # Enviar a todos los usuarios conectados
-            async_to_sync(channel_layer.group_send)(
-                'notifications_public',
-                {
-                    'type': 'broadcast_message',
-                    'message': notification_data
-                }
-            )
-            # También enviar a admins
-            async_to_sync(channel_layer.group_send)(
-                'notifications_admins',
-                {
-                    'type': 'notification_message',
-                    'notification': notification_data
-                }
-            )
-        elif user:
-            # Enviar a usuario específico
-            async_to_sync(channel_layer.group_send)(
-                f'notifications_user_{user.id}',
-                {
-                    'type': 'notification_message',
-                    'notification': notification_data
-                }
-            )
-            
-            # Si es una notificación importante, también enviar a admins
-            if priority in [NotificationPriority.HIGH, NotificationPriority.URGENT]:
-                async_to_sync(channel_layer.group_send)(
-                    'notifications_admins',
-                    {
-                        'type': 'notification_message',
-                        'notification': notification_data
-                    }
-                )
-        else:
-            # Enviar solo a admins si no hay usuario específico
-            async_to_sync(channel_layer.group_send)(
-                'notifications_admins',
-                {
-                    'type': 'notification_message',
-                    'notification': notification_data
-                }
-            )
-        
-        logger.info(f"Notificación enviada: {notification.title}")
-        return notification
-        
+        for user_id in user_ids
+    ])
+    incr_unread(user_ids)
+
+    # Mismo contenido para todos: se codifica una sola vez
+    wire.remember(created)
+    if group:
+        # Un mensaje para todo el grupo; cada conexión toma el id de su fila
+        deliveries = [{
+            'group': group,
+            'type': 'bulk_notification_message',
+            'id': created[0].id,
+            'recipients': {str(notification.user_id): notification.id for notification in created}
+        }]
+    else:
+        deliveries = [user_delivery(notification.user_id, notification.id) for notification in created]
+    return created, deliveries
+
+
+def send_bulk_notification(recipients, **fields):
+    """
+    Crear y enviar la misma notificación a varios usuarios (argumentos como
+    en create_bulk_notification). Devuelve las notificaciones creadas ([] si
+    hubo un error)
+    """
+    try:
+        created, deliveries = create_bulk_notification(recipients, **fields)
+        for delivery in deliveries:
+            deliver(delivery)
+        if created:
+            logger.info(f"Notificación enviada a {len(created)} usuarios: {created[0].title}")
+        return created
+
     except Exception as e:
-        logger.error(f"Error enviando notificación: {str(e)}")
-        return None
+        logger.error(f"Error enviando notificación en lote: {str(e)}")
+        return []
+
+
+def create_admin_notifications(**fields):
+    """Notificaciones para todos los admins, sin enviar (campos como en send_notification)"""
+    return create_bulk_notification(staff_ids(), group='notifications_admins', **fields)
+
+
+def notify_admins(**fields):
+    """Notificar a todos los admins (campos como en send_notification)"""
+    return send_bulk_notification(staff_ids(), group='notifications_admins', **fields)
 
 
+# Eventos del outbox (ver outbox.py): los notify_* guardan las notificaciones
+# y devuelven los envíos; el outbox los publica y reintenta los que fallen
+
 def notify_new_order(order):
     """Notificar nueva orden"""
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
-
     # Notificar a todos los admins
-    admins = User.objects.filter(is_staff=True)
-    for admin in admins:
-        send_notification(
-            user=admin,
-            notification_type=NotificationType.NEW_ORDER,
-            title=f"Nueva Orden #{order.order_number}",
-            message=f"Se ha recibido una nueva orden de {order.user.get_full_name() or order.user.username} por S/ {order.total}",
-            priority=NotificationPriority.HIGH,
-            action_url=f"/admin/ordenes/{order.order_number}",
-            order_id=order.id,
-            metadata={
-                'order_number': order.order_number,
-                'customer_name': order.user.get_full_name() or order.user.username,
-                'total_amount': str(order.total),
-                'items_count': order.items.count()
-            }
-        )
+    _, deliveries = create_admin_notifications(
+        notification_type=NotificationType.NEW_ORDER,
+        title=f"Nueva Orden #{order.order_number}",
+        message=f"Se ha recibido una nueva orden de {order.user.get_full_name() or order.user.username} por S/ {order.total}",
+        priority=NotificationPriority.HIGH,
+        action_url=f"/admin/ordenes/{order.order_number}",
+        order_id=order.id,
+        metadata={
+            'order_number': order.order_number,
+            'customer_name': order.user.get_full_name() or order.user.username,
+            'total_amount': str(order.total),
+            'items_count': order.items.count()
+        }
+    )
 
     # Notificar al cliente
-    send_notification(
+    _, customer_deliveries = create_notification(
         user=order.user,
         notification_type=NotificationType.NEW_ORDER,
         title="Orden Confirmada",
@@ -156,23 +250,25 @@ def notify_new_order(order):
             'order_number': order.order_number
         }
     )
+    return deliveries + customer_deliveries
+
+
+ORDER_STATUS_MESSAGES = {
+    'processing': 'Tu orden está siendo procesada',
+    'shipped': 'Tu orden ha sido enviada',
+    'delivered': 'Tu orden ha sido entregada',
+    'cancelled': 'Tu orden ha sido cancelada'
+}
 
 
 def notify_order_status_change(order, old_status):
     """Notificar cambio de estado de orden"""
-    status_messages = {
-        'processing': 'Tu orden está siendo procesada',
-        'shipped': 'Tu orden ha sido enviada',
-        'delivered': 'Tu orden ha sido entregada',
-        'cancelled': 'Tu orden ha sido cancelada'
-    }
-
-    message = status_messages.get(
+    message = ORDER_STATUS_MESSAGES.get(
         order.status,
         f'El estado de tu orden ha cambiado a {order.get_status_display()}'
     )
 
-    send_notification(
+    _, deliveries = create_notification(
         user=order.user,
         notification_type=NotificationType.ORDER_STATUS,
         title=f"Actualización de Orden #{order.order_number}",
@@ -186,12 +282,77 @@ def notify_order_status_change(order, old_status):
             'new_status': order.status
         }
     )
+    return deliveries
+
+
+def create_notifications_bulk(notifications):
+    """
+    Guardar una lista de Notification (sin guardar, todas con usuario) con un
+    solo INSERT. Devuelve (notificaciones creadas, envíos a cada usuario)
+    """
+    if not notifications:
+        return [], []
+    created = Notification.objects.bulk_create(notifications)
+    incr_unread([notification.user_id for notification in created])
+    for notification in created:
+        wire.remember([notification])
+    return created, [user_delivery(notification.user_id, notification.id) for notification in created]
+
+
+def order_status_notification(order, old_status, old_payment_status=None):
+    """Notificación (sin guardar) para el cliente de una orden que cambió de estado"""
+    if order.status == 'payment_verified' and old_payment_status != order.payment_status:
+        return Notification(
+            user_id=order.user_id,
+            type=NotificationType.PAYMENT_CONFIRMED,
+            title="Pago Confirmado",
+            message=f"El pago de tu orden #{order.order_number} ha sido confirmado",
+            priority=NotificationPriority.MEDIUM,
+            action_url=f"/ordenes/{order.order_number}",
+            order_id=order.id,
+            metadata={
+                'order_number': order.order_number,
+                'old_status': old_status,
+                'new_status': order.status
+            }
+        )
+
+    return Notification(
+        user_id=order.user_id,
+        type=NotificationType.ORDER_STATUS,
+        title=f"Actualización de Orden #{order.order_number}",
+        message=ORDER_STATUS_MESSAGES.get(
+            order.status,
+            f'El estado de tu orden ha cambiado a {order.get_status_display()}'
+        ),
+        priority=NotificationPriority.MEDIUM,
+        action_url=f"/ordenes/{order.order_number}",
+        order_id=order.id,
+        metadata={
+            'order_number': order.order_number,
+            'old_status': old_status,
+            'new_status': order.status
+        }
+    )
+
+
+def notify_order_status_changes(changes):
+    """
+    Notificar a los clientes un lote de cambios de estado.
+    changes: lista de (orden, estado anterior, estado de pago anterior)
+    """
+    _, deliveries = create_notifications_bulk([
+        order_status_notification(order, old_status, old_payment_status)
+        for order, old_status, old_payment_status in changes
+        if order.user_id
+    ])
+    return deliveries
 
 
 def notify_payment_status(order, status):
     """Notificar estado de pago"""
     if status == 'confirmed':
-        send_notification(
+        _, deliveries = create_notification(
             user=order.user,
             notification_type=NotificationType.PAYMENT_CONFIRMED,
             title="Pago Confirmado",
@@ -205,91 +366,76 @@ def notify_payment_status(order, status):
         )
 
         # Notificar a admins
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        admins = User.objects.filter(is_staff=True)
-        for admin in admins:
-            send_notification(
-                user=admin,
-                notification_type=NotificationType.PAYMENT_CONFIRMED,
-                title=f"Pago Confirmado - Orden #{order.order_number}",
-                message=f"Se ha confirmado el pago de S/ {order.total} para la orden #{order.order_number}",
-                priority=NotificationPriority.HIGH,
-                action_url=f"/admin/ordenes/{order.order_number}",
-                order_id=order.id,
-                metadata={
-                    'order_number': order.order_number
-                }
-            )
-    else:
-        send_notification(
-            user=order.user,
-            notification_type=NotificationType.PAYMENT_FAILED,
-            title="Error en el Pago",
-            message=f"Hubo un problema procesando el pago de tu orden #{order.order_number}",
+        _, admin_deliveries = create_admin_notifications(
+            notification_type=NotificationType.PAYMENT_CONFIRMED,
+            title=f"Pago Confirmado - Orden #{order.order_number}",
+            message=f"Se ha confirmado el pago de S/ {order.total} para la orden #{order.order_number}",
             priority=NotificationPriority.HIGH,
-            action_url=f"/ordenes/{order.order_number}",
+            action_url=f"/admin/ordenes/{order.order_number}",
             order_id=order.id,
             metadata={
                 'order_number': order.order_number
             }
         )
+        return deliveries + admin_deliveries
+
+    _, deliveries = create_notification(
+        user=order.user,
+        notification_type=NotificationType.PAYMENT_FAILED,
+        title="Error en el Pago",
+        message=f"Hubo un problema procesando el pago de tu orden #{order.order_number}",
+        priority=NotificationPriority.HIGH,
+        action_url=f"/ordenes/{order.order_number}",
+        order_id=order.id,
+        metadata={
+            'order_number': order.order_number
+        }
+    )
+    return deliveries
 
 
 def notify_low_stock(product):
     """Notificar stock bajo"""
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
-    
-    # Notificar solo a admins
-    admins = User.objects.filter(is_staff=True)
-    
     notification_type = NotificationType.OUT_OF_STOCK if product.stock == 0 else NotificationType.LOW_STOCK
     title = f"Sin Stock: {product.name}" if product.stock == 0 else f"Stock Bajo: {product.name}"
     message = f"El producto {product.name} está sin stock" if product.stock == 0 else f"El producto {product.name} tiene solo {product.stock} unidades disponibles"
     
-    for admin in admins:
-        send_notification(
-            user=admin,
-            notification_type=notification_type,
-            title=title,
-            message=message,
-            priority=NotificationPriority.HIGH if product.stock == 0 else NotificationPriority.MEDIUM,
-            action_url=f"/admin/productos/editar/{product.id}",
-            product_id=product.id,
-            metadata={
-                'product_name': product.name,
-                'current_stock': product.stock,
-                'sku': product.sku
-            }
-        )
+    # Notificar solo a admins
+    _, deliveries = create_admin_notifications(
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        priority=NotificationPriority.HIGH if product.stock == 0 else NotificationPriority.MEDIUM,
+        action_url=f"/admin/productos/editar/{product.id}",
+        product_id=product.id,
+        metadata={
+            'product_name': product.name,
+            'current_stock': product.stock,
+            'sku': product.sku
+        }
+    )
+    return deliveries
 
 
 def notify_new_user(user):
     """Notificar registro de nuevo usuario"""
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
-    
     # Notificar a admins
-    admins = User.objects.filter(is_staff=True)
-    for admin in admins:
-        send_notification(
-            user=admin,
-            notification_type=NotificationType.NEW_USER,
-            title="Nuevo Usuario Registrado",
-            message=f"Se ha registrado un nuevo usuario: {user.get_full_name() or user.username}",
-            priority=NotificationPriority.LOW,
-            action_url=f"/admin/clientes/{user.id}",
-            user_id=user.id,
-            metadata={
-                'username': user.username,
-                'email': user.email,
-                'full_name': user.get_full_name()
-            }
-        )
+    _, deliveries = create_admin_notifications(
+        notification_type=NotificationType.NEW_USER,
+        title="Nuevo Usuario Registrado",
+        message=f"Se ha registrado un nuevo usuario: {user.get_full_name() or user.username}",
+        priority=NotificationPriority.LOW,
+        action_url=f"/admin/clientes/{user.id}",
+        metadata={
+            'user_id': user.id,
+            'username': user.username,
+            'email': user.email,
+            'full_name': user.get_full_name()
+        }
+    )
     
     # Notificar al nuevo usuario
-    send_notification(
+    _, welcome_deliveries = create_notification(
         user=user,
         notification_type=NotificationType.SYSTEM,
         title="¡Bienvenido!",
@@ -297,15 +443,33 @@ def notify_new_user(user):
         priority=NotificationPriority.LOW,
         action_url="/productos"
     )
+    return deliveries + welcome_deliveries
+
+
+def notify_coupon_used(usage):
+    """Notificar uso de cupón a los admins"""
+    _, deliveries = create_admin_notifications(
+        notification_type=NotificationType.COUPON_USED,
+        title=f"Cupón Usado: {usage.coupon.code}",
+        message=f"El usuario {usage.user.username} ha usado el cupón {usage.coupon.code} con descuento de S/ {usage.discount_amount}",
+        priority=NotificationPriority.LOW,
+        metadata={
+            'coupon_code': usage.coupon.code,
+            'user': usage.user.username,
+            'discount_amount': str(usage.discount_amount),
+            'discount_type': usage.coupon.discount_type,
+            'discount_value': str(usage.coupon.discount_value)
+        }
+    )
+    return deliveries
 
 
 def broadcast_promotion(title, message, action_url=None):
-    """Enviar promoción a todos los usuarios"""
-    from django.contrib.auth import get_user_model
-    User = get_user_model()
-    
-    # Crear notificación broadcast
-    send_notification(
+    """
+    Enviar promoción a todos los usuarios: una sola fila y un solo envío.
+    Cada usuario la ve en su bandeja (ver notifications/inbox.py)
+    """
+    return send_notification(
         notification_type=NotificationType.PROMOTION,
         title=title,
         message=message,
@@ -313,15 +477,3 @@ def broadcast_promotion(title, message, action_url=None):
         action_url=action_url,
         is_broadcast=True
     )
-    
-    # También crear notificaciones individuales para usuarios registrados
-    users = User.objects.filter(is_active=True)
-    for user in users:
-        send_notification(
-            user=user,
-            notification_type=NotificationType.PROMOTION,
-            title=title,
-            message=message,
-            priority=NotificationPriority.LOW,
-            action_url=action_url
-        )
@@ -1,11 +1,14 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from .counters import invalidate_unread, unread_count
+from .inbox import clear_all, dismiss, mark_all_read, mark_read, unread_for, visible_to
 from .models import Notification, NotificationType, NotificationPriority
 from .serializers import NotificationSerializer, BroadcastNotificationSerializer
 from .utils import send_notification
@@ -27,8 +30,17 @@ class NotificationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        """Obtener solo las notificaciones del usuario actual"""
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        """Notificaciones del usuario actual más los broadcasts vigentes"""
+        return visible_to(self.request.user).order_by('-created_at')
+
+    def perform_update(self, serializer):
+        if serializer.instance.is_broadcast:
+            raise PermissionDenied('Los broadcasts solo se pueden marcar como leídos o descartar')
+        serializer.save()
+        invalidate_unread(self.request.user.pk)
+
+    def perform_destroy(self, instance):
+        dismiss(self.request.user, instance)
     
     def get_serializer_class(self):
         if self.action == 'broadcast':
@@ -38,33 +50,28 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread(self, request):
         """Obtener notificaciones no leídas"""
-        notifications = self.get_queryset().filter(read=False)
+        notifications = unread_for(request.user).order_by('-created_at')
         serializer = self.get_serializer(notifications, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def count_unread(self, request):
         """Contador de notificaciones no leídas"""
-        count = self.get_queryset().filter(read=False).count()
+        count = unread_count(request.user)
         return Response({'count': count})
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         """Marcar notificación como leída"""
         notification = self.get_object()
-        notification.read = True
-        notification.read_at = timezone.now()
-        notification.save()
+        mark_read(request.user, notification)
         serializer = self.get_serializer(notification)
         return Response(serializer.data)
     
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """Marcar todas las notificaciones como leídas"""
-        updated = self.get_queryset().filter(read=False).update(
-            read=True,
-            read_at=timezone.now()
-        )
+        updated = mark_all_read(request.user)
         return Response({
             'message': f'{updated} notificaciones marcadas como leídas',
             'count': updated
@@ -72,18 +79,18 @@ class NotificationViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['delete'])
     def dismiss(self, request, pk=None):
-        """Eliminar una notificación"""
+        """Eliminar una notificación (los broadcasts solo se ocultan para el usuario)"""
         notification = self.get_object()
-        notification.delete()
+        dismiss(request.user, notification)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
     @action(detail=False, methods=['delete'])
     def clear_all(self, request):
         """Eliminar todas las notificaciones del usuario"""
-        deleted = self.get_queryset().delete()
+        deleted = clear_all(request.user)
         return Response({
-            'message': f'{deleted[0]} notificaciones eliminadas',
-            'count': deleted[0]
+            'message': f'{deleted} notificaciones eliminadas',
+            'count': deleted
         })
     
     @action(detail=False, methods=['post'])
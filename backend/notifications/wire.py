@@ -0,0 +1,135 @@
+"""
+Formato de las notificaciones en el WebSocket
+
+Una sola forma para todo lo que sale por el WebSocket (push en tiempo real,
+carga inicial y páginas del consumer), codificada una vez:
+
+- body(): los campos comunes a todos los destinatarios (tipo, textos, icono,
+  color, fecha, metadata) como JSON. Se genera al crear la notificación
+  (remember) y queda en caché; las lecturas posteriores lo toman de ahí con
+  un get_many por página.
+- with_state(): agrega al body lo que depende del destinatario (id de su
+  fila, read, read_at) sin volver a codificar el resto: el body termina en
+  "}" y se le concatenan esos campos.
+- frame(): arma el mensaje completo con partes ya codificadas (Raw).
+
+Se usa orjson si está instalado (varias veces más rápido); si no, json de la
+librería estándar con la misma salida compacta. El comando
+benchmark_notification_encoding compara ambos caminos con el anterior.
+
+La API REST sigue usando NotificationSerializer (otros campos y paginación).
+"""
+
+import json
+from django.core.cache import cache
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+WIRE_KEY = 'notification_wire:{}'
+
+# Un solo encoder: json.dumps con argumentos crea uno nuevo en cada llamada
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+# Las notificaciones se editan muy rara vez (admin o PATCH, que invalidan)
+WIRE_TTL = 60 * 60 * 24
+
+
+class Raw:
+    """Fragmento JSON ya codificado que frame() inserta tal cual"""
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+
+def dumps(data):
+    """JSON compacto en bytes"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return _json_encoder.encode(data).encode()
+
+
+def render(notification):
+    """Campos comunes a todos los destinatarios"""
+    return {
+        'type': notification.type,
+        'title': notification.title,
+        'message': notification.message,
+        'icon': notification.type_icon,
+        'priority': notification.priority,
+        'priority_color': notification.priority_color,
+        'action_url': notification.action_url,
+        'created_at': notification.created_at.isoformat(),
+        'metadata': notification.metadata,
+    }
+
+
+def body(notification):
+    return dumps(render(notification))
+
+
+def remember(notifications):
+    """Codificar y guardar en caché (al crear). Todas comparten contenido; devuelve el body"""
+    encoded = body(notifications[0])
+    cache.set_many({WIRE_KEY.format(n.pk): encoded for n in notifications}, timeout=WIRE_TTL)
+    return encoded
+
+
+def forget(notification_id):
+    cache.delete(WIRE_KEY.format(notification_id))
+
+
+def bodies(notifications):
+    """Body de cada notificación: de la caché, o codificado y guardado si falta"""
+    keys = [WIRE_KEY.format(n.pk) for n in notifications]
+    found = cache.get_many(keys)
+    missing = {}
+    result = []
+    for key, notification in zip(keys, notifications):
+        encoded = found.get(key)
+        if encoded is None:
+            encoded = missing[key] = body(notification)
+        result.append(encoded)
+    if missing:
+        cache.set_many(missing, timeout=WIRE_TTL)
+    return result
+
+
+def body_by_id(notification_id):
+    """Body de una notificación ya creada: de la caché, o leída de la base si falta"""
+    encoded = cache.get(WIRE_KEY.format(notification_id))
+    if encoded is None:
+        from .models import Notification
+        encoded, = bodies([Notification.objects.get(pk=notification_id)])
+    return encoded
+
+
+def with_state(encoded, notification_id, read=False, read_at=None):
+    """Body + campos del destinatario (valores que no necesitan escaparse)"""
+    return b''.join((
+        encoded[:-1],
+        b',"id":', str(int(notification_id)).encode(),
+        b',"read":', b'true' if read else b'false',
+        b',"read_at":', b'"%s"' % read_at.isoformat().encode() if read_at else b'null',
+        b'}',
+    ))
+
+
+def encode_items(notifications):
+    """Lista JSON con la lectura del usuario (is_read / user_read_at)"""
+    items = [
+        with_state(encoded, n.pk, n.is_read, n.user_read_at)
+        for encoded, n in zip(bodies(notifications), notifications)
+    ]
+    return b'[' + b','.join(items) + b']'
+
+
+def frame(frame_type, **fields):
+    """Mensaje del WebSocket como texto; los valores Raw ya vienen codificados"""
+    parts = [b'"type":' + dumps(frame_type)]
+    for key, value in fields.items():
+        parts.append(dumps(key) + b':' + (value.data if isinstance(value, Raw) else dumps(value)))
+    return (b'{' + b','.join(parts) + b'}').decode()
@@ -1,7 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.utils.safestring import mark_safe
 from django.db.models import Sum
-from .models import Cart, CartItem, Order, OrderItem, ShippingZone, OrderStatusHistory, PaymentMethod
+from .models import (
+    ArchivedOrder, Cart, CartItem, Order, OrderItem, ShippingZone, OrderStatusHistory, PaymentMethod, PaymentProof
+)
+from .transitions import transition_orders
 
 
 @admin.register(Cart)
@@ -102,7 +105,7 @@ class OrderAdmin(admin.ModelAdmin):
     ]
     readonly_fields = [
         'order_number', 'user', 'created_at', 'updated_at',
-        'subtotal', 'shipping_cost', 'tax', 'discount', 'total'
+        'subtotal', 'shipping_cost', 'tax', 'discount', 'total', 'payment_proof_preview'
     ]
     date_hierarchy = 'created_at'
     inlines = [OrderItemInline, OrderStatusHistoryInline]
@@ -130,7 +133,7 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('subtotal', 'shipping_cost', 'tax', 'discount', 'total')
         }),
         ('Pago', {
-            'fields': ('payment_method', 'payment_proof', 'transaction_id')
+            'fields': ('payment_method', 'payment_proof', 'payment_proof_preview', 'transaction_id')
         }),
         ('Envío', {
             'fields': ('tracking_number', 'shipped_date', 'delivered_date')
@@ -193,25 +196,44 @@ class OrderAdmin(admin.ModelAdmin):
             return obj.get_payment_method_display()
         return obj.payment_method
 
+    @admin.display(description='Vista previa del comprobante')
+    def payment_proof_preview(self, obj):
+        proof = obj.payment_proofs.filter(status='ready').order_by('-id').first()
+        if not proof:
+            return '-'
+        return mark_safe(
+            f'<a href="{proof.image.url}" target="_blank"><img src="{proof.thumbnail.url}" style="max-height: 160px;"/></a>'
+            f'<br>{proof.width}x{proof.height} · {proof.size // 1024} KB'
+        )
+
+    def transition(self, request, queryset, target, label):
+        """Cambio de estado en lote con historial y notificaciones (orders.transitions)"""
+        updated, skipped = transition_orders(queryset, target, changed_by=request.user)
+        self.message_user(request, f'{len(updated)} órdenes marcadas como {label}')
+        if skipped:
+            self.message_user(
+                request,
+                f'{len(skipped)} órdenes omitidas: ' + ', '.join(
+                    f'{order.order_number} ({error})' for order, error in skipped[:10]
+                ),
+                level=messages.WARNING
+            )
+
     @admin.action(description='Marcar pago como verificado')
     def mark_as_payment_verified(self, request, queryset):
-        updated = queryset.update(status='payment_verified', payment_status='paid')
-        self.message_user(request, f'{updated} órdenes marcadas como pago verificado')
+        self.transition(request, queryset, 'payment_verified', 'pago verificado')
 
     @admin.action(description='Marcar como en proceso')
     def mark_as_processing(self, request, queryset):
-        updated = queryset.update(status='processing')
-        self.message_user(request, f'{updated} órdenes marcadas como en proceso')
+        self.transition(request, queryset, 'processing', 'en proceso')
 
     @admin.action(description='Marcar como enviado')
     def mark_as_shipped(self, request, queryset):
-        updated = queryset.update(status='shipped')
-        self.message_user(request, f'{updated} órdenes marcadas como enviadas')
+        self.transition(request, queryset, 'shipped', 'enviadas')
 
     @admin.action(description='Marcar como entregado')
     def mark_as_delivered(self, request, queryset):
-        updated = queryset.update(status='delivered')
-        self.message_user(request, f'{updated} órdenes marcadas como entregadas')
+        self.transition(request, queryset, 'delivered', 'entregadas')
 
 
 @admin.register(OrderItem)
@@ -350,4 +372,46 @@ class PaymentMethodAdmin(admin.ModelAdmin):
 
     @admin.display(description='Requiere Comprobante', boolean=True)
     def requires_proof_badge(self, obj):
-        return obj.requires_proof
\ No newline at end of file
+        return obj.requires_proof
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Solo lectura: las órdenes llegan aquí con el comando archive_orders"""
+    list_display = ['order_number', 'email', 'status', 'total', 'created_at', 'archived_at']
+    list_filter = ['status']
+    search_fields = ['order_number', 'email']
+    readonly_fields = ['id', 'order_number', 'user', 'email', 'status', 'total', 'data', 'created_at', 'archived_at']
+    date_hierarchy = 'created_at'
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(PaymentProof)
+class PaymentProofAdmin(admin.ModelAdmin):
+    """Solo lectura: los comprobantes se procesan en orders/proofs.py"""
+    list_display = ['id', 'order_link', 'status', 'attempts', 'dimensions', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['order__order_number']
+    readonly_fields = [
+        'order', 'status', 'original', 'original_size', 'image', 'thumbnail', 'width', 'height', 'size',
+        'attempts', 'error', 'created_at', 'started_at', 'processed_at'
+    ]
+    list_select_related = ['order']
+    date_hierarchy = 'created_at'
+
+    @admin.display(description='Orden')
+    def order_link(self, obj):
+        return mark_safe(f'<a href="/admin/orders/order/{obj.order.id}/change/">{obj.order.order_number}</a>')
+
+    @admin.display(description='Medidas')
+    def dimensions(self, obj):
+        return f'{obj.width}x{obj.height}' if obj.width else '-'
+
+    def has_add_permission(self, request):
+        return False
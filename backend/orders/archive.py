@@ -0,0 +1,129 @@
+"""
+Archivo de órdenes cerradas
+
+archive_orders mueve las órdenes entregadas o canceladas con más de N meses
+de las tablas vivas a ArchivedOrder, por lotes y en una transacción por
+lote: guarda la orden serializada (items e historial incluidos), desvincula
+los usos de cupón (se conservan para los límites por usuario) y borra la
+orden, que arrastra sus items y su historial.
+
+El detalle /api/orders/{order_number}/ sigue funcionando: si la orden no
+está viva se busca en el archivo (get_archived_order). Con números de orden
+con fecha (orders.numbers) la búsqueda acota created_at y PostgreSQL solo
+revisa la partición del mes.
+
+Los productos relacionados (products.recommendations) se calculan solo con
+las órdenes vivas.
+"""
+
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+from coupons.models import CouponUsage
+from . import partitions
+from .models import ArchivedOrder, Order, OrderStatusHistory
+from .numbers import number_timestamp
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+# Antigüedad mínima por defecto (meses completos)
+ARCHIVE_AFTER_MONTHS = 12
+
+# Órdenes movidas por transacción
+ARCHIVE_BATCH_SIZE = 500
+
+
+def archive_cutoff(months, now=None):
+    """Inicio del mes de hace N meses: se archivan meses completos"""
+    month = partitions.add_months(partitions.month_start(now or timezone.now()), -months)
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def archivable_orders(months=ARCHIVE_AFTER_MONTHS, now=None):
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, created_at__lt=archive_cutoff(months, now))
+
+
+def snapshot(order):
+    """OrderSerializer de la orden más su historial, en JSON plano"""
+    from .serializers import OrderSerializer
+
+    data = OrderSerializer(order).data
+    data['status_history'] = [
+        {
+            'status': entry.status,
+            'notes': entry.notes,
+            'changed_by': entry.changed_by.username if entry.changed_by else None,
+            'created_at': entry.created_at,
+        }
+        for entry in order.status_history.all()
+    ]
+    data['archived'] = True
+    return json.loads(json.dumps(data, cls=JSONEncoder))
+
+
+def archive_batch(queryset, batch_size):
+    """Archivar un lote. Devuelve cuántas órdenes movió"""
+    with transaction.atomic():
+        orders = list(queryset.select_for_update(skip_locked=True).order_by('id')[:batch_size])
+        if not orders:
+            return 0
+        prefetch_related_objects(
+            orders, 'items', 'payment_proofs',
+            Prefetch('status_history', queryset=OrderStatusHistory.objects.select_related('changed_by')),
+        )
+
+        if partitions.is_partitioned():
+            partitions.ensure_partitions(
+                min(order.created_at for order in orders), max(order.created_at for order in orders)
+            )
+
+        ArchivedOrder.objects.bulk_create([
+            ArchivedOrder(
+                id=order.id,
+                order_number=order.order_number,
+                user_id=order.user_id,
+                email=order.email,
+                status=order.status,
+                total=order.total,
+                data=snapshot(order),
+                created_at=order.created_at,
+            )
+            for order in orders
+        ])
+
+        order_ids = [order.id for order in orders]
+        CouponUsage.objects.filter(order_id__in=order_ids).update(order=None)
+        Order.objects.filter(id__in=order_ids).delete()
+    return len(orders)
+
+
+def archive_orders(months=ARCHIVE_AFTER_MONTHS, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """Mover todas las órdenes archivables. Devuelve cuántas"""
+    queryset = archivable_orders(months, now)
+    archived = 0
+    while True:
+        moved = archive_batch(queryset, batch_size)
+        if not moved:
+            return archived
+        archived += moved
+
+
+def get_archived_order(order_number, user=None):
+    """Orden archivada por número (de user si se indica), o None"""
+    queryset = ArchivedOrder.objects.filter(order_number=order_number)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+
+    placed_at = number_timestamp(order_number)
+    if placed_at:
+        # created_at se asigna en el mismo save que generó el número
+        archived = queryset.filter(
+            created_at__gte=placed_at - timedelta(days=1), created_at__lt=placed_at + timedelta(days=1)
+        ).first()
+        if archived:
+            return archived
+    # Números antiguos, o created_at corregido a mano: revisar todas las particiones
+    return queryset.first()
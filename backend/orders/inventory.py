@@ -0,0 +1,226 @@
+"""
+Reservas y descuento de stock
+
+Reservas: cada línea del carrito mantiene una StockHold con vencimiento
+(HOLD_TTL). El disponible de un producto o variante es su stock menos las
+reservas vigentes de otros carritos; las vencidas se ignoran en las
+consultas y release_expired_holds las borra por lotes.
+
+Descuento al crear la orden: todo el pedido se descuenta con dos UPDATE
+(productos y variantes):
+1. Se bloquean las filas con select_for_update siempre en el mismo orden
+   (productos por id y luego variantes por id), así dos checkouts con los
+   mismos productos no pueden bloquearse mutuamente.
+2. Las líneas con reserva vigente ya tienen su stock apartado; solo las que
+   no la tienen se comparan contra stock - reservas de otros carritos.
+3. Cada UPDATE lleva la condición stock >= cantidad por fila; si alguna fila
+   no cumple, la cantidad de filas actualizadas no coincide y se aborta todo.
+4. sales_count se incrementa en el mismo UPDATE de productos, y las reservas
+   del pedido se borran.
+
+Debe llamarse dentro de una transacción. Como .update() no dispara signals,
+la caché se invalida al confirmar y las alertas de stock bajo se publican en
+el outbox de notifications (se envían al confirmar).
+"""
+
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.utils import timezone
+from notifications.outbox import publish_many
+from products.cache import invalidate_products
+from products.models import Product, ProductVariant
+from .models import StockHold
+
+# Mismo umbral que la alerta por signal de notifications
+LOW_STOCK_ALERT = 5
+
+# Duración de una reserva desde el último cambio de la línea del carrito
+HOLD_TTL = timedelta(minutes=15)
+
+# Reservas vencidas borradas por DELETE
+SWEEP_BATCH_SIZE = 1000
+
+
+class InsufficientStock(Exception):
+    """Algún item del pedido no tiene stock suficiente"""
+
+    def __init__(self, name, available=None):
+        self.name = name
+        self.available = available
+        super().__init__(f'Stock insuficiente para {name}')
+
+
+def active_holds(now=None):
+    return StockHold.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(product_ids=(), variant_ids=(), exclude_items=(), now=None):
+    """
+    Reservas vigentes agrupadas: ({product_id: cantidad}, {variant_id: cantidad}).
+    Las de productos solo cuentan líneas sin variante.
+    """
+    conditions = Q(pk__in=[])
+    if product_ids:
+        conditions |= Q(product_id__in=product_ids, variant__isnull=True)
+    if variant_ids:
+        conditions |= Q(variant_id__in=variant_ids)
+
+    rows = active_holds(now).filter(conditions).exclude(cart_item__in=exclude_items).values(
+        'product_id', 'variant_id'
+    ).annotate(total=Sum('quantity')).order_by()
+
+    by_product, by_variant = Counter(), Counter()
+    for row in rows:
+        if row['variant_id']:
+            by_variant[row['variant_id']] += row['total']
+        else:
+            by_product[row['product_id']] += row['total']
+    return by_product, by_variant
+
+
+def hold_stock(cart_item):
+    """
+    Crear o renovar la reserva de una línea del carrito con su cantidad actual.
+    Lanza InsufficientStock (con el disponible) si no alcanza; debe ir en una transacción.
+    """
+    now = timezone.now()
+
+    # Bloquear la fila serializa las reservas concurrentes del mismo producto
+    if cart_item.variant_id:
+        stock = ProductVariant.objects.select_for_update().values_list('stock', flat=True).get(
+            pk=cart_item.variant_id
+        )
+        _, held = held_quantities(variant_ids=[cart_item.variant_id], exclude_items=[cart_item], now=now)
+        available = stock - held[cart_item.variant_id]
+    else:
+        stock = Product.objects.select_for_update().values_list('stock', flat=True).get(
+            pk=cart_item.product_id
+        )
+        held, _ = held_quantities(product_ids=[cart_item.product_id], exclude_items=[cart_item], now=now)
+        available = stock - held[cart_item.product_id]
+
+    if available < cart_item.quantity:
+        raise InsufficientStock(cart_item.product.name, max(available, 0))
+
+    StockHold.objects.update_or_create(
+        cart_item=cart_item,
+        defaults={
+            'product_id': cart_item.product_id,
+            'variant_id': cart_item.variant_id,
+            'quantity': cart_item.quantity,
+            'expires_at': now + HOLD_TTL,
+        },
+    )
+
+
+def release_expired_holds(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """Borrar reservas vencidas por lotes (usa el índice de expires_at). Devuelve cuántas"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            StockHold.objects.filter(expires_at__lte=now).order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        released += StockHold.objects.filter(id__in=ids).delete()[0]
+
+
+def decrement_stock(items):
+    """
+    Descontar el stock de los items (CartItem con product y variant cargados).
+    Lanza InsufficientStock sin haber modificado nada si alguno no alcanza.
+    """
+    product_qty = Counter()   # stock del producto (items sin variante)
+    variant_qty = Counter()
+    sold_qty = Counter()      # sales_count por producto
+    names = {}
+
+    for item in items:
+        sold_qty[item.product_id] += item.quantity
+        if item.variant_id:
+            variant_qty[item.variant_id] += item.quantity
+            names[('variant', item.variant_id)] = item.product.name
+        else:
+            product_qty[item.product_id] += item.quantity
+            names[('product', item.product_id)] = item.product.name
+
+    # Bloqueo en orden determinista
+    products = {
+        product.id: product
+        for product in Product.objects.select_for_update().filter(id__in=sold_qty).order_by('id')
+    }
+    variants = {
+        variant.id: variant
+        for variant in ProductVariant.objects.select_for_update().filter(id__in=variant_qty).order_by('id')
+    }
+
+    # Reservas propias vigentes: esas líneas ya tienen el stock apartado
+    now = timezone.now()
+    holds = dict(active_holds(now).filter(cart_item__in=items).values_list('cart_item_id', 'quantity'))
+    uncovered = [item for item in items if holds.get(item.id, 0) < item.quantity]
+
+    held_products, held_variants = Counter(), Counter()
+    if uncovered:
+        held_products, held_variants = held_quantities(
+            product_ids=[item.product_id for item in uncovered if not item.variant_id],
+            variant_ids=[item.variant_id for item in uncovered if item.variant_id],
+            exclude_items=items,
+            now=now,
+        )
+
+    for product_id, quantity in product_qty.items():
+        if product_id not in products or products[product_id].stock - held_products[product_id] < quantity:
+            raise InsufficientStock(names[('product', product_id)])
+    for variant_id, quantity in variant_qty.items():
+        if variant_id not in variants or variants[variant_id].stock - held_variants[variant_id] < quantity:
+            raise InsufficientStock(names[('variant', variant_id)])
+
+    # Productos: stock condicional (sin variante) y sales_count en un UPDATE
+    conditions = [
+        Q(id=product_id, stock__gte=product_qty[product_id]) if product_id in product_qty else Q(id=product_id)
+        for product_id in sold_qty
+    ]
+    stock_cases = [When(id=product_id, then=F('stock') - quantity) for product_id, quantity in product_qty.items()]
+    updated = Product.objects.filter(reduce(or_, conditions)).update(
+        stock=Case(*stock_cases, default=F('stock')) if stock_cases else F('stock'),
+        sales_count=Case(
+            *[When(id=product_id, then=F('sales_count') + quantity) for product_id, quantity in sold_qty.items()],
+            default=F('sales_count'),
+        ),
+    )
+    if updated != len(sold_qty):
+        raise InsufficientStock(next(iter(names.values())))
+
+    if variant_qty:
+        updated = ProductVariant.objects.filter(reduce(or_, [
+            Q(id=variant_id, stock__gte=quantity) for variant_id, quantity in variant_qty.items()
+        ])).update(stock=Case(
+            *[When(id=variant_id, then=F('stock') - quantity) for variant_id, quantity in variant_qty.items()],
+            default=F('stock'),
+        ))
+        if updated != len(variant_qty):
+            raise InsufficientStock(next(iter(names.values())))
+
+    # Las reservas quedan convertidas en descuento
+    if holds:
+        StockHold.objects.filter(cart_item__in=items).delete()
+
+    # Reflejar los valores nuevos en las instancias bloqueadas
+    low_stock = []
+    for product_id, product in products.items():
+        product.sales_count += sold_qty[product_id]
+        if product_id in product_qty:
+            product.stock -= product_qty[product_id]
+            if product.stock <= LOW_STOCK_ALERT:
+                low_stock.append(product)
+
+    publish_many('low_stock', [{'product_id': product.id} for product in low_stock])
+
+    sold_out = any(product.stock <= 0 for product in low_stock)
+    transaction.on_commit(lambda: invalidate_products(list(products), sold_out=sold_out))
+    return products
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from orders.archive import (
+    ARCHIVE_AFTER_MONTHS, ARCHIVE_BATCH_SIZE, archivable_orders, archive_cutoff, archive_orders
+)
+
+
+class Command(BaseCommand):
+    help = 'Mover al archivo las órdenes entregadas o canceladas con más de N meses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=ARCHIVE_AFTER_MONTHS,
+            help='Antigüedad mínima en meses completos',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ARCHIVE_BATCH_SIZE,
+            help='Órdenes movidas por transacción',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar las órdenes a archivar')
+
+    def handle(self, *args, **options):
+        months = options['months']
+        if months < 1:
+            raise CommandError('--months debe ser al menos 1')
+
+        cutoff = archive_cutoff(months)
+        if options['dry_run']:
+            count = archivable_orders(months).count()
+            self.stdout.write(f'{count} órdenes anteriores a {cutoff:%Y-%m-%d} se archivarían')
+            return
+
+        archived = archive_orders(months, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {archived} órdenes anteriores a {cutoff:%Y-%m-%d} archivadas'))
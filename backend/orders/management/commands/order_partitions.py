@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from orders import partitions
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Particionar por mes el archivo de órdenes (PostgreSQL) y crear las particiones que falten'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--setup',
+            action='store_true',
+            help='Convertir la tabla del archivo en tabla particionada (una sola vez)',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=partitions.MONTHS_AHEAD,
+            help='Meses futuros a crear por adelantado',
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.supported():
+            raise CommandError('El particionado requiere PostgreSQL')
+
+        if options['setup'] and partitions.setup_partitioning():
+            self.stdout.write(self.style.SUCCESS(f'✅ {partitions.TABLE} convertida en tabla particionada'))
+        if not partitions.is_partitioned():
+            raise CommandError(f'{partitions.TABLE} no está particionada; ejecuta con --setup')
+
+        # Desde la orden viva más antigua (la próxima en archivarse) hasta los meses futuros
+        now = timezone.now()
+        oldest = Order.objects.aggregate(oldest=Min('created_at'))['oldest'] or now
+        last = partitions.add_months(partitions.month_start(now), options['ahead'])
+        created = partitions.ensure_partitions(oldest, last)
+
+        for name in created:
+            self.stdout.write(f'  + {name}')
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(created)} particiones creadas'))
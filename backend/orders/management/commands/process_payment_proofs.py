@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from orders.proofs import process_pending
+
+
+class Command(BaseCommand):
+    help = 'Procesar los comprobantes de pago pendientes, fallidos o colgados'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Máximo de comprobantes a procesar',
+        )
+
+    def handle(self, *args, **options):
+        ready, failed = process_pending(options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {ready} comprobantes procesados, {failed} con error'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from orders.inventory import SWEEP_BATCH_SIZE, release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Liberar las reservas de stock vencidas de los carritos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SWEEP_BATCH_SIZE,
+            help='Cantidad de reservas borradas por DELETE',
+        )
+
+    def handle(self, *args, **options):
+        released = release_expired_holds(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {released} reservas liberadas'))
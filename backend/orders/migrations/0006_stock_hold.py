@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_cursor_pagination_indexes'),
+        ('products', '0007_product_association'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Cantidad')),
+                ('expires_at', models.DateTimeField(verbose_name='Vence')),
+                ('cart_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hold', to='orders.cartitem')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_holds', to='products.product')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_holds', to='products.productvariant')),
+            ],
+            options={
+                'verbose_name': 'Reserva de stock',
+                'verbose_name_plural': 'Reservas de stock',
+                'indexes': [models.Index(fields=['expires_at'], name='orders_stoc_expires_a9b1e2_idx'), models.Index(fields=['product', 'expires_at'], name='orders_stoc_product_4229f0_idx'), models.Index(fields=['variant', 'expires_at'], name='orders_stoc_variant_3d475b_idx')],
+            },
+        ),
+    ]
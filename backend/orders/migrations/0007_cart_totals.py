@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:50
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    """Calcular los totales de los carritos existentes"""
+    Cart = apps.get_model('orders', 'Cart')
+    CartItem = apps.get_model('orders', 'CartItem')
+    items = CartItem.objects.filter(cart=models.OuterRef('pk')).order_by().values('cart')
+    Cart.objects.update(
+        item_count=Coalesce(models.Subquery(items.annotate(total=models.Sum('quantity')).values('total')), 0),
+        subtotal=Coalesce(
+            models.Subquery(items.annotate(
+                total=models.Sum(models.F('quantity') * models.F('price'), output_field=models.DecimalField())
+            ).values('total')),
+            Decimal('0'),
+            output_field=models.DecimalField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_stock_hold'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Cantidad de items'),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Subtotal'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
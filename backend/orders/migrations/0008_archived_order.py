@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_cart_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('order_number', models.CharField(db_index=True, max_length=50, verbose_name='Número de orden')),
+                ('email', models.EmailField(max_length=254, verbose_name='Email')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('payment_pending', 'Esperando Pago'), ('payment_verified', 'Pago Verificado'), ('processing', 'Procesando'), ('shipped', 'Enviado'), ('delivered', 'Entregado'), ('cancelled', 'Cancelado'), ('refunded', 'Reembolsado')], max_length=20, verbose_name='Estado')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Total')),
+                ('data', models.JSONField(verbose_name='Orden serializada')),
+                ('created_at', models.DateTimeField(verbose_name='Fecha de creación')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de archivo')),
+                ('user', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Orden Archivada',
+                'verbose_name_plural': 'Órdenes Archivadas',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='orders_arch_user_id_6febd8_idx'), models.Index(fields=['created_at'], name='orders_arch_created_91566f_idx')],
+            },
+        ),
+    ]
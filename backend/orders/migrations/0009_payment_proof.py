@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_archived_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentProof',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('processing', 'Procesando'), ('ready', 'Listo'), ('failed', 'Error')], default='pending', max_length=20, verbose_name='Estado')),
+                ('original', models.FileField(blank=True, upload_to='payment_proofs/incoming/', verbose_name='Archivo original')),
+                ('original_size', models.PositiveIntegerField(verbose_name='Tamaño original (bytes)')),
+                ('image', models.ImageField(blank=True, upload_to='payment_proofs/', verbose_name='Imagen')),
+                ('thumbnail', models.ImageField(blank=True, upload_to='payment_proofs/thumbs/', verbose_name='Miniatura')),
+                ('width', models.PositiveIntegerField(blank=True, null=True, verbose_name='Ancho')),
+                ('height', models.PositiveIntegerField(blank=True, null=True, verbose_name='Alto')),
+                ('size', models.PositiveIntegerField(blank=True, null=True, verbose_name='Tamaño (bytes)')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Fecha de subida')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Inicio del proceso')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Fecha de proceso')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_proofs', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Comprobante de Pago',
+                'verbose_name_plural': 'Comprobantes de Pago',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='orders_paym_status_83dabb_idx')],
+            },
+        ),
+    ]
@@ -1,7 +1,10 @@
-from django.db import models
+from decimal import Decimal
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce
 from django.conf import settings
+from django.utils import timezone
 from products.models import Product, ProductVariant
-import uuid
+from .numbers import generate_order_number
 
 
 class Cart(models.Model):
@@ -15,6 +18,10 @@ class Cart(models.Model):
     coupon_code = models.CharField('Código de cupón', max_length=50, blank=True, null=True)
     discount_amount = models.DecimalField('Monto de descuento', max_digits=10, decimal_places=2, default=0)
 
+    # Totales mantenidos al cambiar los items (ver signals.py)
+    item_count = models.PositiveIntegerField('Cantidad de items', default=0)
+    subtotal = models.DecimalField('Subtotal', max_digits=12, decimal_places=2, default=0)
+
     created_at = models.DateTimeField('Creado', auto_now_add=True)
     updated_at = models.DateTimeField('Actualizado', auto_now=True)
 
@@ -28,13 +35,26 @@ class Cart(models.Model):
     @property
     def total_items(self):
         """Total de items en el carrito"""
-        return sum(item.quantity for item in self.items.all())
+        return self.item_count
+
+    @classmethod
+    def update_totals(cls, cart_ids):
+        """Recalcular item_count y subtotal con un solo UPDATE"""
+        items = CartItem.objects.filter(cart=models.OuterRef('pk')).order_by().values('cart')
+        return cls.objects.filter(pk__in=cart_ids).update(
+            item_count=Coalesce(
+                models.Subquery(items.annotate(total=models.Sum('quantity')).values('total')), 0
+            ),
+            subtotal=Coalesce(
+                models.Subquery(items.annotate(
+                    total=models.Sum(models.F('quantity') * models.F('price'), output_field=models.DecimalField())
+                ).values('total')),
+                Decimal('0'),
+                output_field=models.DecimalField(),
+            ),
+            updated_at=timezone.now(),
+        )
 
-    @property
-    def subtotal(self):
-        """Subtotal del carrito"""
-        return sum(item.total_price for item in self.items.all())
-    
     def get_total(self):
         """Total con descuento aplicado"""
         subtotal = self.subtotal
@@ -75,6 +95,37 @@ class CartItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockHold(models.Model):
+    """
+    Reserva temporal de stock para una línea del carrito.
+    Disponible = stock - reservas vigentes (ver inventory.py)
+    """
+
+    cart_item = models.OneToOneField(CartItem, on_delete=models.CASCADE, related_name='hold')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_holds')
+    variant = models.ForeignKey(ProductVariant, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='stock_holds')
+
+    quantity = models.PositiveIntegerField('Cantidad')
+    expires_at = models.DateTimeField('Vence')
+
+    class Meta:
+        verbose_name = 'Reserva de stock'
+        verbose_name_plural = 'Reservas de stock'
+        indexes = [
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['product', 'expires_at']),
+            models.Index(fields=['variant', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id} hasta {self.expires_at:%H:%M}"
+
+
+# Intentos de Order.save si el número generado ya existe
+ORDER_NUMBER_ATTEMPTS = 3
+
+
 class Order(models.Model):
     """Orden de compra"""
 
@@ -159,13 +210,27 @@ class Order(models.Model):
             models.Index(fields=['user']),
             models.Index(fields=['status']),
             models.Index(fields=['-created_at']),
+            # Paginación por cursor: (campo de orden, id)
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['user', '-created_at', '-id']),
         ]
 
     def save(self, *args, **kwargs):
-        if not self.order_number:
-            # Generar número de orden único
-            self.order_number = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-        super().save(*args, **kwargs)
+        if self.order_number:
+            return super().save(*args, **kwargs)
+
+        # Número ordenado por tiempo (orders.numbers); el índice único es la
+        # última garantía: ante un choque se reintenta con otro número
+        for attempt in range(ORDER_NUMBER_ATTEMPTS):
+            self.order_number = generate_order_number()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                duplicated = Order.objects.filter(order_number=self.order_number).exists()
+                if not duplicated or attempt == ORDER_NUMBER_ATTEMPTS - 1:
+                    self.order_number = ''
+                    raise
 
     def __str__(self):
         return f"Orden {self.order_number}"
@@ -212,6 +277,52 @@ class OrderItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class PaymentProof(models.Model):
+    """
+    Comprobante de pago subido para una orden (ver orders/proofs.py).
+    original es el archivo tal como llegó; al procesarse queda la imagen
+    reducida y sin metadatos en image, la miniatura para el admin y las
+    medidas, y original se borra.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('processing', 'Procesando'),
+        ('ready', 'Listo'),
+        ('failed', 'Error'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='payment_proofs')
+    status = models.CharField('Estado', max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    original = models.FileField('Archivo original', upload_to='payment_proofs/incoming/', blank=True)
+    original_size = models.PositiveIntegerField('Tamaño original (bytes)')
+
+    image = models.ImageField('Imagen', upload_to='payment_proofs/', blank=True)
+    thumbnail = models.ImageField('Miniatura', upload_to='payment_proofs/thumbs/', blank=True)
+    width = models.PositiveIntegerField('Ancho', null=True, blank=True)
+    height = models.PositiveIntegerField('Alto', null=True, blank=True)
+    size = models.PositiveIntegerField('Tamaño (bytes)', null=True, blank=True)
+
+    attempts = models.PositiveSmallIntegerField('Intentos', default=0)
+    error = models.TextField('Error', blank=True)
+
+    created_at = models.DateTimeField('Fecha de subida', auto_now_add=True)
+    started_at = models.DateTimeField('Inicio del proceso', null=True, blank=True)
+    processed_at = models.DateTimeField('Fecha de proceso', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Comprobante de Pago'
+        verbose_name_plural = 'Comprobantes de Pago'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Comprobante {self.order_id} ({self.status})"
+
+
 class OrderStatusHistory(models.Model):
     """Historial de cambios de estado de la orden"""
 
@@ -231,6 +342,42 @@ class OrderStatusHistory(models.Model):
         return f"{self.order.order_number} - {self.status}"
 
 
+class ArchivedOrder(models.Model):
+    """
+    Orden antigua ya cerrada (entregada o cancelada), fuera de las tablas vivas.
+    Conserva el id y el número de la orden y, en data, el OrderSerializer
+    completo (items e historial) al momento de archivar. En PostgreSQL la
+    tabla puede estar particionada por mes de created_at (ver orders/partitions.py).
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    order_number = models.CharField('Número de orden', max_length=50, db_index=True)
+    # Sin FK en la base (la tabla puede recrearse particionada); Django aplica el SET_NULL
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True,
+        db_constraint=False, related_name='archived_orders'
+    )
+    email = models.EmailField('Email')
+    status = models.CharField('Estado', max_length=20, choices=Order.STATUS_CHOICES)
+    total = models.DecimalField('Total', max_digits=10, decimal_places=2)
+    data = models.JSONField('Orden serializada')
+
+    created_at = models.DateTimeField('Fecha de creación')
+    archived_at = models.DateTimeField('Fecha de archivo', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Orden Archivada'
+        verbose_name_plural = 'Órdenes Archivadas'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"Orden archivada {self.order_number}"
+
+
 class ShippingZone(models.Model):
     """Zonas de envío con costos"""
 
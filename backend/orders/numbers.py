@@ -0,0 +1,173 @@
+"""
+Números de orden ordenados por tiempo
+
+Formato: ORD- seguido de 13 caracteres en base32 de Crockford (sin I, L, O,
+U, así no se confunden al dictarlos). Codifican un entero de 63 bits estilo
+Snowflake:
+
+    milisegundos desde EPOCH (41 bits) | worker (10 bits) | secuencia (12 bits)
+
+- Ancho fijo y alfabeto en orden ASCII: el orden alfabético es el
+  cronológico, así que los INSERT van al final del índice único de
+  order_number y un rango de fechas es un rango de ese mismo índice
+  (ver number_range / placed_between).
+- Sin consultas: cada proceso tiene su worker id (ORDER_NUMBER_WORKER_ID, un
+  contador en la caché compartida en producción vía Redis o, si la caché es
+  local al proceso, el PID) y una secuencia por milisegundo; si se agota se
+  pasa al milisegundo siguiente.
+- Si el reloj retrocede se sigue desde el último milisegundo emitido, así
+  los números nunca se repiten ni retroceden dentro de un proceso.
+
+Los números antiguos (ORD- + 8 hex aleatorios) siguen siendo válidos para
+buscar una orden; como no llevan fecha, placed_between los filtra por
+created_at.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+PREFIX = 'ORD-'
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+LENGTH = 13
+
+# 2024-01-01 UTC en milisegundos
+EPOCH = 1704067200000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+# Mayor valor que cabe en LENGTH caracteres (año ~2302)
+MAX_VALUE = (1 << 5 * LENGTH) - 1
+
+WORKER_COUNTER_KEY = 'order_number_worker_counter'
+
+# Cachés que no se comparten entre procesos: un contador ahí daría el mismo id a todos
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Números con fecha y números antiguos (aleatorios)
+NUMBER_PATTERN = rf'^{PREFIX}[{ALPHABET}]{{{LENGTH}}}$'
+LEGACY_PATTERN = rf'^{PREFIX}[0-9A-F]{{8}}$'
+
+
+def encode(value):
+    chars = []
+    for _ in range(LENGTH):
+        value, index = divmod(value, 32)
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+def decode(text):
+    value = 0
+    for char in text.upper():
+        value = value * 32 + ALPHABET.index(char)
+    return value
+
+
+def allocate_worker_id():
+    """
+    Worker id del proceso: el configurado, o el siguiente valor de un contador
+    en caché (módulo 1024). Si la caché no se comparte entre procesos
+    (LocMem, Dummy) o no está disponible se deriva del PID.
+    """
+    configured = getattr(settings, 'ORDER_NUMBER_WORKER_ID', None)
+    if configured is not None:
+        return int(configured) & MAX_WORKER
+    if settings.CACHES.get('default', {}).get('BACKEND') in LOCAL_CACHES:
+        return os.getpid() & MAX_WORKER
+    try:
+        cache.add(WORKER_COUNTER_KEY, 0, timeout=None)
+        return cache.incr(WORKER_COUNTER_KEY) & MAX_WORKER
+    except Exception:
+        return os.getpid() & MAX_WORKER
+
+
+class OrderNumberGenerator:
+    """Generador por proceso; seguro entre hilos"""
+
+    def __init__(self, worker_id=None, clock=None):
+        self.fixed_worker_id = worker_id
+        self.clock = clock or (lambda: time.time_ns() // 1_000_000)
+        self.pid = None
+        self.worker_id = None
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def next_value(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                # Primer uso o proceso nuevo (fork de un worker): worker id propio
+                self.pid = os.getpid()
+                self.worker_id = self.fixed_worker_id if self.fixed_worker_id is not None else allocate_worker_id()
+                self.last_ms, self.sequence = -1, 0
+
+            now = self.clock()
+            if now > self.last_ms:
+                self.sequence = 0
+            else:
+                # Mismo milisegundo o reloj atrasado: seguir desde el último emitido
+                now = self.last_ms
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    # Secuencia agotada: tomar prestado el milisegundo siguiente
+                    now += 1
+            self.last_ms = now
+
+            return ((now - EPOCH) << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self.sequence
+
+    def __call__(self):
+        return PREFIX + encode(self.next_value())
+
+
+generate_order_number = OrderNumberGenerator()
+
+
+def to_milliseconds(moment):
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def number_for(moment):
+    """
+    Menor número posible para el instante dado. Fuera de la ventana
+    codificable se acota a sus extremos en vez de dar la vuelta
+    """
+    value = max(to_milliseconds(moment) - EPOCH, 0) << (WORKER_BITS + SEQUENCE_BITS)
+    return PREFIX + encode(min(value, MAX_VALUE))
+
+
+def number_range(start, end):
+    """Límites [desde, hasta) de order_number para órdenes creadas entre start y end"""
+    return number_for(start), number_for(end)
+
+
+def number_timestamp(order_number):
+    """Instante codificado en un número de orden, o None si es de formato antiguo"""
+    code = order_number[len(PREFIX):]
+    if not order_number.startswith(PREFIX) or len(code) != LENGTH or any(c not in ALPHABET for c in code):
+        return None
+    ms = (decode(code) >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH
+    return datetime.fromtimestamp(ms / 1000, tz=dt_timezone.utc)
+
+
+def placed_between(queryset, start, end):
+    """
+    Órdenes creadas en [start, end): las nuevas por rango del índice de
+    order_number, las de formato antiguo por created_at
+    """
+    low, high = number_range(start, end)
+    return queryset.filter(
+        Q(order_number__gte=low, order_number__lt=high, order_number__regex=NUMBER_PATTERN)
+        | Q(order_number__regex=LEGACY_PATTERN, created_at__gte=start, created_at__lt=end)
+    )
@@ -0,0 +1,150 @@
+"""
+Particiones mensuales del archivo de órdenes (solo PostgreSQL)
+
+Las tablas vivas (Order, OrderItem, OrderStatusHistory) no se particionan:
+en PostgreSQL la clave primaria y los UNIQUE de una tabla particionada deben
+incluir la columna de partición, y las FK de items, historial y cupones
+apuntan a Order.id solo. Esas tablas se mantienen chicas moviendo las
+órdenes cerradas a ArchivedOrder (orders/archive.py), y es el archivo el que
+se particiona por rango de created_at, un mes por partición.
+
+setup_partitioning() convierte la tabla creada por la migración en una
+tabla particionada (una sola vez; es opcional) con una partición DEFAULT de
+respaldo. ensure_partition() crea la partición de un mes y mueve a ella las
+filas que hubieran caído en DEFAULT. La columna data se comprime con lz4
+cuando el servidor lo soporta (por defecto TOAST usa pglz).
+
+En otros motores todas las funciones son no-op.
+"""
+
+from datetime import date, datetime, timezone as dt_timezone
+from django.db import DatabaseError, connection, transaction
+from .models import ArchivedOrder
+
+TABLE = ArchivedOrder._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+# Meses futuros que se crean por adelantado
+MONTHS_AHEAD = 3
+
+
+def month_start(moment):
+    return date(moment.year, moment.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """[inicio, fin) del mes en UTC"""
+    start = datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+    end_month = add_months(month, 1)
+    return start, datetime(end_month.year, end_month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y_%m}'
+
+
+def supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    if not supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)',
+            [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def set_compression(cursor, table):
+    """lz4 para data si el servidor lo soporta (PostgreSQL 14+ compilado con lz4)"""
+    try:
+        with transaction.atomic():
+            cursor.execute(f'ALTER TABLE {table} ALTER COLUMN data SET COMPRESSION lz4')
+    except DatabaseError:
+        pass
+
+
+def setup_partitioning():
+    """Recrear la tabla del archivo como particionada. Devuelve False si no aplica"""
+    if not supported() or is_partitioned():
+        return False
+
+    old_table = f'{TABLE}_old'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s',
+            [TABLE, f'{TABLE}_pkey']
+        )
+        indexes = cursor.fetchall()
+
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {old_table}')
+        cursor.execute(f'ALTER TABLE {old_table} RENAME CONSTRAINT {TABLE}_pkey TO {old_table}_pkey')
+        for name, _definition in indexes:
+            cursor.execute(f'DROP INDEX {name}')
+
+        cursor.execute(
+            f'CREATE TABLE {TABLE} (LIKE {old_table} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)')
+        # Mismos nombres de índice que generó la migración
+        for _name, definition in indexes:
+            cursor.execute(definition)
+        set_compression(cursor, TABLE)
+
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old_table}')
+        cursor.execute(f'DROP TABLE {old_table}')
+
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') FROM {DEFAULT_PARTITION}")
+        months = [month_start(row[0]) for row in cursor.fetchall()]
+
+    for month in months:
+        ensure_partition(month)
+    return True
+
+
+def ensure_partition(month):
+    """Crear la partición del mes si falta. Devuelve True si la creó"""
+    if not is_partitioned():
+        return False
+
+    name = partition_name(month)
+    start, end = month_bounds(month)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+
+        cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+        set_compression(cursor, name)
+        # Filas del mes que estaban en DEFAULT (si no, ATTACH falla)
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    return True
+
+
+def ensure_partitions(first, last):
+    """Particiones de todos los meses entre first y last (incluidos). Devuelve las creadas"""
+    created = []
+    month, last_month = month_start(first), month_start(last)
+    while month <= last_month:
+        if ensure_partition(month):
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
@@ -0,0 +1,187 @@
+"""
+Procesamiento de comprobantes de pago
+
+La petición solo guarda el archivo: spool_upload lo copia por bloques a
+payment_proofs/incoming/ (con fsync en almacenamiento local), crea el
+PaymentProof pendiente y, al confirmar la transacción, lo encola.
+
+El trabajo pesado corre fuera de la petición (process_proof):
+- corrige la orientación EXIF, convierte a RGB y reduce a MAX_DIMENSION,
+- re-codifica a JPEG sin metadatos (ubicación, modelo del teléfono...),
+- genera la miniatura del admin y guarda ancho, alto y tamaño,
+- apunta Order.payment_proof a la imagen procesada y borra el original.
+
+Con PAYMENT_PROOF_ASYNC el trabajo va a un hilo del proceso; el comando
+process_payment_proofs recoge lo que quede pendiente (reinicios, errores
+transitorios o procesos colgados) y sirve como worker dedicado.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import Order, PaymentProof
+
+logger = logging.getLogger(__name__)
+
+MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+MAX_DIMENSION = 1600
+THUMBNAIL_DIMENSION = 320
+JPEG_QUALITY = 82
+ALLOWED_FORMATS = ('JPEG', 'MPO', 'PNG', 'WEBP')
+
+# Reintentos y tiempo tras el cual un "processing" se considera colgado
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)
+
+_executor = None
+
+
+class InvalidProof(Exception):
+    """El archivo subido no es una imagen aceptada"""
+
+
+def validate_upload(upload):
+    """Revisión rápida: tamaño y cabecera de la imagen (no decodifica los píxeles)"""
+    if upload.size > MAX_UPLOAD_SIZE:
+        raise InvalidProof(f'El comprobante no puede superar {MAX_UPLOAD_SIZE // (1024 * 1024)} MB')
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise InvalidProof('El comprobante debe ser una imagen')
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidProof('Formato de imagen no soportado')
+
+
+def spool_upload(order, upload):
+    """Guardar el archivo tal cual y crear el PaymentProof pendiente (dentro de la transacción)"""
+    proof = PaymentProof(order=order, original_size=upload.size)
+    # El storage copia el upload por bloques (o mueve el temporal si Django ya lo escribió a disco)
+    proof.original.save(upload.name, upload, save=False)
+    sync_to_disk(proof.original)
+    proof.save()
+
+    transaction.on_commit(lambda: enqueue(proof.id))
+    return proof
+
+
+def sync_to_disk(field_file):
+    """fsync del archivo en almacenamiento local (en otros backends no aplica)"""
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def enqueue(proof_id):
+    if not getattr(settings, 'PAYMENT_PROOF_ASYNC', True):
+        process_proof(proof_id)
+        return
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='payment-proofs')
+    _executor.submit(run_in_thread, proof_id)
+
+
+def run_in_thread(proof_id):
+    close_old_connections()
+    try:
+        process_proof(proof_id)
+    except Exception:
+        logger.exception(f"Error procesando el comprobante {proof_id}")
+    finally:
+        close_old_connections()
+
+
+def processable(now):
+    """Pendientes, fallidos con intentos disponibles o colgados en processing"""
+    return PaymentProof.objects.filter(
+        Q(status__in=['pending', 'failed']) | Q(status='processing', started_at__lt=now - STALE_AFTER),
+        attempts__lt=MAX_ATTEMPTS,
+    )
+
+
+def claim(proof_id, now):
+    """Marcar como processing si nadie más lo tomó. Devuelve True si lo tomó"""
+    return processable(now).filter(pk=proof_id).update(status='processing', started_at=now, attempts=F('attempts') + 1) == 1
+
+
+def encode_jpeg(image, dimension):
+    """Copia reducida a dimension (lado mayor) en JPEG, sin EXIF ni perfiles"""
+    copy = image.copy()
+    copy.thumbnail((dimension, dimension), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    copy.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return copy.size, buffer.getvalue()
+
+
+def load_image(field_file):
+    with field_file.open('rb') as source:
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                return background
+            return image.convert('RGB')
+
+
+def process_proof(proof_id):
+    """Procesar un comprobante. Devuelve True si quedó listo"""
+    now = timezone.now()
+    if not claim(proof_id, now):
+        return False
+
+    proof = PaymentProof.objects.select_related('order').get(pk=proof_id)
+    try:
+        image = load_image(proof.original)
+        (width, height), content = encode_jpeg(image, MAX_DIMENSION)
+        _, thumbnail = encode_jpeg(image, THUMBNAIL_DIMENSION)
+    except Exception as e:
+        PaymentProof.objects.filter(pk=proof.pk).update(status='failed', error=str(e)[:500])
+        logger.warning(f"Comprobante {proof.pk} no procesado: {str(e)}")
+        return False
+
+    name = f'{proof.order.order_number}-{proof.pk}.jpg'
+    proof.image.save(name, ContentFile(content), save=False)
+    proof.thumbnail.save(name, ContentFile(thumbnail), save=False)
+    original = proof.original.name
+
+    proof.width, proof.height, proof.size = width, height, len(content)
+    proof.status, proof.error, proof.processed_at = 'ready', '', timezone.now()
+    proof.original = ''
+    proof.save(update_fields=[
+        'image', 'thumbnail', 'width', 'height', 'size', 'status', 'error', 'processed_at', 'original'
+    ])
+
+    # Solo si la orden sigue mostrando este comprobante (no lo reemplazó otro)
+    Order.objects.filter(pk=proof.order_id, payment_proof=original).update(
+        payment_proof=proof.image.name, updated_at=timezone.now()
+    )
+    proof.original.storage.delete(original)
+    logger.info(f"Comprobante {proof.pk} procesado: {width}x{height}, {len(content)} bytes")
+    return True
+
+
+def process_pending(limit=100):
+    """Procesar los comprobantes pendientes. Devuelve (listos, fallidos)"""
+    ids = list(processable(timezone.now()).order_by('created_at').values_list('id', flat=True)[:limit])
+    ready = sum(1 for proof_id in ids if process_proof(proof_id))
+    return ready, len(ids) - ready
@@ -1,11 +1,29 @@
 from rest_framework import serializers
-from .models import Cart, CartItem, Order, OrderItem, ShippingZone, PaymentMethod
+from .models import ArchivedOrder, Cart, CartItem, Order, OrderItem, ShippingZone, PaymentMethod
+from .transitions import MAX_BULK_TRANSITION
 from products.models import Product, ProductVariant
-from products.serializers import ProductListSerializer
+from products.utils import build_image_url
+
+
+class CartProductSerializer(serializers.ModelSerializer):
+    """Proyección reducida del producto para el carrito (ver CART_PRODUCT_FIELDS)"""
+    brand_name = serializers.CharField(source='brand.name', read_only=True, default=None)
+    primary_image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'name', 'slug', 'sku', 'brand_name',
+            'price', 'compare_price', 'stock', 'primary_image',
+            'is_on_sale', 'discount_percentage', 'is_active'
+        ]
+
+    def get_primary_image(self, obj):
+        return build_image_url(self.context.get('request'), getattr(obj, 'primary_image_path', None))
 
 
 class CartItemSerializer(serializers.ModelSerializer):
-    product_detail = ProductListSerializer(source='product', read_only=True)
+    product_detail = CartProductSerializer(source='product', read_only=True)
     variant_name = serializers.CharField(source='variant.name', read_only=True)
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
@@ -44,7 +62,7 @@ class CartItemSerializer(serializers.ModelSerializer):
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
-    total_items = serializers.IntegerField(read_only=True)
+    total_items = serializers.IntegerField(source='item_count', read_only=True)
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
@@ -105,6 +123,7 @@ class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
+    payment_proof_details = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
@@ -113,7 +132,7 @@ class OrderSerializer(serializers.ModelSerializer):
             'shipping_address', 'shipping_city', 'shipping_department', 'shipping_postal_code',
             'subtotal', 'shipping_cost', 'tax', 'discount', 'total',
             'payment_method', 'payment_method_display', 'payment_status',
-            'payment_proof', 'transaction_id',
+            'payment_proof', 'payment_proof_details', 'transaction_id',
             'status', 'status_display', 'customer_notes', 'admin_notes', 'tracking_number',
             'items', 'created_at', 'updated_at'
         ]
@@ -122,6 +141,73 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
+    def get_payment_proof_details(self, obj):
+        """Último comprobante: estado del procesamiento, miniatura y medidas"""
+        if not obj.payment_proof:
+            return None
+        proof = max(obj.payment_proofs.all(), key=lambda proof: proof.id, default=None)
+        if proof is None:
+            return None
+        return {
+            'status': proof.status,
+            'thumbnail': build_image_url(self.context.get('request'), proof.thumbnail.name),
+            'width': proof.width,
+            'height': proof.height,
+            'size': proof.size,
+            'original_size': proof.original_size,
+        }
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """
+    Proyección para listados de órdenes (ver get_order_list_queryset).
+    item_count y el primer item (nombre e imagen) vienen anotados.
+    """
+    item_count = serializers.IntegerField(read_only=True)
+    first_item = serializers.SerializerMethodField()
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    payment_method_display = serializers.CharField(source='get_payment_method_display', read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'email', 'phone', 'total',
+            'payment_method', 'payment_method_display', 'payment_status',
+            'status', 'status_display', 'tracking_number',
+            'item_count', 'first_item', 'created_at'
+        ]
+        read_only_fields = fields
+
+    def get_first_item(self, obj):
+        if not obj.first_item_name:
+            return None
+        return {
+            'product_name': obj.first_item_name,
+            'primary_image': build_image_url(self.context.get('request'), obj.first_item_image),
+        }
+
+
+class ArchivedOrderSummarySerializer(serializers.ModelSerializer):
+    """Listado de órdenes archivadas (el detalle completo está en data)"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = ArchivedOrder
+        fields = ['order_number', 'status', 'status_display', 'total', 'created_at', 'archived_at']
+        read_only_fields = fields
+
+
+class BulkTransitionSerializer(serializers.Serializer):
+    """Cambio de estado de varias órdenes (ver orders.transitions)"""
+    order_numbers = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        allow_empty=False,
+        max_length=MAX_BULK_TRANSITION
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    tracking_number = serializers.CharField(max_length=200, required=False, allow_blank=True)
+
 
 class CreateOrderSerializer(serializers.Serializer):
     # Datos de contacto
@@ -0,0 +1,80 @@
+"""
+Índice de tarifas de envío por departamento
+
+Las zonas son pocas y cambian poco, así que cada proceso guarda un
+diccionario {departamento normalizado: zona} y lo reconstruye cuando
+cambia la versión en caché (los signals de ShippingZone la actualizan) o
+pasó INDEX_TTL desde que lo armó. Cotizar no consulta la base de datos.
+
+La versión solo llega a todos los procesos con una caché compartida
+(Redis). Con LocMem cada proceso ve solo sus propios cambios y los demás
+los toman al vencer INDEX_TTL; el TTL cubre también los .update() en lote,
+que no disparan signals.
+
+Si un departamento está en varias zonas activas gana la de menor id, igual
+que el antiguo .filter(departments__contains=[...]).first().
+"""
+
+import time
+from decimal import Decimal
+from django.core.cache import cache
+from core.text import normalize
+from .models import ShippingZone
+
+VERSION_KEY = 'shipping_zones_version'
+
+# Segundos tras los cuales el índice se rearma aunque la versión no cambie
+INDEX_TTL = 60
+
+# Índice del proceso: (versión, momento en que se armó, {departamento: zona})
+_index = None
+
+
+def bump_version():
+    """Invalidar los índices en memoria de todos los procesos"""
+    cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def build_index():
+    index = {}
+    zones = ShippingZone.objects.filter(is_active=True).order_by('id').values(
+        'id', 'name', 'departments', 'cost', 'free_shipping_threshold', 'estimated_days'
+    )
+    for zone in zones:
+        for department in zone.pop('departments') or []:
+            index.setdefault(normalize(department), zone)
+    return index
+
+
+def get_index():
+    global _index
+    version = cache.get(VERSION_KEY)
+    now = time.monotonic()
+    if _index is None or _index[0] != version or now - _index[1] >= INDEX_TTL:
+        _index = (version, now, build_index())
+    return _index[2]
+
+
+def get_zone(department):
+    """Zona activa que cubre el departamento, o None"""
+    return get_index().get(normalize(department))
+
+
+def quote(department, subtotal=0):
+    """
+    Costo de envío para un departamento y subtotal.
+    Devuelve None si no hay cobertura.
+    """
+    zone = get_zone(department)
+    if zone is None:
+        return None
+
+    threshold = zone['free_shipping_threshold']
+    free_shipping = bool(threshold) and Decimal(str(subtotal)) >= threshold
+    return {
+        'cost': Decimal('0') if free_shipping else zone['cost'],
+        'zone': zone['name'],
+        'estimated_days': zone['estimated_days'],
+        'free_shipping': free_shipping,
+        'free_shipping_threshold': threshold,
+    }
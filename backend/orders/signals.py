@@ -0,0 +1,21 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Cart, CartItem, ShippingZone
+from . import shipping
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def update_cart_totals(sender, instance, **kwargs):
+    """
+    Mantener item_count y subtotal del carrito en la misma transacción
+    que el cambio del item
+    """
+    Cart.update_totals([instance.cart_id])
+
+
+@receiver(post_save, sender=ShippingZone)
+@receiver(post_delete, sender=ShippingZone)
+def invalidate_shipping_index(sender, instance, **kwargs):
+    """Reconstruir el índice de tarifas en memoria de cada proceso"""
+    shipping.bump_version()
@@ -1,3 +1,910 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APITestCase
+from rest_framework.utils.encoders import JSONEncoder
+from core.idempotency import purge_expired_keys
+from core.models import IdempotencyKey
+from coupons.models import Coupon, CouponUsage
+from products.models import Product, ProductImage, ProductVariant
+from .inventory import InsufficientStock, decrement_stock, release_expired_holds
+from .numbers import MAX_WORKER, OrderNumberGenerator, allocate_worker_id, number_timestamp, placed_between
+from .archive import archive_orders
+from . import shipping
+from .proofs import MAX_ATTEMPTS, MAX_DIMENSION, THUMBNAIL_DIMENSION, process_pending
+from .partitions import add_months, ensure_partitions, partition_name
+from notifications.models import Notification, NotificationOutbox
+from .models import (
+    ArchivedOrder, Cart, CartItem, Order, OrderItem, OrderStatusHistory, PaymentProof, ShippingZone, StockHold
+)
 
-# Create your tests here.
+User = get_user_model()
+
+
+def image_bytes(size=(40, 30), color='red', image_format='JPEG', exif=None):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format, **({'exif': exif} if exif else {}))
+    return buffer.getvalue()
+
+
+class OrderConditionalGetTests(APITestCase):
+    """ETag y Last-Modified en el detalle de orden"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com', password='secret123')
+        self.client.force_authenticate(self.user)
+        self.order = Order.objects.create(
+            user=self.user, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10, payment_method='yape',
+        )
+        self.url = f'/api/orders/{self.order.order_number}/'
+
+    def test_not_modified_until_order_changes(self):
+        response = self.client.get(self.url)
+        self.assertIn('private', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        self.order.status = 'processing'
+        self.order.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_users_order_is_404(self):
+        other = User.objects.create_user(username='otro', email='otro@example.com', password='secret123')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class OrderListTests(APITestCase):
+    """Listado de órdenes con OrderSummarySerializer"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com', password='secret123')
+        self.client.force_authenticate(self.user)
+        self.laptop = Product.objects.create(name='Laptop', sku='L-1', description='d', price=100, stock=10)
+        self.mouse = Product.objects.create(name='Mouse', sku='M-1', description='d', price=20, stock=10)
+        ProductImage.objects.create(product=self.laptop, image='products/laptop.jpg', is_primary=True)
+
+    def create_order(self, *products):
+        order = Order.objects.create(
+            user=self.user, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10, payment_method='yape',
+            admin_notes='nota interna',
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, product_name=product.name, product_sku=product.sku,
+                      quantity=2, price=product.price)
+            for product in products
+        ])
+        return order
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(context)
+
+    def test_summary_fields(self):
+        order = self.create_order(self.laptop, self.mouse)
+        response, _ = self.list_queries()
+
+        summary = response.data['results'][0]
+        self.assertEqual(summary['order_number'], order.order_number)
+        self.assertEqual(summary['item_count'], 2)
+        self.assertEqual(summary['first_item']['product_name'], 'Laptop')
+        self.assertTrue(summary['first_item']['primary_image'].endswith('/products/laptop.jpg'))
+        self.assertNotIn('items', summary)
+        self.assertNotIn('admin_notes', summary)
+        self.assertNotIn('shipping_address', summary)
+
+        # El detalle sigue con el serializer completo
+        detail = self.client.get(f'/api/orders/{order.order_number}/')
+        self.assertEqual(detail.data['shipping_address'], 'Av. 1')
+        self.assertEqual(detail.data['items'][0]['product_sku'], 'L-1')
+
+    def test_order_without_items(self):
+        self.create_order()
+        response, _ = self.list_queries()
+        self.assertEqual(response.data['results'][0]['item_count'], 0)
+        self.assertIsNone(response.data['results'][0]['first_item'])
+
+    def test_first_item_without_image(self):
+        self.create_order(self.mouse, self.laptop)
+        first_item = self.list_queries()[0].data['results'][0]['first_item']
+        self.assertEqual(first_item, {'product_name': 'Mouse', 'primary_image': None})
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.create_order(self.laptop)
+        _, few = self.list_queries()
+
+        for _ in range(5):
+            self.create_order(self.laptop, self.mouse)
+        _, many = self.list_queries()
+        self.assertEqual(few, many)
+
+
+@override_settings(NOTIFICATION_OUTBOX_ASYNC=False)
+class OrderTransitionTests(APITestCase):
+    """Cambios de estado validados y en lote (orders.transitions)"""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='secret123', is_staff=True, is_superuser=True
+        )
+        self.customer = User.objects.create_user(username='cliente', email='cliente@example.com', password='secret123')
+        self.client.force_authenticate(self.admin)
+
+    def create_order(self, status):
+        order = Order.objects.create(
+            user=self.customer, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10, payment_method='yape',
+        )
+        Order.objects.filter(pk=order.pk).update(status=status)
+        return order
+
+    def status_notifications(self):
+        return Notification.objects.filter(user=self.customer, type__in=['order_status', 'payment_confirmed'])
+
+    def test_bulk_transition_endpoint(self):
+        first, second = self.create_order('processing'), self.create_order('payment_verified')
+        delivered = self.create_order('delivered')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/bulk-transition/', {
+                'order_numbers': [first.order_number, second.order_number, delivered.order_number, 'ORD-NOEXISTE'],
+                'status': 'shipped',
+                'tracking_number': 'TRK-1',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], sorted([first.order_number, second.order_number]))
+        self.assertEqual([row['order_number'] for row in response.data['skipped']], [delivered.order_number])
+        self.assertEqual(response.data['not_found'], ['ORD-NOEXISTE'])
+
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'shipped')
+        self.assertEqual(first.tracking_number, 'TRK-1')
+        self.assertIsNotNone(first.shipped_date)
+        self.assertEqual(OrderStatusHistory.objects.filter(status='shipped', changed_by=self.admin).count(), 2)
+        self.assertEqual(self.status_notifications().count(), 2)
+
+    def test_skipped_transition_rolls_back_other_fields(self):
+        order = self.create_order('processing')
+        # Otra petición cambió el estado entre la validación y el bloqueo
+        with patch('orders.views.transition_orders', return_value=([], [(order, 'La orden cambió')])):
+            response = self.client.patch(f'/api/orders/{order.order_number}/', {
+                'status': 'shipped', 'tracking_number': 'TRK-9'
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.tracking_number), ('processing', ''))
+
+    def test_bulk_transition_requires_admin(self):
+        order = self.create_order('processing')
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/orders/bulk-transition/', {
+            'order_numbers': [order.order_number], 'status': 'shipped'
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_patch_validates_transition(self):
+        order = self.create_order('delivered')
+        url = f'/api/orders/{order.order_number}/'
+        response = self.client.patch(url, {'status': 'processing'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, {'status': 'refunded', 'admin_notes': 'devolución'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'refunded')
+        self.assertEqual(response.data['admin_notes'], 'devolución')
+        self.assertEqual(order.status_history.get().status, 'refunded')
+        self.assertEqual(self.status_notifications().count(), 1)
+
+    def test_admin_action_goes_through_state_machine(self):
+        self.client.force_login(self.admin)
+        orders = [self.create_order('payment_pending') for _ in range(3)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/orders/order/', {
+                'action': 'mark_as_payment_verified',
+                '_selected_action': [order.pk for order in orders],
+            })
+
+        self.assertEqual(
+            set(Order.objects.values_list('status', 'payment_status')),
+            {('payment_verified', 'paid')}
+        )
+        self.assertEqual(OrderStatusHistory.objects.count(), 3)
+        self.assertEqual(self.status_notifications().filter(type='payment_confirmed').count(), 3)
+
+
+class OrderNumberTests(APITestCase):
+    """Números de orden ordenados por tiempo (orders.numbers)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com', password='secret123')
+
+    def create_order(self, **kwargs):
+        return Order.objects.create(
+            user=self.user, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10, payment_method='yape',
+            **kwargs
+        )
+
+    def test_numbers_sort_by_time_and_never_repeat(self):
+        now = [1_760_000_000_000]
+        first = OrderNumberGenerator(worker_id=1, clock=lambda: now[0])
+        second = OrderNumberGenerator(worker_id=2, clock=lambda: now[0])
+
+        numbers = [first() for _ in range(5000)]   # agota la secuencia del milisegundo
+        numbers += [second() for _ in range(10)]   # otro worker, mismo milisegundo
+        now[0] -= 5_000                            # reloj atrasado
+        later = [first() for _ in range(10)]
+
+        self.assertEqual(len(set(numbers + later)), len(numbers) + len(later))
+        self.assertEqual(sorted(numbers[:5000] + later), numbers[:5000] + later)
+        self.assertTrue(all(len(number) == 17 and number.startswith('ORD-') for number in numbers))
+
+    def test_number_encodes_creation_time(self):
+        order = self.create_order()
+        self.assertLess(abs((number_timestamp(order.order_number) - order.created_at).total_seconds()), 1)
+        self.assertIsNone(number_timestamp('ORD-1A2B3C4D'))
+
+    def test_placed_between_uses_number_range_and_keeps_legacy_orders(self):
+        ten_days_ago = timezone.now() - timedelta(days=10)
+        generator = OrderNumberGenerator(worker_id=3, clock=lambda: int(ten_days_ago.timestamp() * 1000))
+        old = self.create_order(order_number=generator())
+        legacy = self.create_order(order_number='ORD-0A1B2C3D')
+        Order.objects.filter(pk__in=[old.pk, legacy.pk]).update(created_at=ten_days_ago)
+        recent = self.create_order()
+
+        window = placed_between(Order.objects.all(), timezone.now() - timedelta(days=1), timezone.now() + timedelta(days=1))
+        self.assertEqual(list(window), [recent])
+
+        older = placed_between(Order.objects.all(), timezone.now() - timedelta(days=11), timezone.now() - timedelta(days=9))
+        self.assertEqual(set(older), {old, legacy})
+
+    def test_list_filters_by_date(self):
+        self.client.force_authenticate(self.user)
+        order = self.create_order()
+        today = timezone.localdate().isoformat()
+
+        response = self.client.get(f'/api/orders/?date_from={today}&date_to={today}')
+        self.assertEqual([row['order_number'] for row in response.data['results']], [order.order_number])
+        response = self.client.get('/api/orders/?date_to=2024-06-30')
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(self.client.get('/api/orders/?date_from=ayer').status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/?date_to=9999-12-31').status_code, 400)
+
+    def test_dates_past_the_encodable_window_are_clamped(self):
+        self.client.force_authenticate(self.user)
+        order = self.create_order()
+
+        response = self.client.get('/api/orders/?date_to=9999-12-30')
+        self.assertEqual([row['order_number'] for row in response.data['results']], [order.order_number])
+        response = self.client.get('/api/orders/?date_to=2500-01-01')
+        self.assertEqual([row['order_number'] for row in response.data['results']], [order.order_number])
+        response = self.client.get('/api/orders/?date_from=2500-01-01')
+        self.assertEqual(response.data['results'], [])
+
+    @override_settings(
+        ORDER_NUMBER_WORKER_ID=None,
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    )
+    def test_worker_id_uses_pid_when_cache_is_not_shared(self):
+        with patch('orders.numbers.os.getpid', return_value=4242):
+            self.assertEqual(allocate_worker_id(), 4242 & MAX_WORKER)
+
+    def test_save_retries_on_duplicate_number(self):
+        existing = self.create_order()
+        numbers = iter([existing.order_number, 'ORD-0000000000001'])
+        with patch('orders.models.generate_order_number', lambda: next(numbers)):
+            order = self.create_order()
+        self.assertEqual(order.order_number, 'ORD-0000000000001')
+
+
+class OrderArchiveTests(APITestCase):
+    """Archivo de órdenes cerradas (orders.archive)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com', password='secret123')
+        self.product = Product.objects.create(name='Laptop', sku='L-1', description='d', price=100, stock=10)
+
+    def create_order(self, status, months_ago):
+        order = Order.objects.create(
+            user=self.user, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=100, total=100, payment_method='yape',
+        )
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=100)
+        OrderStatusHistory.objects.create(order=order, status=status, notes='cerrada')
+        Order.objects.filter(pk=order.pk).update(
+            status=status, created_at=timezone.now() - timedelta(days=31 * months_ago)
+        )
+        return order
+
+    def test_archives_only_old_closed_orders(self):
+        old_delivered = self.create_order('delivered', 14)
+        old_pending = self.create_order('pending', 14)
+        recent_delivered = self.create_order('delivered', 1)
+        coupon = Coupon.objects.create(
+            code='HOLA', discount_type='percentage', discount_value=10,
+            valid_from=timezone.now(), valid_until=timezone.now() + timedelta(days=1),
+        )
+        CouponUsage.objects.create(coupon=coupon, user=self.user, order=old_delivered, discount_amount=10)
+
+        out = StringIO()
+        call_command('archive_orders', '--months', '12', stdout=out)
+        self.assertIn('1 órdenes', out.getvalue())
+
+        self.assertEqual(set(Order.objects.all()), {old_pending, recent_delivered})
+        self.assertFalse(OrderItem.objects.filter(order_id=old_delivered.id).exists())
+        self.assertIsNone(CouponUsage.objects.get().order)
+
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual((archived.id, archived.order_number), (old_delivered.id, old_delivered.order_number))
+        self.assertEqual(archived.data['items'][0]['product_name'], 'Laptop')
+        self.assertEqual(archived.data['status_history'][0]['notes'], 'cerrada')
+
+        # Volver a ejecutar no mueve nada más
+        self.assertEqual(archive_orders(months=12), 0)
+
+    def test_detail_falls_back_to_archive(self):
+        order = self.create_order('delivered', 14)
+        archive_orders(months=12)
+        url = f'/api/orders/{order.order_number}/'
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['archived'])
+        self.assertEqual(response.data['order_number'], order.order_number)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        archived_list = self.client.get('/api/orders/archived/')
+        self.assertEqual([row['order_number'] for row in archived_list.data['results']], [order.order_number])
+
+        other = User.objects.create_user(username='otro', email='otro@example.com', password='secret123')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get('/api/orders/archived/').data['results'], [])
+
+    def test_partition_helpers(self):
+        self.assertEqual(add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(partition_name(date(2025, 3, 1)), 'orders_archivedorder_2025_03')
+        # Sin PostgreSQL no hay nada que crear
+        self.assertEqual(ensure_partitions(date(2025, 1, 1), date(2025, 6, 1)), [])
+
+
+@override_settings(NOTIFICATION_OUTBOX_ASYNC=False)
+class StockDecrementTests(TestCase):
+    """Descuento de stock con UPDATE condicional en create_order"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='comprador', email='c@example.com', password='secret123')
+        self.cart = Cart.objects.create(user=self.user)
+        self.laptop = Product.objects.create(name='Laptop', sku='L-1', description='d', price=100, stock=10)
+        self.mouse = Product.objects.create(name='Mouse', sku='M-1', description='d', price=10, stock=3)
+        self.shirt = Product.objects.create(name='Polo', sku='P-1', description='d', price=20, stock=0)
+        self.size_m = ProductVariant.objects.create(product=self.shirt, name='M', sku='P-1-M', stock=2)
+
+    def add(self, product, quantity, variant=None):
+        return CartItem.objects.create(cart=self.cart, product=product, variant=variant, quantity=quantity)
+
+    def items(self):
+        return list(self.cart.items.select_related('product', 'variant'))
+
+    def test_decrements_stock_and_sales_in_two_updates(self):
+        self.add(self.laptop, 2)
+        self.add(self.mouse, 3)
+        self.add(self.shirt, 2, self.size_m)
+
+        items = self.items()
+        # 2 SELECT ... FOR UPDATE + reservas propias + reservas ajenas + 2 UPDATE + alerta en el outbox
+        with transaction.atomic():
+            with self.assertNumQueries(7):
+                decrement_stock(items)
+
+        self.laptop.refresh_from_db()
+        self.mouse.refresh_from_db()
+        self.shirt.refresh_from_db()
+        self.size_m.refresh_from_db()
+        self.assertEqual((self.laptop.stock, self.laptop.sales_count), (8, 2))
+        self.assertEqual((self.mouse.stock, self.mouse.sales_count), (0, 3))
+        self.assertEqual((self.shirt.stock, self.shirt.sales_count), (0, 2))
+        self.assertEqual(self.size_m.stock, 0)
+
+    def test_insufficient_stock_changes_nothing(self):
+        self.add(self.laptop, 2)
+        self.add(self.shirt, 3, self.size_m)
+
+        with self.assertRaises(InsufficientStock) as context:
+            with transaction.atomic():
+                decrement_stock(self.items())
+        self.assertEqual(context.exception.name, 'Polo')
+
+        self.laptop.refresh_from_db()
+        self.size_m.refresh_from_db()
+        self.assertEqual((self.laptop.stock, self.laptop.sales_count), (10, 0))
+        self.assertEqual(self.size_m.stock, 2)
+
+    def test_low_stock_alert_sent_once_after_commit(self):
+        self.add(self.mouse, 1)
+        with patch('notifications.utils.notify_low_stock', return_value=[]) as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    decrement_stock(self.items())
+        notify.assert_called_once()
+        self.assertEqual(notify.call_args.args[0].stock, 2)
+        self.assertEqual(NotificationOutbox.objects.get(event='low_stock').status, 'sent')
+
+
+class StockHoldTests(APITestCase):
+    """Reservas de stock por línea del carrito"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Consola', sku='H-1', description='d', price=100, stock=3)
+        self.buyer = User.objects.create_user(username='buyer', email='b@example.com')
+        self.rival = User.objects.create_user(username='rival', email='r@example.com')
+
+    def add(self, user, quantity):
+        self.client.force_authenticate(user)
+        return self.client.post('/api/cart/add/', {'product_id': self.product.id, 'quantity': quantity})
+
+    def test_holds_reduce_available_stock_for_other_carts(self):
+        self.assertEqual(self.add(self.buyer, 2).status_code, 200)
+        hold = StockHold.objects.get()
+        self.assertEqual((hold.product_id, hold.quantity), (self.product.id, 2))
+
+        response = self.add(self.rival, 2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Solo hay 1 unidades', response.data['error'])
+        self.assertFalse(CartItem.objects.filter(cart__user=self.rival).exists())
+
+        # La cantidad acumulada de la propia línea también se valida
+        self.assertEqual(self.add(self.buyer, 2).status_code, 400)
+        self.assertEqual(self.add(self.buyer, 1).status_code, 200)
+        self.assertEqual(StockHold.objects.get().quantity, 3)
+
+    def test_update_item_renews_hold(self):
+        self.add(self.buyer, 1)
+        item = CartItem.objects.get()
+        response = self.client.put(f'/api/cart/update/{item.id}/', {'quantity': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StockHold.objects.get().quantity, 3)
+
+    def test_expired_holds_are_ignored_and_swept(self):
+        self.add(self.buyer, 3)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.add(self.rival, 3).status_code, 200)
+
+        self.assertEqual(release_expired_holds(batch_size=1), 1)
+        self.assertEqual(StockHold.objects.get().cart_item.cart.user, self.rival)
+
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(release_expired_holds(batch_size=1), 1)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_checkout_converts_own_hold_and_respects_others(self):
+        self.add(self.buyer, 2)
+        self.add(self.rival, 1)
+        items = list(CartItem.objects.filter(cart__user=self.buyer).select_related('product', 'variant'))
+        with transaction.atomic():
+            decrement_stock(items)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertEqual(list(StockHold.objects.values_list('cart_item__cart__user', flat=True)), [self.rival.id])
+
+        # Sin reserva propia, el stock reservado por otro carrito no está disponible
+        CartItem.objects.filter(cart__user=self.buyer).update(quantity=1)
+        with self.assertRaises(InsufficientStock):
+            with transaction.atomic():
+                decrement_stock(list(CartItem.objects.filter(cart__user=self.buyer).select_related('product')))
+
+
+@override_settings(NOTIFICATION_OUTBOX_ASYNC=False)
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Muchos compradores a la vez no pueden sobrevender"""
+
+    BUYERS = 12
+
+    # Sin select_for_update (SQLite) el test no prueba el bloqueo de filas
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_buyers_do_not_oversell(self):
+        product = Product.objects.create(name='Consola', sku='C-1', description='d', price=100, stock=5)
+        carts = []
+        for index in range(self.BUYERS):
+            user = User.objects.create_user(username=f'u{index}', email=f'u{index}@example.com')
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            carts.append(cart)
+
+        barrier = threading.Barrier(self.BUYERS)
+        results = []
+
+        def buy(cart):
+            try:
+                items = list(cart.items.select_related('product', 'variant'))
+                barrier.wait()
+                for _attempt in range(50):
+                    try:
+                        with transaction.atomic():
+                            decrement_stock(items)
+                        results.append(True)
+                        return
+                    except InsufficientStock:
+                        results.append(False)
+                        return
+                    except OperationalError:
+                        # Deadlock o timeout de bloqueo: reintentar
+                        time.sleep(0.01)
+                # Reintentos agotados: cuenta como fallo del test, no se descarta
+                results.append(None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(cart,)) for cart in carts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertNotIn(None, results, 'Un comprador agotó los reintentos')
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(results.count(False), self.BUYERS - 5)
+        self.assertEqual((product.stock, product.sales_count), (0, 5))
+
+
+class CartReadModelTests(APITestCase):
+    """Totales mantenidos del carrito, lectura en una consulta y respuestas delta"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com')
+        self.client.force_authenticate(self.user)
+        self.products = [
+            Product.objects.create(name=f'Producto {index}', sku=f'CR-{index}', description='d',
+                                   price=10 + index, stock=20)
+            for index in range(5)
+        ]
+
+    def add(self, product, quantity, **params):
+        url = '/api/cart/add/' + ('?delta=true' if params.get('delta') else '')
+        return self.client.post(url, {'product_id': product.id, 'quantity': quantity})
+
+    def totals(self, response):
+        return response.data['cart']['total_items'], response.data['cart']['subtotal']
+
+    def test_totals_follow_item_changes(self):
+        response = self.add(self.products[0], 2)
+        self.assertEqual(self.totals(response), (2, '20.00'))
+        response = self.add(self.products[1], 1)
+        self.assertEqual(self.totals(response), (3, '31.00'))
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual((cart.item_count, cart.subtotal), (3, Decimal('31.00')))
+
+        item = cart.items.get(product=self.products[0])
+        response = self.client.put(f'/api/cart/update/{item.id}/', {'quantity': 5})
+        self.assertEqual(self.totals(response), (6, '61.00'))
+        response = self.client.delete(f'/api/cart/remove/{cart.items.get(product=self.products[1]).id}/')
+        self.assertEqual(self.totals(response), (5, '50.00'))
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.subtotal), (5, Decimal('50.00')))
+
+        response = self.client.delete('/api/cart/clear/')
+        self.assertEqual(self.totals(response), (0, '0.00'))
+        self.assertEqual(response.data['cart']['items'], [])
+        cart.refresh_from_db()
+        self.assertEqual((cart.item_count, cart.subtotal), (0, Decimal('0')))
+
+    def test_cart_read_does_not_grow_with_items(self):
+        for product in self.products:
+            self.add(product, 1)
+        # Carrito + items con productos, marca, variante e imagen principal
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/')
+        self.assertEqual(len(response.data['items']), 5)
+        self.assertEqual(response.data['total_items'], 5)
+        self.assertEqual(response.data['items'][0]['product_detail']['slug'], self.products[0].slug)
+
+    def test_delta_response(self):
+        self.add(self.products[0], 1)
+        response = self.add(self.products[1], 2, delta=True)
+        self.assertNotIn('cart', response.data)
+        delta = response.data['delta']
+        self.assertEqual(delta['item']['quantity'], 2)
+        self.assertEqual((delta['total_items'], delta['subtotal']), (3, '32.00'))
+
+        response = self.client.delete(f"/api/cart/remove/{delta['item']['id']}/?delta=true")
+        self.assertEqual(response.data['delta']['removed_item_id'], delta['item']['id'])
+        self.assertEqual(response.data['delta']['total_items'], 1)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PAYMENT_PROOF_ASYNC=False)
+class IdempotencyKeyTests(APITestCase):
+    """Reintentos con Idempotency-Key devuelven la respuesta guardada"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com')
+        self.client.force_authenticate(self.user)
+        self.order = Order.objects.create(
+            user=self.user, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10, payment_method='yape',
+        )
+        self.url = f'/api/orders/{self.order.order_number}/upload_payment_proof/'
+
+    def upload(self, content=None, key='retry-1'):
+        content = content or image_bytes()
+        proof = SimpleUploadedFile('pago.jpg', content, content_type='image/jpeg')
+        return self.client.post(self.url, {'payment_proof': proof}, format='multipart', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_duplicate_is_replayed_without_running_view(self):
+        first = self.upload()
+        self.assertEqual(first.status_code, 200)
+        updated_at = Order.objects.get(pk=self.order.pk).updated_at
+
+        with patch.object(Order, 'save') as save:
+            second = self.upload()
+        save.assert_not_called()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data, json.loads(json.dumps(first.data, cls=JSONEncoder)))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).updated_at, updated_at)
+
+    def test_reused_key_with_other_payload(self):
+        self.upload()
+        self.assertEqual(self.upload(content=image_bytes(color='blue')).status_code, 422)
+
+    def test_keys_are_scoped_and_expire(self):
+        self.upload()
+        self.assertEqual(IdempotencyKey.objects.get().scope, 'orders.upload_payment_proof')
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        response = self.upload(content=image_bytes(color='green'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.assertEqual(purge_expired_keys(), 1)
+
+    def test_without_header_runs_normally(self):
+        proof = SimpleUploadedFile('pago.jpg', image_bytes(), content_type='image/jpeg')
+        self.client.post(self.url, {'payment_proof': proof}, format='multipart')
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), PAYMENT_PROOF_ASYNC=False, NOTIFICATION_OUTBOX_ASYNC=False)
+class PaymentProofTests(APITestCase):
+    """Comprobantes de pago procesados fuera de la petición"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com')
+        self.client.force_authenticate(self.user)
+        self.order = Order.objects.create(
+            user=self.user, email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10, payment_method='yape',
+        )
+        self.url = f'/api/orders/{self.order.order_number}/upload_payment_proof/'
+
+    def upload(self, content, name='pago.jpg'):
+        proof = SimpleUploadedFile(name, content, content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, {'payment_proof': proof}, format='multipart')
+
+    def test_large_photo_is_rotated_downscaled_and_stripped(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotar 90°
+        exif[0x010F] = 'Telefono'
+        response = self.upload(image_bytes(size=(4000, 3000), exif=exif))
+        self.assertEqual(response.status_code, 200)
+
+        proof = PaymentProof.objects.get()
+        self.assertEqual(proof.status, 'ready')
+        self.assertEqual((proof.width, proof.height), (MAX_DIMENSION * 3 // 4, MAX_DIMENSION))
+        self.assertFalse(proof.original)
+
+        with proof.image.open('rb') as image_file, Image.open(image_file) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(len(image.getexif()), 0)
+        with proof.thumbnail.open('rb') as thumbnail_file, Image.open(thumbnail_file) as thumbnail:
+            self.assertEqual(max(thumbnail.size), THUMBNAIL_DIMENSION)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_proof.name, proof.image.name)
+        self.assertEqual(self.order.status, 'payment_pending')
+
+    def test_png_with_transparency_is_flattened(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (20, 20), (0, 0, 0, 0)).save(buffer, 'PNG')
+        self.upload(buffer.getvalue(), name='pago.png')
+
+        proof = PaymentProof.objects.get()
+        with proof.image.open('rb') as image_file, Image.open(image_file) as image:
+            self.assertEqual(image.getpixel((10, 10)), (255, 255, 255))
+
+    def test_upload_moves_order_through_the_state_machine(self):
+        Order.objects.filter(pk=self.order.pk).update(status='pending')
+        self.upload(image_bytes())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'payment_pending')
+        history = OrderStatusHistory.objects.get(order=self.order)
+        self.assertEqual((history.status, history.changed_by), ('payment_pending', self.user))
+
+        # Reemplazar el comprobante no repite la transición
+        self.upload(image_bytes())
+        self.assertEqual(OrderStatusHistory.objects.filter(order=self.order).count(), 1)
+
+    def test_upload_rejected_for_orders_past_payment(self):
+        for current in ('shipped', 'cancelled'):
+            Order.objects.filter(pk=self.order.pk).update(status=current)
+            response = self.upload(image_bytes())
+            self.assertEqual(response.status_code, 400)
+            self.order.refresh_from_db()
+            self.assertEqual(self.order.status, current)
+        self.assertFalse(PaymentProof.objects.exists())
+
+    def test_not_an_image_is_rejected(self):
+        response = self.upload(b'%PDF-1.4 comprobante', name='pago.pdf')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(PaymentProof.objects.exists())
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.payment_proof)
+
+    def test_response_includes_processing_details(self):
+        response = self.upload(image_bytes())
+        self.assertEqual(response.data['order']['payment_proof_details']['status'], 'pending')
+
+        response = self.client.get(f'/api/orders/{self.order.order_number}/')
+        details = response.data['payment_proof_details']
+        self.assertEqual(details['status'], 'ready')
+        self.assertEqual((details['width'], details['height']), (40, 30))
+        self.assertTrue(details['thumbnail'].endswith('.jpg'))
+
+    def test_failed_proofs_are_retried_by_the_command(self):
+        with patch('orders.proofs.load_image', side_effect=OSError('archivo truncado')):
+            self.upload(image_bytes())
+        proof = PaymentProof.objects.get()
+        self.assertEqual((proof.status, proof.attempts), ('failed', 1))
+        self.assertIn('truncado', proof.error)
+
+        out = StringIO()
+        call_command('process_payment_proofs', stdout=out)
+        self.assertIn('1 comprobantes procesados', out.getvalue())
+        proof.refresh_from_db()
+        self.assertEqual((proof.status, proof.attempts), ('ready', 2))
+
+    def test_gives_up_after_max_attempts(self):
+        with patch('orders.proofs.load_image', side_effect=OSError('dañado')):
+            self.upload(image_bytes())
+            for _ in range(MAX_ATTEMPTS):
+                process_pending()
+        proof = PaymentProof.objects.get()
+        self.assertEqual((proof.status, proof.attempts), ('failed', MAX_ATTEMPTS))
+        self.assertEqual(process_pending(), (0, 0))
+
+    def test_replaced_proof_keeps_newest(self):
+        with patch('orders.proofs.enqueue'):
+            self.upload(image_bytes(color='blue'))
+        self.upload(image_bytes(color='green'))
+        first, second = PaymentProof.objects.order_by('id')
+
+        process_pending()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_proof.name, second.image.name)
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'ready')
+
+
+class ShippingIndexTests(APITestCase):
+    """Cotización de envío desde el índice en memoria"""
+
+    def setUp(self):
+        cache.clear()
+        self.lima = ShippingZone.objects.create(
+            name='Lima', departments=['Lima', 'Callao'], cost=10, free_shipping_threshold=200, estimated_days='1-2 días'
+        )
+        self.sur = ShippingZone.objects.create(
+            name='Sur', departments=['Arequipa', 'Cusco', 'Lima'], cost=25, estimated_days='3-5 días'
+        )
+
+    def test_quote_is_served_without_queries(self):
+        self.client.post('/api/calculate-shipping/', {'department': 'Lima'})
+        with self.assertNumQueries(0):
+            response = self.client.post('/api/calculate-shipping/', {'department': 'lima', 'subtotal': 50})
+        # Gana la zona de menor id, como antes
+        self.assertEqual(response.data['zone'], 'Lima')
+        self.assertEqual((response.data['cost'], response.data['free_shipping']), (10.0, False))
+
+    def test_batch_quotes(self):
+        response = self.client.post('/api/calculate-shipping/batch/', {'quotes': [
+            {'department': 'Callao', 'subtotal': 250},
+            {'department': 'Cusco', 'subtotal': 999},
+            {'department': 'Tacna'},
+        ]}, format='json')
+        results = response.data['results']
+        self.assertEqual((results[0]['cost'], results[0]['free_shipping']), (0.0, True))
+        self.assertEqual((results[1]['zone'], results[1]['cost']), ('Sur', 25.0))
+        self.assertEqual(results[2]['message'], 'No hay cobertura para este departamento')
+
+        bad = self.client.post('/api/calculate-shipping/batch/', {'quotes': [{'department': 'Lima', 'subtotal': 'x'}]},
+                               format='json')
+        self.assertEqual(bad.status_code, 400)
+
+    def test_non_finite_or_negative_subtotal_is_rejected(self):
+        for subtotal in ('NaN', 'sNaN', 'Infinity', '-Infinity', '-5'):
+            response = self.client.post('/api/calculate-shipping/', {'department': 'Lima', 'subtotal': subtotal})
+            self.assertEqual(response.status_code, 400, subtotal)
+            response = self.client.post('/api/calculate-shipping/batch/', {'quotes': [
+                {'department': 'Lima', 'subtotal': subtotal}
+            ]}, format='json')
+            self.assertEqual(response.status_code, 400, subtotal)
+
+    def test_zone_changes_rebuild_index(self):
+        self.client.post('/api/calculate-shipping/', {'department': 'Cusco'})
+        self.sur.is_active = False
+        self.sur.save()
+        response = self.client.post('/api/calculate-shipping/', {'department': 'Cusco'})
+        self.assertNotIn('zone', response.data)
+
+    def test_index_expires_without_a_version_change(self):
+        # Cambio que no llega por la versión (otro proceso con LocMem, o .update() sin signals)
+        self.client.post('/api/calculate-shipping/', {'department': 'Cusco'})
+        ShippingZone.objects.filter(pk=self.sur.pk).update(cost=30)
+        response = self.client.post('/api/calculate-shipping/', {'department': 'Cusco'})
+        self.assertEqual(response.data['cost'], 25.0)
+
+        with patch.object(shipping, 'INDEX_TTL', 0):
+            response = self.client.post('/api/calculate-shipping/', {'department': 'Cusco'})
+        self.assertEqual(response.data['cost'], 30.0)
+
+
+class CreateOrderTests(APITestCase):
+    """Checkout completo con envío, stock e Idempotency-Key"""
+
+    def setUp(self):
+        cache.clear()
+        ShippingZone.objects.create(name='Lima', departments=['Lima'], cost=15, estimated_days='1-2 días')
+        self.product = Product.objects.create(name='Laptop', sku='CO-1', description='d', price=100, stock=5)
+        self.user = User.objects.create_user(username='cliente', email='cliente@example.com')
+        self.client.force_authenticate(self.user)
+        self.client.post('/api/cart/add/', {'product_id': self.product.id, 'quantity': 2})
+        self.payload = {
+            'email': 'cliente@example.com', 'phone': '999', 'shipping_address': 'Av. 1',
+            'shipping_city': 'Lima', 'shipping_department': 'Lima', 'payment_method': 'yape',
+        }
+
+    def test_retry_with_same_key_creates_one_order(self):
+        first = self.client.post('/api/orders/create_order/', self.payload, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(first.data['order']['shipping_cost'], '15.00')
+
+        second = self.client.post('/api/orders/create_order/', self.payload, HTTP_IDEMPOTENCY_KEY='checkout-1')
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['order']['order_number'], first.data['order']['order_number'])
+
+        self.product.refresh_from_db()
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual((self.product.stock, self.product.sales_count), (3, 2))
@@ -0,0 +1,121 @@
+"""
+Máquina de estados de las órdenes
+
+TRANSITIONS define a qué estados puede pasar cada uno. transition_orders
+aplica un cambio de estado a N órdenes en una transacción:
+1. Bloquea las filas (select_for_update, por id) y separa las que admiten la
+   transición de las que no (quedan en skipped con el motivo).
+2. Un solo UPDATE para todas: estado, updated_at y los campos propios del
+   destino (shipped_date, delivered_date, payment_status).
+3. El historial se escribe con un bulk_create.
+4. Las notificaciones a los clientes se publican como un solo evento del
+   outbox de notifications, que se envía en lote al confirmar.
+
+Como .update() no dispara signals, los handlers de post_save de
+notifications no intervienen: este módulo es el único que notifica.
+"""
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from notifications.outbox import publish
+from .models import Order, OrderStatusHistory
+
+TRANSITIONS = {
+    'pending': {'payment_pending', 'payment_verified', 'processing', 'cancelled'},
+    'payment_pending': {'payment_verified', 'cancelled'},
+    'payment_verified': {'processing', 'shipped', 'cancelled', 'refunded'},
+    'processing': {'shipped', 'cancelled', 'refunded'},
+    'shipped': {'delivered', 'refunded'},
+    'delivered': {'refunded'},
+    'cancelled': set(),
+    'refunded': set(),
+}
+
+# Máximo de órdenes por llamada al endpoint REST
+MAX_BULK_TRANSITION = 200
+
+
+class InvalidTransition(Exception):
+    """La orden no puede pasar al estado pedido"""
+
+
+def can_transition(current, target):
+    return target in TRANSITIONS.get(current, ())
+
+
+def check_transition(current, target):
+    """Lanza InvalidTransition con un mensaje para el usuario"""
+    if target not in TRANSITIONS:
+        raise InvalidTransition(f'Estado desconocido: {target}')
+    if not can_transition(current, target):
+        labels = dict(Order.STATUS_CHOICES)
+        raise InvalidTransition(
+            f'No se puede pasar de {labels.get(current, current)} a {labels[target]}'
+        )
+
+
+def status_fields(target, now):
+    """Campos que se actualizan junto con el estado"""
+    fields = {'status': target, 'updated_at': now}
+    if target == 'shipped':
+        fields['shipped_date'] = now
+    elif target == 'delivered':
+        fields['delivered_date'] = now
+    elif target == 'payment_verified':
+        fields['payment_status'] = 'paid'
+    elif target == 'refunded':
+        fields['payment_status'] = 'refunded'
+    return fields
+
+
+def transition_orders(orders, target, changed_by=None, notes='', tracking_number=None):
+    """
+    Pasar las órdenes (queryset, instancias o ids) al estado target.
+    Devuelve (actualizadas, omitidas): lista de Order con los valores nuevos
+    y lista de (Order, motivo).
+    """
+    if target not in TRANSITIONS:
+        raise InvalidTransition(f'Estado desconocido: {target}')
+
+    if isinstance(orders, QuerySet):
+        order_ids = orders.order_by().values('id')
+    else:
+        order_ids = [getattr(order, 'pk', order) for order in orders]
+    now = timezone.now()
+    updated, skipped = [], []
+
+    with transaction.atomic():
+        locked = Order.objects.select_for_update(of=('self',)).select_related('user').filter(
+            id__in=order_ids
+        ).order_by('id')
+        for order in locked:
+            try:
+                check_transition(order.status, target)
+            except InvalidTransition as e:
+                skipped.append((order, str(e)))
+            else:
+                updated.append(order)
+
+        if not updated:
+            return updated, skipped
+
+        fields = status_fields(target, now)
+        if tracking_number:
+            fields['tracking_number'] = tracking_number
+        Order.objects.filter(id__in=[order.id for order in updated]).update(**fields)
+
+        changes = []
+        for order in updated:
+            changes.append([order.id, order.status, order.payment_status])
+            for name, value in fields.items():
+                setattr(order, name, value)
+
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(order=order, status=target, notes=notes, changed_by=changed_by)
+            for order in updated
+        ])
+
+        publish('order_status_changes', status=target, changes=changes)
+
+    return updated, skipped
@@ -1,23 +1,85 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, Subquery, prefetch_related_objects
+from django.db.models.functions import Coalesce
 from django.utils import timezone  # Añadir este import
-from .models import Cart, CartItem, Order, OrderItem, ShippingZone, PaymentMethod
+from django.utils.dateparse import parse_date
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from .models import ArchivedOrder, Cart, CartItem, Order, OrderItem, ShippingZone, PaymentMethod
 from coupons.models import Coupon, CouponUsage
-from products.models import Product, ProductVariant
+from products.models import Product, ProductImage, ProductVariant
+from core.conditional import make_etag, check_not_modified, set_validators
+from core.idempotency import idempotent
+from .inventory import decrement_stock, hold_stock, InsufficientStock
+from .transitions import InvalidTransition, check_transition, transition_orders
+from .numbers import placed_between
+from .archive import get_archived_order
+from .proofs import InvalidProof, spool_upload, validate_upload
+from . import shipping
 from .serializers import (
-    CartSerializer, AddToCartSerializer,
-    OrderSerializer, CreateOrderSerializer, ShippingZoneSerializer,
+    CartSerializer, CartItemSerializer, AddToCartSerializer,
+    OrderSerializer, OrderSummarySerializer, ArchivedOrderSummarySerializer, BulkTransitionSerializer, CreateOrderSerializer, ShippingZoneSerializer,
     PaymentMethodSerializer, PaymentMethodListSerializer
 )
 
 
+def primary_image_subquery():
+    """Ruta de la imagen principal del product_id de la fila externa"""
+    return ProductImage.objects.filter(
+        product=OuterRef('product_id'),
+        is_primary=True
+    ).order_by('order', 'id').values('image')[:1]
+
+
+# Campos del producto que usa CartProductSerializer
+CART_PRODUCT_FIELDS = ('name', 'slug', 'sku', 'price', 'compare_price', 'stock', 'is_active', 'brand__name')
+
+
+def get_cart_items_queryset():
+    """Items con producto, marca y variante en un JOIN y la imagen principal anotada"""
+    return CartItem.objects.select_related('product__brand', 'variant').only(
+        'cart', 'quantity', 'price', 'variant__name',
+        *[f'product__{field}' for field in CART_PRODUCT_FIELDS]
+    ).annotate(primary_image_path=Subquery(primary_image_subquery())).order_by('id')
+
+
+# Campos de la orden que usa OrderSummarySerializer
+ORDER_SUMMARY_FIELDS = (
+    'order_number', 'email', 'phone', 'total', 'payment_method', 'payment_status',
+    'status', 'tracking_number', 'created_at'
+)
+
+
+def get_order_list_queryset(queryset):
+    """
+    Proyección de listado: columnas de OrderSummarySerializer con la cantidad
+    de items y el nombre e imagen del primer item anotados. Sin precargar
+    items: una sola consulta, sin importar el tamaño de página ni de las órdenes.
+    """
+    item_count = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        count=Count('id')
+    ).values('count')
+    first_item = OrderItem.objects.filter(order=OuterRef('pk')).order_by('id')
+
+    return queryset.only(*ORDER_SUMMARY_FIELDS).annotate(
+        item_count=Coalesce(Subquery(item_count, output_field=IntegerField()), 0),
+        first_item_name=Subquery(first_item.values('product_name')[:1]),
+        first_item_image=Subquery(first_item.annotate(
+            primary_image_path=Subquery(primary_image_subquery())
+        ).values('primary_image_path')[:1]),
+    )
+
+
 class CartViewSet(viewsets.ViewSet):
     """
     API endpoint para el carrito de compras
+    Las mutaciones aceptan ?delta=true para devolver solo el item afectado y los totales
     """
     permission_classes = [IsAuthenticated]
 
@@ -26,11 +88,44 @@ class CartViewSet(viewsets.ViewSet):
         cart, created = Cart.objects.get_or_create(user=user)
         return cart
 
+    def get_cart_data(self, cart, request):
+        """Serializar el carrito: items y proyección de productos en una sola consulta"""
+        prefetch_related_objects([cart], Prefetch('items', queryset=get_cart_items_queryset()))
+        for item in cart.items.all():
+            item.product.primary_image_path = item.primary_image_path
+        return CartSerializer(cart, context={'request': request}).data
+
+    def get_cart_response(self, cart, request, message, item_id=None, removed_item_id=None):
+        """
+        Respuesta de las mutaciones: el carrito completo, o con ?delta=true
+        solo el item afectado y los totales
+        """
+        # Los totales los actualiza el signal en la base: el objeto en memoria quedó viejo
+        cart.refresh_from_db(fields=['item_count', 'subtotal', 'updated_at'])
+        if request.query_params.get('delta', '').lower() not in ('1', 'true'):
+            return Response({'message': message, 'cart': self.get_cart_data(cart, request)})
+
+        item_data = None
+        if item_id is not None:
+            item = get_cart_items_queryset().get(pk=item_id)
+            item.product.primary_image_path = item.primary_image_path
+            item_data = CartItemSerializer(item, context={'request': request}).data
+
+        return Response({
+            'message': message,
+            'delta': {
+                'item': item_data,
+                'removed_item_id': removed_item_id,
+                'total_items': cart.item_count,
+                'subtotal': str(cart.subtotal),
+                'updated_at': cart.updated_at,
+            },
+        })
+
     def list(self, request):
         """Obtener carrito actual"""
         cart = self.get_cart(request.user)
-        serializer = CartSerializer(cart, context={'request': request})
-        return Response(serializer.data)
+        return Response(self.get_cart_data(cart, request))
 
     @action(detail=False, methods=['post'])
     def add(self, request):
@@ -49,21 +144,28 @@ class CartViewSet(viewsets.ViewSet):
 
         cart = self.get_cart(request.user)
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            variant=variant,
-            defaults={'quantity': quantity}
-        )
+        # La línea y su reserva de stock se guardan juntas o no se guardan
+        try:
+            with transaction.atomic():
+                cart_item, created = CartItem.objects.get_or_create(
+                    cart=cart,
+                    product=product,
+                    variant=variant,
+                    defaults={'quantity': quantity}
+                )
 
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+                if not created:
+                    cart_item.quantity += quantity
+                    cart_item.save()
 
-        return Response({
-            'message': 'Producto agregado al carrito',
-            'cart': CartSerializer(cart, context={'request': request}).data
-        }, status=status.HTTP_200_OK)
+                hold_stock(cart_item)
+        except InsufficientStock as e:
+            return Response(
+                {'error': f'Stock insuficiente. Solo hay {e.available} unidades disponibles'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        return self.get_cart_response(cart, request, 'Producto agregado al carrito', item_id=cart_item.id)
 
     @action(detail=False, methods=['put'], url_path='update/(?P<item_id>[^/.]+)')
     def update_item(self, request, item_id=None):
@@ -78,38 +180,29 @@ class CartViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if cart_item.variant:
-            if cart_item.variant.stock < int(quantity):
-                return Response(
-                    {'error': f'Stock insuficiente. Solo hay {cart_item.variant.stock} unidades'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-        else:
-            if cart_item.product.stock < int(quantity):
-                return Response(
-                    {'error': f'Stock insuficiente. Solo hay {cart_item.product.stock} unidades'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
+        # Renovar la reserva con la nueva cantidad (stock menos reservas de otros carritos)
         cart_item.quantity = int(quantity)
-        cart_item.save()
+        try:
+            with transaction.atomic():
+                cart_item.save()
+                hold_stock(cart_item)
+        except InsufficientStock as e:
+            return Response(
+                {'error': f'Stock insuficiente. Solo hay {e.available} unidades'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return Response({
-            'message': 'Cantidad actualizada',
-            'cart': CartSerializer(cart, context={'request': request}).data
-        })
+        return self.get_cart_response(cart, request, 'Cantidad actualizada', item_id=cart_item.id)
 
     @action(detail=False, methods=['delete'], url_path='remove/(?P<item_id>[^/.]+)')
     def remove_item(self, request, item_id=None):
         """Eliminar item del carrito"""
         cart = self.get_cart(request.user)
         cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
+        removed_item_id = cart_item.id
         cart_item.delete()
 
-        return Response({
-            'message': 'Producto eliminado del carrito',
-            'cart': CartSerializer(cart, context={'request': request}).data
-        })
+        return self.get_cart_response(cart, request, 'Producto eliminado del carrito', removed_item_id=removed_item_id)
 
     @action(detail=False, methods=['delete'])
     def clear(self, request):
@@ -117,19 +210,19 @@ class CartViewSet(viewsets.ViewSet):
         cart = self.get_cart(request.user)
         cart.items.all().delete()
 
-        return Response({
-            'message': 'Carrito vaciado',
-            'cart': CartSerializer(cart, context={'request': request}).data
-        })
+        return self.get_cart_response(cart, request, 'Carrito vaciado')
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     """
     API endpoint para órdenes
-    GET /api/orders/ - Lista de órdenes (del usuario o todas si es admin)
-    GET /api/orders/{order_number}/ - Detalle de una orden
-    POST /api/orders/create/ - Crear nueva orden
+    GET /api/orders/ - Lista de órdenes (del usuario o todas si es admin), con OrderSummarySerializer
+        ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD filtra por fecha de creación
+    GET /api/orders/{order_number}/ - Detalle de una orden (también archivadas)
+    GET /api/orders/archived/ - Órdenes archivadas (ver orders/archive.py)
+    POST /api/orders/create/ - Crear nueva orden (acepta cabecera Idempotency-Key)
     PATCH /api/orders/{order_number}/ - Actualizar orden (solo admin)
+    POST /api/orders/bulk-transition/ - Cambiar el estado de varias órdenes (solo admin)
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
@@ -139,16 +232,140 @@ class OrderViewSet(viewsets.ModelViewSet):
         """Los admins ven todas, los usuarios solo las suyas"""
         user = self.request.user
         if user.is_staff:
-            return Order.objects.all().order_by('-created_at')
-        return Order.objects.filter(user=user).order_by('-created_at')
+            queryset = Order.objects.all().order_by('-created_at')
+        else:
+            queryset = Order.objects.filter(user=user).order_by('-created_at')
+
+        if self.action == 'list':
+            return get_order_list_queryset(self.filter_by_date(queryset))
+        if self.action == 'retrieve':
+            return queryset.prefetch_related('items', 'payment_proofs')
+        return queryset
+
+    def filter_by_date(self, queryset):
+        """Rango de fechas inclusivo; usa el índice de order_number (ver orders.numbers)"""
+        date_from = self.request.query_params.get('date_from')
+        date_to = self.request.query_params.get('date_to')
+        if not date_from and not date_to:
+            return queryset
+
+        try:
+            start = parse_date(date_from) if date_from else date(2000, 1, 1)
+            end = (parse_date(date_to) if date_to else timezone.localdate()) + timedelta(days=1)
+        except (TypeError, ValueError, OverflowError):
+            start = end = None
+        if start is None or end is None:
+            raise ValidationError({'date': 'Formato de fecha inválido (YYYY-MM-DD)'})
+
+        tz = timezone.get_current_timezone()
+        return placed_between(
+            queryset,
+            datetime.combine(start, time.min, tzinfo=tz),
+            datetime.combine(end, time.min, tzinfo=tz),
+        )
+
+    def get_serializer_class(self):
+        """Listado con la proyección reducida; el detalle usa el serializer completo"""
+        if self.action == 'list':
+            return OrderSummarySerializer
+        return OrderSerializer
 
     def get_permissions(self):
         """Solo admins pueden actualizar/eliminar"""
-        if self.action in ['update', 'partial_update', 'destroy']:
+        if self.action in ['update', 'partial_update', 'destroy', 'bulk_transition']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    def perform_update(self, serializer):
+        """
+        El cambio de estado pasa por la máquina de estados (historial y notificación).
+        Los demás campos y el estado se guardan juntos o no se guardan
+        """
+        order = serializer.instance
+        target = serializer.validated_data.pop('status', order.status)
+        if target != order.status:
+            try:
+                check_transition(order.status, target)
+            except InvalidTransition as e:
+                raise ValidationError({'status': str(e)})
+
+        with transaction.atomic():
+            serializer.save()
+            if target == order.status:
+                return
+
+            updated, skipped = transition_orders([order], target, changed_by=self.request.user)
+            if skipped:
+                raise ValidationError({'status': skipped[0][1]})
+        for field in ('status', 'payment_status', 'shipped_date', 'delivered_date', 'updated_at'):
+            setattr(order, field, getattr(updated[0], field))
+
+    @action(detail=False, methods=['post'], url_path='bulk-transition')
+    def bulk_transition(self, request):
+        """Aplicar un cambio de estado a varias órdenes en una transacción"""
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        order_numbers = set(data['order_numbers'])
+        orders = Order.objects.filter(order_number__in=order_numbers).values_list('id', flat=True)
+        updated, skipped = transition_orders(
+            list(orders), data['status'], changed_by=request.user,
+            notes=data['notes'], tracking_number=data.get('tracking_number')
+        )
+        found = {order.order_number for order in updated} | {order.order_number for order, _ in skipped}
+
+        return Response({
+            'message': f'{len(updated)} órdenes actualizadas',
+            'updated': sorted(order.order_number for order in updated),
+            'skipped': [
+                {'order_number': order.order_number, 'status': order.status, 'error': error}
+                for order, error in skipped
+            ],
+            'not_found': sorted(order_numbers - found),
+        })
+
+    def retrieve(self, request, *args, **kwargs):
+        """Detalle con ETag/Last-Modified: 304 si la orden no cambió"""
+        row = self.get_queryset().filter(
+            order_number=kwargs.get('order_number')
+        ).values_list('id', 'updated_at').first()
+        if row is None:
+            return self.retrieve_archived(request, kwargs.get('order_number'))
+
+        order_id, updated_at = row
+        etag = make_etag('order', order_id, updated_at)
+        not_modified = check_not_modified(request, etag, updated_at, private=True)
+        if not_modified:
+            return not_modified
+        return set_validators(super().retrieve(request, *args, **kwargs), etag, updated_at, private=True)
+
+    def retrieve_archived(self, request, order_number):
+        """Detalle guardado al archivar (no cambia: el ETag es fijo)"""
+        archived = get_archived_order(order_number, None if request.user.is_staff else request.user)
+        if archived is None:
+            raise NotFound('Orden no encontrada')
+
+        etag = make_etag('archived-order', archived.id, archived.archived_at)
+        not_modified = check_not_modified(request, etag, archived.archived_at, private=True)
+        if not_modified:
+            return not_modified
+        return set_validators(Response(archived.data), etag, archived.archived_at, private=True)
+
+    @action(detail=False, methods=['get'])
+    def archived(self, request):
+        """Órdenes archivadas del usuario (todas si es admin)"""
+        queryset = ArchivedOrder.objects.only('order_number', 'status', 'total', 'created_at', 'archived_at')
+        if not request.user.is_staff:
+            queryset = queryset.filter(user=request.user)
+
+        page = self.paginate_queryset(queryset.order_by('-created_at'))
+        if page is not None:
+            return self.get_paginated_response(ArchivedOrderSummarySerializer(page, many=True).data)
+        return Response(ArchivedOrderSummarySerializer(queryset, many=True).data)
+
     @action(detail=False, methods=['post'])
+    @idempotent('orders.create_order')
     @transaction.atomic
     def create_order(self, request):
         """Crear nueva orden desde el carrito"""
@@ -168,14 +385,15 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        if not cart.items.exists():
+        cart_items = list(cart.items.select_related('product', 'variant').order_by('id'))
+        if not cart_items:
             return Response(
                 {'error': 'El carrito está vacío'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Verificar stock
-        for item in cart.items.all():
+        # Verificación previa sin bloqueo (la definitiva se hace al descontar)
+        for item in cart_items:
             stock = item.variant.stock if item.variant else item.product.stock
             if stock < item.quantity:
                 return Response(
@@ -183,21 +401,12 @@ class OrderViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-        subtotal = cart.subtotal
+        subtotal = sum(item.total_price for item in cart_items)
 
-        # Calcular envío
+        # Calcular envío (índice en memoria, ver shipping.py)
         shipping_department = serializer.validated_data['shipping_department']
-        shipping_zone = ShippingZone.objects.filter(
-            departments__contains=[shipping_department],
-            is_active=True
-        ).first()
-
-        shipping_cost = 0
-        if shipping_zone:
-            if shipping_zone.free_shipping_threshold and subtotal >= shipping_zone.free_shipping_threshold:
-                shipping_cost = 0
-            else:
-                shipping_cost = shipping_zone.cost
+        shipping_quote = shipping.quote(shipping_department, subtotal)
+        shipping_cost = shipping_quote['cost'] if shipping_quote else 0
 
         # Procesar cupón
         coupon_code = serializer.validated_data.get('coupon_code', '').strip()
@@ -265,6 +474,16 @@ class OrderViewSet(viewsets.ModelViewSet):
 
         total = subtotal + shipping_cost - discount_amount
 
+        # Descontar stock con filas bloqueadas y UPDATE condicional (ver inventory.py)
+        try:
+            with transaction.atomic():
+                decrement_stock(cart_items)
+        except InsufficientStock as e:
+            return Response(
+                {'error': f'Stock insuficiente para {e.name}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         # Crear orden
         order = Order.objects.create(
             user=user,
@@ -285,27 +504,19 @@ class OrderViewSet(viewsets.ModelViewSet):
             status='payment_pending',
         )
 
-        # Crear items
-        for cart_item in cart.items.all():
-            OrderItem.objects.create(
+        # Crear items (snapshot de nombre y SKU, igual que OrderItem.save)
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 product=cart_item.product,
                 variant=cart_item.variant,
+                product_name=cart_item.product.name,
+                product_sku=cart_item.variant.sku if cart_item.variant else cart_item.product.sku,
                 quantity=cart_item.quantity,
                 price=cart_item.price,
             )
-
-            # Reducir stock
-            if cart_item.variant:
-                cart_item.variant.stock -= cart_item.quantity
-                cart_item.variant.save()
-            else:
-                cart_item.product.stock -= cart_item.quantity
-                cart_item.product.save()
-
-            # Incrementar ventas
-            cart_item.product.sales_count += cart_item.quantity
-            cart_item.product.save()
+            for cart_item in cart_items
+        ])
 
         # Registrar uso del cupón
         if coupon:
@@ -330,8 +541,13 @@ class OrderViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
+    @idempotent('orders.upload_payment_proof')
+    @transaction.atomic
     def upload_payment_proof(self, request, order_number=None):
-        """Subir comprobante de pago"""
+        """
+        Subir comprobante de pago. Responde apenas el archivo queda guardado;
+        la imagen se reduce y limpia después (ver orders/proofs.py)
+        """
         order = self.get_object()
 
         if order.payment_method not in ['yape', 'plin', 'transfer']:
@@ -347,9 +563,32 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.payment_proof = payment_proof
-        order.status = 'payment_pending'
-        order.save()
+        try:
+            validate_upload(payment_proof)
+        except InvalidProof as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Subir el comprobante deja la orden en payment_pending (si ya lo está, se reemplaza)
+        needs_transition = order.status != 'payment_pending'
+        if needs_transition:
+            try:
+                check_transition(order.status, 'payment_pending')
+            except InvalidTransition as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        proof = spool_upload(order, payment_proof)
+        # Mientras se procesa, el admin ve el original
+        order.payment_proof = proof.original.name
+        order.save(update_fields=['payment_proof', 'updated_at'])
+
+        if needs_transition:
+            updated, skipped = transition_orders(
+                [order], 'payment_pending', changed_by=request.user, notes='Comprobante de pago subido'
+            )
+            if skipped:
+                # La orden cambió de estado mientras tanto: se revierte todo
+                raise ValidationError({'error': skipped[0][1]})
+            order.status, order.updated_at = updated[0].status, updated[0].updated_at
 
         return Response({
             'message': 'Comprobante subido exitosamente. Tu pago será verificado pronto.',
@@ -385,45 +624,95 @@ def shipping_zones_list(request):
     return Response(serializer.data)
 
 
+def format_quote(shipping_quote):
+    """Respuesta de cotización (mismo formato para simple y por lote)"""
+    if not shipping_quote:
+        return {
+            'cost': 0,
+            'message': 'No hay cobertura para este departamento'
+        }
+
+    threshold = shipping_quote['free_shipping_threshold']
+    return {
+        'cost': float(shipping_quote['cost']),
+        'zone': shipping_quote['zone'],
+        'estimated_days': shipping_quote['estimated_days'],
+        'free_shipping': shipping_quote['free_shipping'],
+        'free_shipping_threshold': float(threshold) if threshold else None
+    }
+
+
+def parse_subtotal(value):
+    """Subtotal como Decimal; None si no es un número finito y no negativo (NaN, Infinity)"""
+    try:
+        subtotal = Decimal(str(value or 0))
+    except InvalidOperation:
+        return None
+    if not subtotal.is_finite() or subtotal < 0:
+        return None
+    return subtotal
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def calculate_shipping(request):
     """Calcular costo de envío"""
     department = request.data.get('department')
-    subtotal = request.data.get('subtotal', 0)
+    subtotal = parse_subtotal(request.data.get('subtotal', 0))
 
     if not department:
         return Response(
             {'error': 'Debes proporcionar un departamento'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    if subtotal is None:
+        return Response(
+            {'error': 'Subtotal inválido'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-    shipping_zone = ShippingZone.objects.filter(
-        departments__contains=[department],
-        is_active=True
-    ).first()
+    return Response(format_quote(shipping.quote(department, subtotal)))
 
-    if not shipping_zone:
-        return Response({
-            'cost': 0,
-            'message': 'No hay cobertura para este departamento'
+
+# Máximo de cotizaciones por petición
+MAX_BATCH_QUOTES = 50
+
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def calculate_shipping_batch(request):
+    """
+    Cotizar varios departamentos/subtotales en una llamada, sin consultar la base de datos
+    Body: {"quotes": [{"department": "Lima", "subtotal": 120}, ...]}
+    """
+    quotes = request.data.get('quotes')
+    if not isinstance(quotes, list) or not quotes:
+        return Response(
+            {'error': 'Debes proporcionar una lista de cotizaciones'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(quotes) > MAX_BATCH_QUOTES:
+        return Response(
+            {'error': f'Máximo {MAX_BATCH_QUOTES} cotizaciones por petición'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = []
+    for position, item in enumerate(quotes):
+        department = item.get('department') if isinstance(item, dict) else None
+        subtotal = parse_subtotal(item.get('subtotal', 0)) if isinstance(item, dict) else None
+        if not department or subtotal is None:
+            return Response(
+                {'error': f'Cotización {position} inválida: requiere department y subtotal numérico'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        results.append({
+            'department': department,
+            'subtotal': float(subtotal),
+            **format_quote(shipping.quote(department, subtotal)),
         })
 
-    cost = shipping_zone.cost
-    free_shipping = False
-
-    if shipping_zone.free_shipping_threshold and float(subtotal) >= float(shipping_zone.free_shipping_threshold):
-        cost = 0
-        free_shipping = True
-
-    return Response({
-        'cost': float(cost),
-        'zone': shipping_zone.name,
-        'estimated_days': shipping_zone.estimated_days,
-        'free_shipping': free_shipping,
-        'free_shipping_threshold': float(
-            shipping_zone.free_shipping_threshold) if shipping_zone.free_shipping_threshold else None
-    })
+    return Response({'results': results})
 
 
 class PaymentMethodViewSet(viewsets.ModelViewSet):
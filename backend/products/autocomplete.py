@@ -0,0 +1,189 @@
+"""
+Autocomplete de productos, categorías y marcas
+
+Dos niveles:
+1. Índice de prefijos en memoria del proceso (lista ordenada de palabras
+   normalizadas + bisect). Se reconstruye cuando cambia la versión guardada
+   en caché, que los signals incrementan al modificar el catálogo.
+2. Si el índice no completa el límite, consulta a PostgreSQL con pg_trgm
+   sobre f_unaccent(lower(name)) (índices GIN creados en la migración 0006),
+   que cubre coincidencias en medio de palabras y errores de tipeo.
+   En SQLite cae a icontains.
+
+La normalización quita tildes y pasa a minúsculas, igual que f_unaccent(lower()).
+"""
+
+import time
+from bisect import bisect_left
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import CharField, F, Func, OuterRef, Q, Subquery
+from django.db.models.functions import Length, Lower
+from core.text import normalize
+from .models import Brand, Category, Product, ProductImage
+
+VERSION_KEY = 'autocomplete_version:{}'
+
+# Por encima de este tamaño el catálogo se consulta solo en la base de datos
+PREFIX_INDEX_MAX_ENTRIES = 50000
+
+# Índices por proceso: {tipo: (versión, PrefixIndex)}
+_indexes = {}
+
+
+class ImmutableUnaccent(Func):
+    """f_unaccent(): envoltura IMMUTABLE de unaccent, usable en índices"""
+    function = 'f_unaccent'
+    output_field = CharField()
+
+
+class PrefixIndex:
+    """Índice de prefijos por palabra sobre una lista de entradas"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.names = [normalize(entry['name']) for entry in entries]
+        self.tokens = sorted(
+            (token, position)
+            for position, name in enumerate(self.names)
+            for token in set(name.split())
+        )
+        self.keys = [token for token, _position in self.tokens]
+
+    def search(self, query, limit):
+        words = normalize(query).split()
+        if not words:
+            return self.entries[:limit]
+
+        # La última palabra puede estar incompleta; las anteriores deben aparecer
+        last = words[-1]
+        start = bisect_left(self.keys, last)
+        end = bisect_left(self.keys, last + '\uffff')
+        candidates = {position for _token, position in self.tokens[start:end]}
+
+        phrase = ' '.join(words)
+        matches = []
+        for position in candidates:
+            name = self.names[position]
+            if all(word in name for word in words[:-1]):
+                entry = self.entries[position]
+                matches.append((
+                    0 if name.startswith(phrase) else 1,
+                    -entry.get('score', 0),
+                    len(name),
+                    position,
+                ))
+
+        matches.sort()
+        return [self.entries[match[-1]] for match in matches[:limit]]
+
+
+def bump_version(kind):
+    """Invalidar los índices en memoria de todos los procesos"""
+    cache.set(VERSION_KEY.format(kind), time.time_ns(), timeout=None)
+
+
+def get_prefix_index(kind):
+    version = cache.get(VERSION_KEY.format(kind))
+    cached = _indexes.get(kind)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    entries = SOURCES[kind]['entries']()
+    index = PrefixIndex(entries) if entries is not None else None
+    _indexes[kind] = (version, index)
+    return index
+
+
+def product_entries():
+    queryset = Product.objects.filter(is_active=True)
+    if queryset.count() > PREFIX_INDEX_MAX_ENTRIES:
+        return None
+    primary_image = ProductImage.objects.filter(
+        product=OuterRef('pk'), is_primary=True
+    ).order_by('order', 'id').values('image')[:1]
+    return list(
+        queryset.annotate(thumbnail=Subquery(primary_image), score=F('sales_count')).values(
+            'id', 'name', 'slug', 'thumbnail', 'score'
+        ).order_by('-sales_count', 'name')
+    )
+
+
+def category_entries():
+    return list(
+        Category.objects.filter(is_active=True).order_by('order', 'name').annotate(
+            thumbnail=F('image')
+        ).values('id', 'name', 'slug', 'thumbnail')
+    )
+
+
+def brand_entries():
+    return list(
+        Brand.objects.filter(is_active=True).order_by('name').annotate(
+            thumbnail=F('logo')
+        ).values('id', 'name', 'slug', 'thumbnail')
+    )
+
+
+SOURCES = {
+    'product': {'entries': product_entries, 'queryset': lambda: Product.objects.filter(is_active=True)},
+    'category': {'entries': category_entries, 'queryset': lambda: Category.objects.filter(is_active=True)},
+    'brand': {'entries': brand_entries, 'queryset': lambda: Brand.objects.filter(is_active=True)},
+}
+
+THUMBNAIL_FIELDS = {'product': None, 'category': 'image', 'brand': 'logo'}
+
+
+def search_database(kind, query, limit, exclude_ids=()):
+    """Búsqueda por trigramas (PostgreSQL) o icontains (otros motores)"""
+    queryset = SOURCES[kind]['queryset']().exclude(id__in=exclude_ids)
+    normalized = normalize(query)
+
+    if connection.vendor == 'postgresql':
+        queryset = queryset.annotate(normalized_name=ImmutableUnaccent(Lower('name'))).filter(
+            Q(normalized_name__contains=normalized) |
+            Q(normalized_name__trigram_word_similar=normalized)
+        ).annotate(
+            similarity=TrigramWordSimilarity(normalized, 'normalized_name')
+        ).order_by('-similarity', Length('name'))
+    else:
+        queryset = queryset.filter(name__icontains=query).order_by(Length('name'))
+
+    if kind == 'product':
+        primary_image = ProductImage.objects.filter(
+            product=OuterRef('pk'), is_primary=True
+        ).order_by('order', 'id').values('image')[:1]
+        queryset = queryset.annotate(thumbnail=Subquery(primary_image))
+    else:
+        queryset = queryset.annotate(thumbnail=F(THUMBNAIL_FIELDS[kind]))
+
+    return list(queryset.values('id', 'name', 'slug', 'thumbnail')[:limit])
+
+
+def autocomplete(kind, query, limit=10, request=None):
+    """Resultados rankeados [{'id', 'name', 'slug', 'thumbnail'}]"""
+    index = get_prefix_index(kind)
+    results = index.search(query, limit) if index else []
+
+    if len(results) < limit and normalize(query):
+        found = [entry['id'] for entry in results]
+        results = results + search_database(kind, query, limit - len(results), exclude_ids=found)
+
+    return [
+        {
+            'id': entry['id'],
+            'name': entry['name'],
+            'slug': entry['slug'],
+            'thumbnail': thumbnail_url(entry['thumbnail'], request),
+        }
+        for entry in results
+    ]
+
+
+def thumbnail_url(path, request=None):
+    if not path:
+        return None
+    url = default_storage.url(path)
+    return request.build_absolute_uri(url) if request else url
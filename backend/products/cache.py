@@ -0,0 +1,155 @@
+"""
+Versiones de caché del catálogo
+
+Las claves cacheadas del catálogo incluyen un número de versión. Al cambiar
+un producto, categoría, marca, imagen o reseña, los signals incrementan la
+versión y las entradas anteriores quedan huérfanas (expiran solas), sin
+necesidad de buscarlas y borrarlas.
+
+Ámbitos usados:
+- catalog: cualquier cambio del catálogo (facetas)
+- storefront: productos, imágenes y reseñas (destacados, ofertas)
+- taxonomy: categorías y marcas (nombres y estructura en las respuestas)
+- category:<id>: productos de la categoría o de su subárbol
+- product:<id>: stock y ventas de un producto (el checkout no guarda el
+  modelo, ver invalidate_products)
+
+Las respuestas públicas del catálogo se cachean con cached_response, que
+además lleva contadores de aciertos y fallos por endpoint. Cada respuesta
+guarda la versión product:<id> de los productos que incluye y se descarta
+si alguno cambió: una venta invalida solo los listados donde aparece el
+producto vendido.
+"""
+
+import hashlib
+from django.core.cache import cache
+
+VERSION_KEY = 'catalog_version:{}'
+
+
+def get_version(scope='catalog'):
+    """Versión actual de un ámbito de caché"""
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_version(scope='catalog'):
+    """Invalidar todas las entradas cacheadas de un ámbito"""
+    key = VERSION_KEY.format(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+        return 2
+
+
+def bump_versions(scopes):
+    for scope in set(scopes):
+        bump_version(scope)
+
+
+def get_versions(scopes):
+    """Versiones de varios ámbitos con una sola lectura a la caché"""
+    keys = {VERSION_KEY.format(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    versions = []
+    for key, scope in keys.items():
+        versions.append(found[key] if key in found else get_version(scope))
+    return versions
+
+
+def make_key(prefix, params, scope='catalog'):
+    """
+    Clave versionada a partir de parámetros normalizados (orden estable).
+    scope puede ser un ámbito o una tupla de ámbitos.
+    """
+    scopes = (scope,) if isinstance(scope, str) else tuple(scope)
+    normalized = '&'.join(f'{name}={value}' for name, value in sorted(params))
+    digest = hashlib.md5(normalized.encode()).hexdigest()
+    version = '.'.join(str(v) for v in get_versions(scopes))
+    return f'{prefix}:v{version}:{digest}'
+
+
+def category_scopes(paths):
+    """Ámbitos category:<id> de cada categoría y sus ancestros (ruta "/1/5/")"""
+    return [
+        f'category:{category_id}'
+        for path in paths
+        for category_id in path.strip('/').split('/') if category_id
+    ]
+
+
+def product_scopes(product_ids):
+    return [f'product:{product_id}' for product_id in product_ids]
+
+
+def invalidate_products(product_ids, sold_out=False):
+    """
+    Invalidar lo cacheado de estos productos tras el UPDATE de stock del
+    checkout, que no dispara los signals de guardado: solo sus versiones
+    product:<id> (detalle y respuestas que los incluyen). Las facetas
+    (ámbito catalog) solo cambian si alguno se agotó.
+    """
+    bump_versions([*product_scopes(product_ids), *(['catalog'] if sold_out else [])])
+
+
+# Respuestas cacheadas
+
+RESPONSE_TIMEOUT = 60 * 15
+STATS_KEY = 'catalog_cache:{}:{}'
+CACHED_ENDPOINTS = ('featured', 'on_sale', 'category_products')
+
+
+def incr_counter(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def cached_response(name, request, scopes, build, params=()):
+    """
+    Lista de productos serializados de un endpoint público, desde la caché
+    si la versión de sus ámbitos y la de cada producto incluido no
+    cambiaron; si no, se llama a build() y se guarda.
+
+    Las URLs de imágenes son absolutas, así que el host forma parte de la clave.
+    """
+    params = [*params, ('_host', request.build_absolute_uri('/'))]
+    key = make_key(f'catalog_products:{name}', params, scopes)
+
+    entry = cache.get(key)
+    if entry is not None:
+        product_ids, versions, data = entry
+        if get_versions(product_scopes(product_ids)) == versions:
+            incr_counter(STATS_KEY.format(name, 'hits'))
+            return data
+
+    incr_counter(STATS_KEY.format(name, 'misses'))
+    data = build()
+    product_ids = [item['id'] for item in data]
+    cache.set(key, (product_ids, get_versions(product_scopes(product_ids)), data), RESPONSE_TIMEOUT)
+    return data
+
+
+def get_cache_stats():
+    """Aciertos, fallos y tasa de acierto por endpoint cacheado"""
+    keys = [STATS_KEY.format(name, kind) for name in CACHED_ENDPOINTS for kind in ('hits', 'misses')]
+    counters = cache.get_many(keys)
+
+    stats = {}
+    for name in CACHED_ENDPOINTS:
+        hits = counters.get(STATS_KEY.format(name, 'hits'), 0)
+        misses = counters.get(STATS_KEY.format(name, 'misses'), 0)
+        total = hits + misses
+        stats[name] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+    return stats
@@ -0,0 +1,224 @@
+"""
+Contador de vistas de productos con escritura diferida
+
+Cada vista incrementa un contador en el backend de caché en lugar de hacer
+UPDATE sobre la fila del producto. Un flush periódico aplica los acumulados
+con UPDATE ... SET views = views + n, agrupando los productos con el mismo n.
+Lo dispara como mucho un request por FLUSH_INTERVAL, pero corre fuera de él:
+con PRODUCT_VIEWS_FLUSH_ASYNC en un hilo del proceso al confirmar la
+transacción; el comando flush_product_views puede hacerlo también.
+
+El flush solo lee los productos con vistas pendientes: cuando el contador
+de un producto pasa a 1 se anota su id en una cola de la caché (un número
+de secuencia más una clave por posición) y el flush toma las posiciones
+nuevas. Así su costo depende de los productos vistos, no del catálogo.
+Entre tomar la secuencia y escribir su posición hay un instante en que la
+posición falta: el flush solo avanza hasta el primer hueco y lo vuelve a
+leer la próxima vez. El comando flush_product_views --all revisa además todo
+el catálogo, así que ahí se saltan los huecos (una posición que nunca se
+escribió, por un proceso caído o una clave desalojada, deja de frenar la cola).
+
+El flush también mantiene una puntuación de tendencia con decaimiento
+exponencial, que se expone como vistas por hora.
+"""
+
+import logging
+import math
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'product_views:pending:{}'
+DIRTY_SEQ_KEY = 'product_views:dirty_seq'
+DIRTY_SLOT_KEY = 'product_views:dirty:{}'
+FLUSHED_SEQ_KEY = 'product_views:flushed_seq'
+TRENDING_KEY = 'product_views:trending'
+FLUSH_LOCK_KEY = 'product_views:flush_lock'
+
+# Como máximo un flush por intervalo entre todos los workers
+FLUSH_INTERVAL = 60
+
+# Vida media (segundos) de la puntuación de tendencia
+TRENDING_HALF_LIFE = 60 * 60
+
+# Puntuaciones menores a esto se descartan
+TRENDING_MIN_SCORE = 0.01
+
+_executor = None
+
+
+def incr_key(key):
+    """Incrementar un contador sin expiración (lo crea si falta). Devuelve el valor nuevo"""
+    if cache.add(key, 1, timeout=None):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # La clave desapareció entre add e incr
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def record_view(product_id):
+    """Registrar una vista sin tocar la base de datos"""
+    if incr_key(PENDING_KEY.format(product_id)) == 1:
+        # Primera vista pendiente: anotar el producto para el próximo flush
+        mark_dirty([product_id])
+    maybe_flush()
+
+
+def mark_dirty(product_ids):
+    for product_id in product_ids:
+        cache.set(DIRTY_SLOT_KEY.format(incr_key(DIRTY_SEQ_KEY)), product_id, timeout=None)
+
+
+def take_dirty(skip_gaps=False):
+    """
+    Productos anotados desde el último flush. La cola avanza (y se borran
+    sus posiciones) solo hasta la primera posición que falte, salvo con
+    skip_gaps=True
+    """
+    current = cache.get(DIRTY_SEQ_KEY) or 0
+    last = cache.get(FLUSHED_SEQ_KEY) or 0
+    if last > current:
+        # La secuencia se perdió (caché reiniciada) y volvió a empezar
+        last = 0
+    if current == last:
+        return set()
+
+    keys = [DIRTY_SLOT_KEY.format(position) for position in range(last + 1, current + 1)]
+    slots = cache.get_many(keys)
+    taken = keys
+    if not skip_gaps:
+        # Posición aún sin escribir: la secuencia ya se tomó pero el set no llegó
+        missing = next((index for index, key in enumerate(keys) if key not in slots), len(keys))
+        taken = keys[:missing]
+
+    if taken:
+        cache.set(FLUSHED_SEQ_KEY, last + len(taken), timeout=None)
+        cache.delete_many(taken)
+    # Las posiciones presentes tras el hueco se aplican ya y se releen después
+    return set(slots.values())
+
+
+def get_pending_views(product_id):
+    """Vistas registradas que aún no se escribieron en la base de datos"""
+    return cache.get(PENDING_KEY.format(product_id)) or 0
+
+
+def maybe_flush():
+    """Encolar un flush si pasó el intervalo desde el último (cache.add actúa como candado)"""
+    if cache.add(FLUSH_LOCK_KEY, 1, timeout=FLUSH_INTERVAL):
+        transaction.on_commit(enqueue_flush)
+
+
+def enqueue_flush():
+    if not getattr(settings, 'PRODUCT_VIEWS_FLUSH_ASYNC', True):
+        flush_views()
+        return
+
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='product-views')
+    _executor.submit(run_in_thread)
+
+
+def run_in_thread():
+    close_old_connections()
+    try:
+        flush_views()
+    except Exception:
+        logger.exception("Error aplicando las vistas de productos")
+    finally:
+        close_old_connections()
+
+
+def flush_views(sweep=False):
+    """
+    Escribir en la base de datos las vistas acumuladas de los productos
+    anotados; con sweep=True se revisa todo el catálogo (solo desde el
+    comando, fuera de los requests).
+    Devuelve la cantidad total de vistas aplicadas.
+    """
+    product_ids = take_dirty(skip_gaps=sweep)
+    if sweep:
+        product_ids.update(Product.objects.values_list('id', flat=True))
+    keys = {PENDING_KEY.format(product_id): product_id for product_id in product_ids}
+    pending = cache.get_many(list(keys)) if keys else {}
+
+    increments = {keys[key]: count for key, count in pending.items() if count}
+    if not increments:
+        update_trending({})
+        return 0
+
+    # Un UPDATE por cada valor distinto de incremento
+    by_amount = defaultdict(list)
+    for product_id, count in increments.items():
+        by_amount[count].append(product_id)
+
+    with transaction.atomic():
+        for count, product_ids in by_amount.items():
+            Product.objects.filter(id__in=product_ids).update(views=F('views') + count)
+
+    # Descontar solo lo aplicado; las vistas que llegaron mientras tanto quedan
+    # pendientes y se vuelven a anotar (su contador ya no pasará por 1)
+    leftovers = []
+    for product_id, count in increments.items():
+        try:
+            if cache.decr(PENDING_KEY.format(product_id), count) > 0:
+                leftovers.append(product_id)
+        except ValueError:
+            pass
+    mark_dirty(leftovers)
+
+    update_trending(increments)
+    return sum(increments.values())
+
+
+def update_trending(increments, now=None):
+    """Aplicar decaimiento a las puntuaciones y sumar los nuevos incrementos"""
+    now = now or time.time()
+    state = cache.get(TRENDING_KEY) or {'at': now, 'scores': {}}
+
+    decay = 0.5 ** ((now - state['at']) / TRENDING_HALF_LIFE)
+    scores = {}
+    for product_id, score in state['scores'].items():
+        score *= decay
+        if score >= TRENDING_MIN_SCORE:
+            scores[product_id] = score
+
+    for product_id, count in increments.items():
+        scores[product_id] = scores.get(product_id, 0) + count
+
+    cache.set(TRENDING_KEY, {'at': now, 'scores': scores}, timeout=None)
+
+
+def get_view_rates(now=None):
+    """
+    Vistas por hora estimadas por producto.
+
+    Con decaimiento exponencial la puntuación converge a
+    tasa * vida_media / ln 2, de ahí la conversión.
+    """
+    now = now or time.time()
+    state = cache.get(TRENDING_KEY)
+    if not state:
+        return {}
+
+    decay = 0.5 ** ((now - state['at']) / TRENDING_HALF_LIFE)
+    factor = decay * math.log(2) / TRENDING_HALF_LIFE * 3600
+    return {product_id: round(score * factor, 2) for product_id, score in state['scores'].items()}
+
+
+def get_trending_ids(limit=12):
+    """IDs de productos ordenados por tasa de vistas (mayor primero)"""
+    rates = get_view_rates()
+    ranked = sorted(rates.items(), key=lambda item: item[1], reverse=True)
+    return [product_id for product_id, _rate in ranked[:limit]]
@@ -0,0 +1,100 @@
+"""
+Facetas del listado de productos
+
+Conteos por categoría, marca, rango de precio, stock y oferta calculados
+sobre el queryset ya filtrado: dos GROUP BY (categoría y marca) y un
+aggregate con COUNT ... FILTER para el resto. El resultado se cachea por
+conjunto de filtros normalizado y versión del catálogo.
+"""
+
+from decimal import Decimal
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+from .cache import make_key
+
+FACETS_TIMEOUT = 60 * 10
+
+# Rangos de precio [desde, hasta) en soles; None = sin límite superior
+PRICE_BUCKETS = [
+    (Decimal('0'), Decimal('50')),
+    (Decimal('50'), Decimal('100')),
+    (Decimal('100'), Decimal('250')),
+    (Decimal('250'), Decimal('500')),
+    (Decimal('500'), Decimal('1000')),
+    (Decimal('1000'), Decimal('2500')),
+    (Decimal('2500'), None),
+]
+
+# Parámetros que no cambian el conjunto filtrado
+IGNORED_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'with_count', 'ordering', 'facets'}
+
+
+def wants_facets(request):
+    return request.query_params.get('facets', '').lower() in ('1', 'true')
+
+
+def get_facets(queryset, request, scope='list'):
+    """Facetas cacheadas para el queryset filtrado de este request"""
+    params = [
+        (name, value)
+        for name, values in request.query_params.lists()
+        if name not in IGNORED_PARAMS
+        for value in values
+    ]
+    # Staff ve productos inactivos: conjunto distinto
+    params.append(('_staff', bool(request.user and request.user.is_staff)))
+    params.append(('_scope', scope))
+
+    key = make_key('product_facets', params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
+
+
+def compute_facets(queryset):
+    base = queryset.order_by()
+
+    categories = base.filter(category__isnull=False).values(
+        'category_id', 'category__name', 'category__slug'
+    ).annotate(count=Count('id')).order_by('-count', 'category__name')
+
+    brands = base.filter(brand__isnull=False).values(
+        'brand_id', 'brand__name', 'brand__slug'
+    ).annotate(count=Count('id')).order_by('-count', 'brand__name')
+
+    aggregates = {
+        'in_stock': Count('id', filter=Q(stock__gt=0)),
+        'out_of_stock': Count('id', filter=Q(stock__lte=0)),
+        'on_sale': Count('id', filter=Q(compare_price__gt=F('price'))),
+    }
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        aggregates[f'price_{index}'] = Count('id', filter=condition)
+    totals = base.aggregate(**aggregates)
+
+    return {
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'],
+             'slug': row['category__slug'], 'count': row['count']}
+            for row in categories
+        ],
+        'brands': [
+            {'id': row['brand_id'], 'name': row['brand__name'],
+             'slug': row['brand__slug'], 'count': row['count']}
+            for row in brands
+        ],
+        'price_ranges': [
+            {'min': float(low), 'max': float(high) if high is not None else None,
+             'count': totals[f'price_{index}']}
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'availability': {
+            'in_stock': totals['in_stock'],
+            'out_of_stock': totals['out_of_stock'],
+        },
+        'on_sale': totals['on_sale'],
+    }
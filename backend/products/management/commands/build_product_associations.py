@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from products.recommendations import TOP_N, rebuild_associations, refresh_associations
+
+
+class Command(BaseCommand):
+    help = 'Calcular productos comprados juntos a partir de las órdenes (incremental por defecto)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recalcular la tabla completa')
+        parser.add_argument('--top', type=int, default=TOP_N, help='Vecinos guardados por producto')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            products, rows = rebuild_associations(options['top'])
+        else:
+            products, rows = refresh_associations(options['top'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {products} productos actualizados ({rows} relaciones)'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from products.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Escribir en la base de datos las vistas de productos acumuladas en caché'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Revisar todo el catálogo, no solo los productos anotados (salta huecos de la cola)')
+
+    def handle(self, *args, **options):
+        applied = flush_views(sweep=options['all'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {applied} vistas aplicadas'))
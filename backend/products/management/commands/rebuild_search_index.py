@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+from products.search import is_full_text_enabled, update_search_vector
+
+
+class Command(BaseCommand):
+    help = 'Recalcular el vector de búsqueda de texto completo de los productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Cantidad de productos por UPDATE',
+        )
+
+    def handle(self, *args, **options):
+        if not is_full_text_enabled():
+            self.stdout.write(self.style.WARNING(
+                'La búsqueda de texto completo requiere PostgreSQL; no hay nada que reconstruir'
+            ))
+            return
+
+        batch_size = options['batch_size']
+        ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        updated = 0
+
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            updated += update_search_vector(Product.objects.filter(id__in=batch))
+            self.stdout.write(f'  {updated}/{len(ids)} productos indexados')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Índice de búsqueda reconstruido ({updated} productos)'))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:32
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """Índice GIN y vectores iniciales (solo PostgreSQL)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS products_product_search_vector_gin '
+        'ON products_product USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        "UPDATE products_product SET search_vector = "
+        "setweight(to_tsvector('spanish', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('spanish', coalesce(sku, '')), 'B') || "
+        "setweight(to_tsvector('spanish', coalesce(short_description, '')), 'C') || "
+        "setweight(to_tsvector('spanish', coalesce(description, '')), 'D')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS products_product_search_vector_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Vector de búsqueda'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:36
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    """Calcular la ruta materializada de las categorías existentes"""
+    Category = apps.get_model('products', 'Category')
+    categories = {c.pk: c for c in Category.objects.all()}
+
+    def resolve(category, seen=()):
+        if category.path:
+            return category.path
+        parent = categories.get(category.parent_id)
+        if parent is None or parent.pk in seen:
+            parent_path = '/'
+        else:
+            parent_path = resolve(parent, seen + (category.pk,))
+        category.path = f'{parent_path}{category.pk}/'
+        category.depth = category.path.count('/') - 2
+        return category.path
+
+    for category in categories.values():
+        resolve(category)
+    Category.objects.bulk_update(categories.values(), ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Profundidad'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Ruta'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='products_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 04:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_autocomplete_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAssociation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(verbose_name='Órdenes en común')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Posición')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculado')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='associations', to='products.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='associated_from', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Producto relacionado',
+                'verbose_name_plural': 'Productos relacionados',
+                'ordering': ['product', 'rank'],
+                'indexes': [models.Index(fields=['product', 'rank'], name='products_pr_product_85c856_idx')],
+                'unique_together': {('product', 'related')},
+            },
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.utils.text import slugify
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 
 
 class Category(models.Model):
@@ -16,6 +20,10 @@ class Category(models.Model):
     is_active = models.BooleanField('Activa', default=True)
     order = models.IntegerField('Orden', default=0)
 
+    # Árbol: ruta materializada de IDs ("/1/5/") y profundidad (raíz = 0)
+    path = models.CharField('Ruta', max_length=255, blank=True, editable=False)
+    depth = models.PositiveIntegerField('Profundidad', default=0, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -23,11 +31,59 @@ class Category(models.Model):
         verbose_name = 'Categoría'
         verbose_name_plural = 'Categorías'
         ordering = ['order', 'name']
+        indexes = [
+            models.Index(fields=['path'], name='products_category_path_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def clean(self):
+        """El admin y los formularios validan aquí que no se cree un ciclo"""
+        super().clean()
+        if self.parent_id and self.path and self.parent.path.startswith(self.path):
+            raise ValidationError({'parent': 'Una categoría no puede moverse dentro de sí misma'})
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+
+        old_path, old_depth = None, 0
+        if self.pk:
+            old_path, old_depth = Category.objects.filter(pk=self.pk).values_list(
+                'path', 'depth'
+            ).first() or (None, 0)
+
+        parent_path = self.parent.path if self.parent_id else '/'
+        if old_path and parent_path.startswith(old_path):
+            # clean() y el serializer ya lo validan: llegar aquí es un error de programación
+            raise ValueError('Una categoría no puede moverse dentro de sí misma')
+
         super().save(*args, **kwargs)
+        self.update_tree_path(old_path, old_depth, parent_path)
+
+    def update_tree_path(self, old_path, old_depth, parent_path):
+        """Recalcular la ruta propia y, si cambió, la de todos los descendientes"""
+        new_path = f'{parent_path}{self.pk}/'
+        new_depth = new_path.count('/') - 2
+        if new_path == old_path:
+            return
+
+        if old_path:
+            # Mover el subárbol completo con un solo UPDATE
+            Category.objects.filter(path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - old_depth),
+            )
+        else:
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+
+        self.path = new_path
+        self.depth = new_depth
+
+    def get_descendants(self, include_self=False):
+        """Subárbol de la categoría usando la ruta materializada"""
+        queryset = Category.objects.filter(path__startswith=self.path)
+        if not include_self:
+            queryset = queryset.exclude(pk=self.pk)
+        return queryset
 
     def __str__(self):
         return self.name
@@ -104,10 +160,16 @@ class Product(models.Model):
     views = models.IntegerField('Vistas', default=0)
     sales_count = models.IntegerField('Ventas totales', default=0)
 
+    # Búsqueda (tsvector ponderado, mantenido en save y por rebuild_search_index)
+    search_vector = SearchVectorField('Vector de búsqueda', null=True, editable=False)
+
     # Timestamps
     created_at = models.DateTimeField('Fecha de creación', auto_now_add=True)
     updated_at = models.DateTimeField('Última actualización', auto_now=True)
 
+    # Campos que alimentan search_vector
+    SEARCH_FIELDS = {'name', 'sku', 'short_description', 'description'}
+
     class Meta:
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
@@ -116,6 +178,10 @@ class Product(models.Model):
             models.Index(fields=['slug']),
             models.Index(fields=['sku']),
             models.Index(fields=['-created_at']),
+            # Paginación por cursor: (campo de orden, id)
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['sales_count', 'id']),
         ]
 
     def save(self, *args, **kwargs):
@@ -123,6 +189,12 @@ class Product(models.Model):
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
 
+        # Recalcular el vector solo si cambiaron campos de texto
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.SEARCH_FIELDS.intersection(update_fields):
+            from .search import update_search_vector
+            update_search_vector(Product.objects.filter(pk=self.pk))
+
     def __str__(self):
         return self.name
 
@@ -218,6 +290,38 @@ class Review(models.Model):
         verbose_name_plural = 'Reseñas'
         ordering = ['-created_at']
         unique_together = ['product', 'user']  # Un usuario solo puede hacer una reseña por producto
+        indexes = [
+            # Paginación por cursor: (campo de orden, id)
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['product', '-created_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.product.name} ({self.rating}★)"
+
+
+class ProductAssociation(models.Model):
+    """
+    Productos comprados juntos: los N vecinos con más órdenes en común por
+    producto, precalculados desde OrderItem (ver recommendations.py)
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='associations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='associated_from')
+
+    score = models.PositiveIntegerField('Órdenes en común')
+    rank = models.PositiveSmallIntegerField('Posición')
+
+    computed_at = models.DateTimeField('Calculado')
+
+    class Meta:
+        verbose_name = 'Producto relacionado'
+        verbose_name_plural = 'Productos relacionados'
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'rank']),
+        ]
 
     def __str__(self):
-        return f"{self.user.email} - {self.product.name} ({self.rating}★)"
\ No newline at end of file
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
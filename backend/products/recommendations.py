@@ -0,0 +1,144 @@
+"""
+Productos relacionados a partir del historial de compras
+
+Se cuenta, para cada par de productos, en cuántas órdenes aparecen juntos
+(matriz de co-ocurrencia dispersa como diccionario de contadores) y se
+guardan solo los TOP_N vecinos de cada producto en ProductAssociation.
+
+La actualización incremental recalcula únicamente las filas de los productos
+presentes en órdenes nuevas: como el conteo es simétrico, cualquier par que
+cambie tiene ambos productos en alguna de esas órdenes.
+
+Al servir el detalle, los relacionados salen de una consulta sobre el índice
+(product, rank); si el producto no tiene historial se completa con productos
+de la misma categoría.
+"""
+
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import Product, ProductAssociation
+from . import cache as catalog_cache
+from .utils import get_catalog_queryset
+
+# Vecinos guardados por producto (se sirven menos: los inactivos se descartan)
+TOP_N = 12
+
+# Órdenes que no cuentan como compra
+EXCLUDED_STATUSES = ('cancelled', 'refunded')
+
+# Órdenes procesadas por lote en la reconstrucción completa
+BATCH_SIZE = 2000
+
+
+def iter_baskets(order_ids=None):
+    """Conjuntos de productos por orden: (order_id, {product_id, ...})"""
+    from orders.models import OrderItem
+
+    items = OrderItem.objects.filter(product__isnull=False).exclude(
+        order__status__in=EXCLUDED_STATUSES
+    )
+    if order_ids is not None:
+        items = items.filter(order_id__in=order_ids)
+
+    current_order, basket = None, set()
+    rows = items.order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=BATCH_SIZE)
+    for order_id, product_id in rows:
+        if order_id != current_order:
+            if len(basket) > 1:
+                yield current_order, basket
+            current_order, basket = order_id, set()
+        basket.add(product_id)
+    if len(basket) > 1:
+        yield current_order, basket
+
+
+def count_cooccurrences(baskets, product_ids=None):
+    """{producto: Counter({vecino: órdenes en común})}, opcionalmente solo para product_ids"""
+    counts = defaultdict(Counter)
+    for _order_id, basket in baskets:
+        rows = basket if product_ids is None else basket & product_ids
+        for product_id in rows:
+            counts[product_id].update(basket - {product_id})
+    return counts
+
+
+def top_neighbours(counter, top_n=TOP_N):
+    # Desempate estable por ID para que recalcular dé el mismo orden
+    return sorted(counter.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+
+
+def store_associations(counts, product_ids, computed_at, top_n=TOP_N):
+    """Reemplazar las filas de product_ids con sus nuevos vecinos"""
+    rows = [
+        ProductAssociation(
+            product_id=product_id, related_id=related_id,
+            score=score, rank=rank, computed_at=computed_at,
+        )
+        for product_id in product_ids
+        for rank, (related_id, score) in enumerate(top_neighbours(counts.get(product_id, {}), top_n))
+    ]
+    with transaction.atomic():
+        ProductAssociation.objects.filter(product_id__in=product_ids).delete()
+        ProductAssociation.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+    # Los relacionados forman parte del detalle de producto (ETag)
+    catalog_cache.bump_version('storefront')
+    return len(rows)
+
+
+def rebuild_associations(top_n=TOP_N):
+    """Recalcular la tabla completa. Devuelve (productos, filas)"""
+    computed_at = timezone.now()
+    counts = count_cooccurrences(iter_baskets())
+
+    with transaction.atomic():
+        ProductAssociation.objects.all().delete()
+        stored = store_associations(counts, list(counts), computed_at, top_n)
+    return len(counts), stored
+
+
+def refresh_associations(top_n=TOP_N):
+    """
+    Procesar solo las órdenes creadas desde el último cálculo.
+    Sin cálculo previo hace la reconstrucción completa. Devuelve (productos, filas)
+    """
+    from orders.models import Order, OrderItem
+
+    last_run = ProductAssociation.objects.aggregate(last=Max('computed_at'))['last']
+    if last_run is None:
+        return rebuild_associations(top_n)
+
+    computed_at = timezone.now()
+    new_orders = Order.objects.filter(created_at__gte=last_run).values('id')
+    product_ids = set(
+        OrderItem.objects.filter(order_id__in=new_orders, product__isnull=False)
+        .values_list('product_id', flat=True)
+    )
+    if not product_ids:
+        return 0, 0
+
+    # Todas las órdenes (también antiguas) que contienen alguno de esos productos
+    order_ids = OrderItem.objects.filter(product_id__in=product_ids).values('order_id')
+    counts = count_cooccurrences(iter_baskets(order_ids), product_ids)
+    return len(product_ids), store_associations(counts, product_ids, computed_at, top_n)
+
+
+def get_related_products(product, limit=4):
+    """Comprados juntos con el producto; se completa con su categoría si faltan"""
+    related = list(
+        get_catalog_queryset(Product.objects.filter(
+            associated_from__product=product,
+            is_active=True,
+        )).order_by('associated_from__rank')[:limit]
+    )
+
+    if len(related) < limit and product.category_id:
+        related += list(
+            get_catalog_queryset(Product.objects.filter(
+                category_id=product.category_id,
+                is_active=True,
+            ).exclude(id__in=[product.id, *(p.id for p in related)]))[:limit - len(related)]
+        )
+    return related
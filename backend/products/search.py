@@ -0,0 +1,89 @@
+"""
+Motor de búsqueda de productos
+
+En PostgreSQL usa el tsvector ponderado guardado en Product.search_vector
+(índice GIN) y ordena por ts_rank. En otros motores (SQLite en desarrollo
+y tests) cae a icontains sobre los mismos campos.
+"""
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+from rest_framework import filters
+
+SEARCH_CONFIG = 'spanish'
+
+# Campos indexados y su peso (A = más relevante)
+SEARCH_WEIGHTS = [
+    ('name', 'A'),
+    ('sku', 'B'),
+    ('short_description', 'C'),
+    ('description', 'D'),
+]
+
+
+def is_full_text_enabled():
+    """La búsqueda de texto completo solo existe en PostgreSQL"""
+    return connection.vendor == 'postgresql'
+
+
+def build_search_vector():
+    """Expresión SearchVector ponderada para Product"""
+    vector = None
+    for field, weight in SEARCH_WEIGHTS:
+        part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+        vector = part if vector is None else vector + part
+    return vector
+
+
+def update_search_vector(queryset):
+    """
+    Recalcular search_vector para los productos del queryset con un solo UPDATE.
+    Devuelve la cantidad de filas actualizadas.
+    """
+    if not is_full_text_enabled():
+        return 0
+    return queryset.update(search_vector=build_search_vector())
+
+
+def search_products(queryset, query):
+    """
+    Filtrar productos por texto.
+
+    En PostgreSQL anota search_rank y ordena por relevancia; en otros
+    motores aplica icontains y conserva el orden del queryset.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    if is_full_text_enabled():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-created_at')
+
+    condition = Q()
+    for field, _weight in SEARCH_WEIGHTS:
+        condition |= Q(**{f'{field}__icontains': query})
+    return queryset.filter(condition)
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """SearchFilter de DRF respaldado por el motor de texto completo"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_products(queryset, ' '.join(terms))
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """Ordena por relevancia cuando hay búsqueda y el cliente no pidió otro orden"""
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if not params and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', '-created_at']
+        return super().get_ordering(request, queryset, view)
@@ -1,5 +1,9 @@
 from rest_framework import serializers
+from django.db.models import Avg
 from .models import Category, Brand, Product, ProductImage, ProductVariant, Review
+from .utils import build_image_url
+from .tree import get_category_tree, serialize_category_node
+from .recommendations import get_related_products
 
 
 # Serializers ligeros para autocomplete
@@ -18,23 +22,49 @@ class BrandAutocompleteSerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     subcategories = serializers.SerializerMethodField()
     product_count = serializers.SerializerMethodField()
+    subtree_product_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
         fields = [
             'id', 'name', 'slug', 'description', 'image',
             'parent', 'subcategories', 'is_active', 'order',
-            'product_count'
+            'product_count', 'subtree_product_count'
         ]
 
+    def get_tree_node(self, obj):
+        """Nodo del árbol cacheado (se lee una sola vez por serialización)"""
+        if 'category_tree' not in self.context:
+            self.context['category_tree'] = get_category_tree()
+        return self.context['category_tree']['nodes'].get(obj.id)
+
     def get_subcategories(self, obj):
-        if obj.subcategories.exists():
-            return CategorySerializer(obj.subcategories.filter(is_active=True), many=True).data
-        return []
+        node = self.get_tree_node(obj)
+        if not node:
+            return []
+        tree = self.context['category_tree']
+        request = self.context.get('request')
+        return [serialize_category_node(tree, child_id, request) for child_id in node['children']]
 
     def get_product_count(self, obj):
+        node = self.get_tree_node(obj)
+        if node:
+            return node['product_count']
         return obj.products.filter(is_active=True).count()
 
+    def get_subtree_product_count(self, obj):
+        node = self.get_tree_node(obj)
+        if node:
+            return node['subtree_product_count']
+        return Product.objects.filter(
+            category__path__startswith=obj.path, is_active=True
+        ).count() if obj.path else 0
+
+    def validate_parent(self, value):
+        if value and self.instance and self.instance.path and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError('Una categoría no puede moverse dentro de sí misma')
+        return value
+
 
 class BrandSerializer(serializers.ModelSerializer):
     product_count = serializers.SerializerMethodField()
@@ -72,6 +102,21 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'is_verified_purchase', 'created_at']
 
 
+def get_average_rating(obj):
+    """Rating promedio de reseñas aprobadas (usa anotación si existe)"""
+    if hasattr(obj, 'rating_avg'):
+        return round(obj.rating_avg, 1) if obj.rating_avg is not None else 0
+    average = obj.reviews.filter(is_approved=True).aggregate(value=Avg('rating'))['value']
+    return round(average, 1) if average is not None else 0
+
+
+def get_review_count(obj):
+    """Cantidad de reseñas aprobadas (usa anotación si existe)"""
+    if hasattr(obj, 'rating_count'):
+        return obj.rating_count or 0
+    return obj.reviews.filter(is_approved=True).count()
+
+
 class ProductListSerializer(serializers.ModelSerializer):
     """Serializer ligero para listados"""
     category_name = serializers.CharField(source='category.name', read_only=True)
@@ -91,21 +136,21 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
 
     def get_primary_image(self, obj):
+        request = self.context.get('request')
+        # Usar la anotación de get_catalog_queryset si está disponible
+        if hasattr(obj, 'primary_image_path'):
+            return build_image_url(request, obj.primary_image_path)
+
         primary = obj.images.filter(is_primary=True).first()
         if primary:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(primary.image.url)
+            return build_image_url(request, primary.image.name)
         return None
 
     def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return 0
+        return get_average_rating(obj)
 
     def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        return get_review_count(obj)
 
 
 class ProductDetailSerializer(serializers.ModelSerializer):
@@ -133,20 +178,14 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         ]
 
     def get_average_rating(self, obj):
-        reviews = obj.reviews.filter(is_approved=True)
-        if reviews.exists():
-            return round(sum(r.rating for r in reviews) / reviews.count(), 1)
-        return 0
+        return get_average_rating(obj)
 
     def get_review_count(self, obj):
-        return obj.reviews.filter(is_approved=True).count()
+        return get_review_count(obj)
 
     def get_related_products(self, obj):
-        # Productos de la misma categoría (máximo 4)
-        related = Product.objects.filter(
-            category=obj.category,
-            is_active=True
-        ).exclude(id=obj.id)[:4]
+        # Comprados juntos (precalculado), completando con la misma categoría (máximo 4)
+        related = get_related_products(obj, limit=4)
 
         return ProductListSerializer(
             related,
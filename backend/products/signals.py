@@ -0,0 +1,113 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Category, Brand, Product, ProductImage, ProductVariant, Review
+from .tree import invalidate_category_tree
+from .autocomplete import bump_version
+from . import cache as catalog_cache
+
+# Campos que afectan al índice de autocomplete
+AUTOCOMPLETE_FIELDS = {'name', 'slug', 'is_active', 'image', 'logo', 'sales_count'}
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_category_tree_cache(sender, instance, **kwargs):
+    """
+    Invalidar el árbol de categorías cacheado (estructura y conteos de productos)
+    """
+    invalidate_category_tree()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def invalidate_autocomplete_index(sender, instance, **kwargs):
+    """
+    Marcar como desactualizados los índices de autocomplete en memoria
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not AUTOCOMPLETE_FIELDS.intersection(update_fields):
+        return
+    # Las imágenes cambian la miniatura del producto
+    kind = 'product' if sender is ProductImage else sender._meta.model_name
+    bump_version(kind)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def bump_catalog_version(sender, instance, **kwargs):
+    """
+    Invalidar las entradas versionadas del catálogo (facetas, respuestas cacheadas)
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'views'}:
+        return
+    catalog_cache.bump_version()
+
+
+@receiver(post_init, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    """
+    Guardar la categoría cargada para invalidar también la anterior si cambia
+    (se lee de __dict__ para no disparar una consulta si el campo está diferido)
+    """
+    instance._loaded_category_id = instance.__dict__.get('category_id')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=ProductVariant)
+@receiver(post_delete, sender=ProductVariant)
+def bump_storefront_versions(sender, instance, **kwargs):
+    """
+    Invalidar respuestas cacheadas de destacados, ofertas y las páginas de
+    la categoría del producto (y sus ancestros, por include_descendants)
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'views'}:
+        return
+
+    if sender is Product:
+        categories = Category.objects.filter(
+            id__in={instance.category_id, getattr(instance, '_loaded_category_id', None)} - {None}
+        )
+    else:
+        categories = Category.objects.filter(products=instance.product_id)
+
+    # La ruta materializada ("/1/5/") ya contiene los IDs de los ancestros
+    paths = categories.values_list('path', flat=True)
+    catalog_cache.bump_versions(['storefront', *catalog_cache.category_scopes(paths)])
+
+    if sender is Product:
+        instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Brand)
+@receiver(post_delete, sender=Brand)
+def bump_taxonomy_version(sender, instance, **kwargs):
+    """
+    Los nombres de categoría y marca aparecen en todas las respuestas de
+    productos, y la estructura del árbol define los subárboles
+    """
+    catalog_cache.bump_version('taxonomy')
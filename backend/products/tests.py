@@ -1,3 +1,572 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from .models import Category, Brand, Product, ProductAssociation, ProductImage, Review
+from . import counters
 
-# Create your tests here.
+User = get_user_model()
+
+
+class CatalogQueryCountTests(APITestCase):
+    """El listado de productos debe costar las mismas consultas sin importar el tamaño de página"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Laptops')
+        self.brand = Brand.objects.create(name='Lenovo')
+        self.reviewer = User.objects.create_user(
+            username='reviewer', email='reviewer@example.com', password='secret123'
+        )
+
+    def create_products(self, count, offset=0):
+        for index in range(offset, offset + count):
+            product = Product.objects.create(
+                name=f'Producto {index}',
+                sku=f'SKU-{index}',
+                description='Descripción',
+                category=self.category,
+                brand=self.brand,
+                price=100 + index,
+            )
+            ProductImage.objects.create(product=product, image=f'products/{index}.jpg', is_primary=True)
+            Review.objects.create(product=product, user=self.reviewer, rating=4, comment='Bueno')
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_list_query_count_is_constant(self):
+        self.create_products(2)
+        small_count, _ = self.count_queries('/api/products/')
+
+        self.create_products(15, offset=2)
+        large_count, response = self.count_queries('/api/products/')
+
+        self.assertEqual(small_count, large_count)
+        first = response.data['results'][0]
+        self.assertEqual(first['average_rating'], 4.0)
+        self.assertEqual(first['review_count'], 1)
+        self.assertEqual(first['category_name'], 'Laptops')
+        self.assertTrue(first['primary_image'].endswith('.jpg'))
+
+    def test_featured_query_count_is_constant(self):
+        self.create_products(1)
+        Product.objects.update(is_featured=True)
+        small_count, _ = self.count_queries('/api/products/featured/')
+
+        self.create_products(6, offset=1)
+        Product.objects.update(is_featured=True)
+        large_count, response = self.count_queries('/api/products/featured/')
+
+        self.assertEqual(small_count, large_count)
+        self.assertEqual(len(response.data), 7)
+
+
+class ProductSearchTests(APITestCase):
+    """Búsqueda de productos (texto completo en PostgreSQL, icontains en SQLite)"""
+
+    def setUp(self):
+        self.laptops = Category.objects.create(name='Laptops')
+        self.phones = Category.objects.create(name='Celulares')
+        Product.objects.create(
+            name='Laptop Gamer', sku='LAP-001', description='Portátil para juegos',
+            category=self.laptops, price=3500,
+        )
+        Product.objects.create(
+            name='Laptop Oficina', sku='LAP-002', description='Portátil ligera',
+            category=self.laptops, price=1800,
+        )
+        Product.objects.create(
+            name='Smartphone', sku='CEL-001', description='Teléfono con cámara',
+            short_description='Incluye laptop stand', category=self.phones, price=1200,
+        )
+
+    def test_search_matches_text_fields(self):
+        response = self.client.get('/api/products/search/', {'q': 'laptop'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 3)
+
+    def test_search_keeps_price_and_category_filters(self):
+        response = self.client.get('/api/products/search/', {
+            'q': 'laptop', 'category': self.laptops.id, 'max_price': 2000
+        })
+        self.assertEqual([p['sku'] for p in response.data['results']], ['LAP-002'])
+
+    def test_list_search_param(self):
+        response = self.client.get('/api/products/', {'search': 'CEL-001'})
+        self.assertEqual([p['sku'] for p in response.data['results']], ['CEL-001'])
+
+
+class ProductViewCounterTests(APITestCase):
+    """Las vistas se acumulan en caché y se escriben en lote"""
+
+    def setUp(self):
+        cache.clear()
+        # Tomar el candado de flush para que los requests no escriban
+        cache.add(counters.FLUSH_LOCK_KEY, 1, timeout=None)
+        self.product = Product.objects.create(
+            name='Mouse', sku='MOU-001', description='Mouse inalámbrico', price=50
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_retrieve_does_not_write_views(self):
+        for _ in range(3):
+            self.client.get(f'/api/products/{self.product.slug}/')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views, 0)
+        self.assertEqual(counters.get_pending_views(self.product.id), 3)
+
+    def test_flush_applies_pending_views(self):
+        for _ in range(3):
+            self.client.get(f'/api/products/{self.product.id}/')
+
+        self.assertEqual(counters.flush_views(), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views, 3)
+        self.assertEqual(counters.get_pending_views(self.product.id), 0)
+        self.assertEqual(counters.flush_views(), 0)
+
+    def test_flush_reads_only_viewed_products(self):
+        others = [
+            Product.objects.create(name=f'Cable {index}', sku=f'CAB-{index}', description='d', price=5)
+            for index in range(20)
+        ]
+        counters.record_view(self.product.id)
+        counters.record_view(others[0].id)
+
+        with patch.object(cache, 'get_many', wraps=cache.get_many) as get_many:
+            # Un solo UPDATE (mismo incremento) en su savepoint, sin listar el catálogo
+            with self.assertNumQueries(3):
+                self.assertEqual(counters.flush_views(), 2)
+        pending_keys = [key for call in get_many.call_args_list for key in call.args[0]
+                        if key.startswith('product_views:pending')]
+        self.assertEqual(len(pending_keys), 2)
+
+        # Las vistas que llegan después se vuelven a anotar
+        counters.record_view(others[0].id)
+        self.assertEqual(counters.flush_views(), 1)
+        others[0].refresh_from_db()
+        self.assertEqual(others[0].views, 2)
+
+    def test_sweep_applies_views_missing_from_the_queue(self):
+        cache.set(counters.PENDING_KEY.format(self.product.id), 4, timeout=None)
+        self.assertEqual(counters.flush_views(), 0)
+        self.assertEqual(counters.flush_views(sweep=True), 4)
+
+    def test_flush_stops_at_a_slot_not_yet_written(self):
+        others = [
+            Product.objects.create(name=f'Cable {index}', sku=f'CAB-{index}', description='d', price=5)
+            for index in range(2)
+        ]
+        counters.record_view(self.product.id)                 # posición 1
+        reserved = counters.incr_key(counters.DIRTY_SEQ_KEY)  # posición 2: tomada, aún sin escribir
+        counters.record_view(others[0].id)                    # posición 3
+
+        self.assertEqual(counters.flush_views(), 2)
+        self.assertEqual(cache.get(counters.FLUSHED_SEQ_KEY), 1)
+
+        # El set atrasado llega: el siguiente flush lo encuentra
+        cache.set(counters.PENDING_KEY.format(others[1].id), 2, timeout=None)
+        cache.set(counters.DIRTY_SLOT_KEY.format(reserved), others[1].id, timeout=None)
+        self.assertEqual(counters.flush_views(), 2)
+        self.assertEqual(cache.get(counters.FLUSHED_SEQ_KEY), 3)
+
+    def test_sweep_skips_slots_never_written(self):
+        counters.incr_key(counters.DIRTY_SEQ_KEY)
+        counters.record_view(self.product.id)
+        self.assertEqual(counters.flush_views(), 1)
+        self.assertEqual(cache.get(counters.FLUSHED_SEQ_KEY) or 0, 0)
+        self.assertEqual(counters.flush_views(sweep=True), 0)
+        self.assertEqual(cache.get(counters.FLUSHED_SEQ_KEY), 2)
+
+    @override_settings(PRODUCT_VIEWS_FLUSH_ASYNC=False)
+    def test_request_only_schedules_the_flush(self):
+        cache.delete(counters.FLUSH_LOCK_KEY)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.get(f'/api/products/{self.product.slug}/')
+            self.product.refresh_from_db()
+            self.assertEqual(self.product.views, 0)
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views, 1)
+
+    def test_trending_orders_by_view_rate(self):
+        other = Product.objects.create(name='Teclado', sku='TEC-001', description='Teclado', price=80)
+        for _ in range(2):
+            counters.record_view(self.product.id)
+        for _ in range(5):
+            counters.record_view(other.id)
+        counters.flush_views()
+
+        response = self.client.get('/api/products/trending/')
+        self.assertEqual([p['id'] for p in response.data], [other.id, self.product.id])
+        self.assertGreater(response.data[0]['views_per_hour'], response.data[1]['views_per_hour'])
+
+
+class CategoryTreeTests(APITestCase):
+    """Árbol de categorías con ruta materializada y conteos cacheados"""
+
+    def setUp(self):
+        cache.clear()
+        self.root = Category.objects.create(name='Tecnología')
+        self.computers = Category.objects.create(name='Computadoras', parent=self.root)
+        self.laptops = Category.objects.create(name='Laptops', parent=self.computers)
+        self.phones = Category.objects.create(name='Celulares', parent=self.root)
+        for index, category in enumerate([self.root, self.laptops, self.laptops, self.phones]):
+            Product.objects.create(
+                name=f'Producto {index}', sku=f'TREE-{index}', description='Descripción',
+                category=category, price=100,
+            )
+
+    def test_paths_are_materialized(self):
+        self.laptops.refresh_from_db()
+        self.assertEqual(self.laptops.path, f'/{self.root.id}/{self.computers.id}/{self.laptops.id}/')
+        self.assertEqual(self.laptops.depth, 2)
+
+    def test_moving_a_category_moves_its_subtree(self):
+        self.computers.parent = self.phones
+        self.computers.save()
+
+        self.laptops.refresh_from_db()
+        self.assertEqual(
+            self.laptops.path,
+            f'/{self.root.id}/{self.phones.id}/{self.computers.id}/{self.laptops.id}/'
+        )
+        self.assertEqual(self.laptops.depth, 3)
+
+    def test_moving_under_a_descendant_is_a_form_error(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='secret123')
+        self.client.force_login(admin)
+        response = self.client.post(f'/admin/products/category/{self.computers.id}/change/', {
+            'name': self.computers.name, 'slug': self.computers.slug, 'description': '',
+            'parent': self.laptops.id, 'is_active': 'on', 'order': 0,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('parent', response.context['adminform'].form.errors)
+        self.computers.refresh_from_db()
+        self.assertEqual(self.computers.parent_id, self.root.id)
+
+    def test_tree_counts_and_constant_queries(self):
+        response = self.client.get('/api/categories/tree/')
+        root = response.data[0]
+        self.assertEqual(root['product_count'], 1)
+        self.assertEqual(root['subtree_product_count'], 4)
+        computers = next(c for c in root['subcategories'] if c['id'] == self.computers.id)
+        self.assertEqual(computers['subtree_product_count'], 2)
+
+        # Con el árbol en caché el listado no consulta por categoría
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/categories/')
+        self.assertEqual(response.data['count'], 4)
+
+    def test_cache_is_invalidated_on_product_change(self):
+        self.client.get('/api/categories/tree/')
+        Product.objects.create(
+            name='Nuevo', sku='TREE-NEW', description='Descripción', category=self.phones, price=10
+        )
+        response = self.client.get('/api/categories/tree/')
+        self.assertEqual(response.data[0]['subtree_product_count'], 5)
+
+    def test_products_include_descendants(self):
+        url = f'/api/categories/{self.computers.slug}/products/'
+        self.assertEqual(len(self.client.get(url).data), 0)
+        self.assertEqual(len(self.client.get(url, {'include_descendants': 'true'}).data), 2)
+
+
+class AutocompleteTests(APITestCase):
+    """Autocomplete con índice de prefijos en memoria"""
+
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(name='Cámara Réflex Canon', sku='CAM-001', description='Cámara', price=2500, sales_count=3)
+        Product.objects.create(name='Cable HDMI', sku='CAB-001', description='Cable', price=30, sales_count=10)
+        Product.objects.create(name='Funda para cámara', sku='FUN-001', description='Funda', price=40)
+        Category.objects.create(name='Electrónica')
+        Brand.objects.create(name='Sony')
+
+    def test_product_prefix_is_accent_insensitive(self):
+        response = self.client.get('/api/products/autocomplete/', {'q': 'cama'})
+        names = [item['name'] for item in response.data]
+        # Coincidencia al inicio del nombre primero
+        self.assertEqual(names, ['Cámara Réflex Canon', 'Funda para cámara'])
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'slug', 'thumbnail'})
+
+    def test_ranking_uses_sales_for_ties(self):
+        response = self.client.get('/api/products/autocomplete/', {'q': 'ca'})
+        self.assertEqual(response.data[0]['name'], 'Cable HDMI')
+
+    def test_index_is_rebuilt_after_changes(self):
+        self.client.get('/api/products/autocomplete/', {'q': 'mouse'})
+        Product.objects.create(name='Mouse Óptico', sku='MOU-002', description='Mouse', price=25)
+        response = self.client.get('/api/products/autocomplete/', {'q': 'optico'})
+        self.assertEqual([item['name'] for item in response.data], ['Mouse Óptico'])
+
+    def test_category_and_brand_autocomplete(self):
+        response = self.client.get('/api/categories/autocomplete/', {'search': 'electro'})
+        self.assertEqual([item['name'] for item in response.data], ['Electrónica'])
+        response = self.client.get('/api/brands/autocomplete/', {'search': 'so'})
+        self.assertEqual([item['name'] for item in response.data], ['Sony'])
+
+
+class FacetTests(APITestCase):
+    """Facetas calculadas sobre el queryset filtrado y cacheadas"""
+
+    def setUp(self):
+        cache.clear()
+        self.laptops = Category.objects.create(name='Laptops')
+        self.phones = Category.objects.create(name='Celulares')
+        self.lenovo = Brand.objects.create(name='Lenovo')
+        Product.objects.create(name='Laptop A', sku='F-1', description='d', category=self.laptops,
+                               brand=self.lenovo, price=1800, stock=5)
+        Product.objects.create(name='Laptop B', sku='F-2', description='d', category=self.laptops,
+                               price=3000, compare_price=3500, stock=0)
+        Product.objects.create(name='Celular', sku='F-3', description='d', category=self.phones,
+                               brand=self.lenovo, price=40, stock=2)
+
+    def test_list_facets(self):
+        response = self.client.get('/api/products/', {'facets': 'true'})
+        facets = response.data['facets']
+        self.assertEqual(
+            {(c['name'], c['count']) for c in facets['categories']},
+            {('Laptops', 2), ('Celulares', 1)}
+        )
+        self.assertEqual(facets['brands'], [
+            {'id': self.lenovo.id, 'name': 'Lenovo', 'slug': 'lenovo', 'count': 2}
+        ])
+        self.assertEqual(facets['availability'], {'in_stock': 2, 'out_of_stock': 1})
+        self.assertEqual(facets['on_sale'], 1)
+        counts = {r['min']: r['count'] for r in facets['price_ranges']}
+        self.assertEqual((counts[0.0], counts[1000.0], counts[2500.0]), (1, 1, 1))
+
+    def test_facets_follow_filters_and_are_cached(self):
+        params = {'q': 'laptop', 'facets': 'true'}
+        response = self.client.get('/api/products/search/', params)
+        self.assertEqual(response.data['facets']['availability'], {'in_stock': 1, 'out_of_stock': 1})
+
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/search/', params)
+
+    def test_facets_are_invalidated_on_product_change(self):
+        self.client.get('/api/products/', {'facets': 'true'})
+        Product.objects.create(name='Tablet', sku='F-4', description='d', price=900, stock=1)
+        response = self.client.get('/api/products/', {'facets': 'true'})
+        self.assertEqual(response.data['facets']['availability']['in_stock'], 3)
+
+    def test_facets_are_optional(self):
+        response = self.client.get('/api/products/')
+        self.assertNotIn('facets', response.data)
+
+
+class StorefrontCacheTests(APITestCase):
+    """Destacados, ofertas y productos por categoría servidos desde caché"""
+
+    def setUp(self):
+        cache.clear()
+        self.parent = Category.objects.create(name='Computo')
+        self.laptops = Category.objects.create(name='Laptops', parent=self.parent)
+        self.phones = Category.objects.create(name='Celulares')
+        self.laptop = Product.objects.create(name='Laptop', sku='S-1', description='d', category=self.laptops,
+                                             price=100, compare_price=150, is_featured=True)
+        self.phone = Product.objects.create(name='Celular', sku='S-2', description='d', category=self.phones,
+                                            price=50)
+
+    def test_hits_do_not_touch_database(self):
+        for url in ('/api/products/featured/', '/api/products/on_sale/',
+                    f'/api/categories/{self.laptops.slug}/products/'):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(first.data, second.data)
+
+        from .cache import get_cache_stats
+        stats = get_cache_stats()
+        self.assertEqual(stats['featured'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_product_change_invalidates_its_category_and_ancestors(self):
+        url = f'/api/categories/{self.parent.slug}/products/'
+        params = {'include_descendants': 'true'}
+        self.client.get(url, params)
+        self.client.get(f'/api/categories/{self.phones.slug}/products/')
+
+        self.laptop.name = 'Laptop Pro'
+        self.laptop.save()
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.data[0]['name'], 'Laptop Pro')
+        with self.assertNumQueries(0):
+            self.client.get(f'/api/categories/{self.phones.slug}/products/')
+
+    def test_moving_product_invalidates_old_category(self):
+        url = f'/api/categories/{self.laptops.slug}/products/'
+        self.assertEqual(len(self.client.get(url).data), 1)
+
+        product = Product.objects.get(pk=self.laptop.pk)
+        product.category = self.phones
+        product.save()
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+    def test_review_and_featured_changes_invalidate(self):
+        self.client.get('/api/products/featured/')
+        self.phone.is_featured = True
+        self.phone.save()
+        self.assertEqual(len(self.client.get('/api/products/featured/').data), 2)
+
+        user = User.objects.create_user(username='cliente', email='c@example.com', password='secret123')
+        Review.objects.create(product=self.laptop, user=user, rating=4, comment='ok')
+        response = self.client.get(f'/api/categories/{self.laptops.slug}/products/')
+        self.assertEqual(response.data[0]['review_count'], 1)
+
+    def test_sale_only_invalidates_listings_with_the_product(self):
+        from .cache import invalidate_products
+        laptops_url = f'/api/categories/{self.laptops.slug}/products/'
+        phones_url = f'/api/categories/{self.phones.slug}/products/'
+        self.client.get(laptops_url)
+        self.client.get(phones_url)
+        phone_url = f'/api/products/{self.phone.id}/'
+        etag = self.client.get(phone_url)['ETag']
+        laptop_etag = self.client.get(f'/api/products/{self.laptop.id}/')['ETag']
+
+        # El checkout descuenta con UPDATE (sin signals) e invalida solo lo vendido
+        Product.objects.filter(pk=self.laptop.pk).update(stock=4)
+        invalidate_products([self.laptop.id])
+
+        with self.assertNumQueries(0):
+            self.client.get(phones_url)
+        self.assertEqual(self.client.get(phone_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(laptops_url).data[0]['stock'], 4)
+        response = self.client.get(f'/api/products/{self.laptop.id}/', HTTP_IF_NONE_MATCH=laptop_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unknown_category(self):
+        response = self.client.get('/api/categories/no-existe/products/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_active_category_under_inactive_parent_still_resolves(self):
+        self.parent.is_active = False
+        self.parent.save()
+
+        response = self.client.get(f'/api/categories/{self.laptops.slug}/products/')
+        self.assertEqual([p['id'] for p in response.data], [self.laptop.id])
+        response = self.client.get(f'/api/categories/{self.parent.slug}/products/')
+        self.assertEqual(response.status_code, 404)
+
+
+class RelatedProductsTests(APITestCase):
+    """Productos comprados juntos precalculados desde las órdenes"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Computo')
+        self.products = [
+            Product.objects.create(name=f'Producto {index}', sku=f'R-{index}', description='d',
+                                   category=self.category, price=10)
+            for index in range(6)
+        ]
+
+    def create_order(self, *products, status='pending'):
+        from orders.models import Order, OrderItem
+        order = Order.objects.create(
+            email='cliente@example.com', phone='999', shipping_address='Av. 1',
+            shipping_city='Lima', shipping_department='Lima', subtotal=10, total=10,
+            payment_method='yape', status=status,
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=10)
+        return order
+
+    def related_names(self, product):
+        response = self.client.get(f'/api/products/{product.id}/')
+        return [item['name'] for item in response.data['related_products']]
+
+    def test_rebuild_ranks_by_shared_orders(self):
+        from .recommendations import rebuild_associations
+        p = self.products
+        self.create_order(p[0], p[1], p[2])
+        self.create_order(p[0], p[2])
+        self.create_order(p[0], p[3], status='cancelled')
+
+        rebuild_associations()
+        self.assertEqual(
+            list(ProductAssociation.objects.filter(product=p[0]).values_list('related_id', 'score')),
+            [(p[2].id, 2), (p[1].id, 1)]
+        )
+        # Dos de historial y el resto de la categoría
+        self.assertEqual(self.related_names(p[0])[:2], ['Producto 2', 'Producto 1'])
+        self.assertEqual(len(self.related_names(p[0])), 4)
+
+    def test_incremental_refresh_matches_full_rebuild(self):
+        from .recommendations import rebuild_associations, refresh_associations
+        p = self.products
+        self.create_order(p[0], p[1])
+        refresh_associations()
+
+        self.create_order(p[1], p[4])
+        self.create_order(p[1], p[4], p[5])
+        refresh_associations()
+        incremental = set(ProductAssociation.objects.values_list('product_id', 'related_id', 'score', 'rank'))
+
+        rebuild_associations()
+        full = set(ProductAssociation.objects.values_list('product_id', 'related_id', 'score', 'rank'))
+        self.assertEqual(incremental, full)
+        self.assertEqual(self.related_names(p[1])[0], 'Producto 4')
+
+    def test_cold_product_falls_back_to_category(self):
+        names = self.related_names(self.products[5])
+        self.assertEqual(len(names), 4)
+        self.assertNotIn('Producto 5', names)
+
+
+class ConditionalGetTests(APITestCase):
+    """ETag en el detalle de producto y categoría"""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Laptops')
+        self.product = Product.objects.create(name='Laptop', sku='E-1', description='d',
+                                              category=self.category, price=100)
+
+    def test_product_not_modified_skips_detail_queries(self):
+        url = f'/api/products/{self.product.slug}/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # La vista se cuenta igual
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.views + counters.get_pending_views(self.product.id), 2)
+
+    def test_product_etag_changes_with_dependent_rows(self):
+        url = f'/api/products/{self.product.id}/'
+        etag = self.client.get(url)['ETag']
+
+        ProductImage.objects.create(product=self.product, image='products/a.jpg', is_primary=True)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_category_etag(self):
+        url = f'/api/categories/{self.category.slug}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Product.objects.create(name='Laptop 2', sku='E-2', description='d', category=self.category, price=1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['product_count'], 2)
+
+    def test_missing_product_is_404(self):
+        self.assertEqual(self.client.get('/api/products/no-existe/').status_code, 404)
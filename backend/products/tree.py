@@ -0,0 +1,122 @@
+"""
+Árbol de categorías cacheado
+
+El árbol activo completo se arma con una consulta de categorías y una de
+conteos de productos agrupados, y se guarda en caché hasta que cambie una
+categoría o un producto (ver signals.py). Cada nodo trae el conteo de
+productos directos y el del subárbol.
+"""
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db.models import Count
+from .models import Category, Product
+
+CATEGORY_TREE_KEY = 'category_tree'
+CATEGORY_TREE_TIMEOUT = 60 * 60
+
+
+def get_category_tree():
+    """Árbol de categorías activas: {'nodes': {id: nodo}, 'roots': [ids]}"""
+    tree = cache.get(CATEGORY_TREE_KEY)
+    if tree is None:
+        tree = build_category_tree()
+        cache.set(CATEGORY_TREE_KEY, tree, CATEGORY_TREE_TIMEOUT)
+    return tree
+
+
+def invalidate_category_tree():
+    cache.delete(CATEGORY_TREE_KEY)
+
+
+def build_category_tree():
+    categories = Category.objects.filter(is_active=True).order_by('depth', 'order', 'name').values(
+        'id', 'name', 'slug', 'description', 'image', 'parent_id', 'is_active', 'order', 'path', 'depth'
+    )
+    direct_counts = dict(
+        Product.objects.filter(is_active=True, category__isnull=False)
+        .order_by()
+        .values_list('category_id')
+        .annotate(count=Count('id'))
+    )
+
+    nodes = {}
+    roots = []
+    # Ordenadas por profundidad: el padre siempre se procesa antes que sus hijos
+    for category in categories:
+        parent_id = category['parent_id']
+        if parent_id is not None and parent_id not in nodes:
+            # Padre inactivo: la rama queda fuera del árbol activo
+            continue
+
+        nodes[category['id']] = {
+            **category,
+            'product_count': direct_counts.get(category['id'], 0),
+            'subtree_product_count': 0,
+            'children': [],
+        }
+        if parent_id is None:
+            roots.append(category['id'])
+        else:
+            nodes[parent_id]['children'].append(category['id'])
+
+    for node in sorted(nodes.values(), key=lambda n: n['depth'], reverse=True):
+        node['subtree_product_count'] = node['product_count'] + sum(
+            nodes[child_id]['subtree_product_count'] for child_id in node['children']
+        )
+
+    return {'nodes': nodes, 'roots': roots}
+
+
+def get_descendant_ids(category_id, include_self=True, tree=None):
+    """IDs del subárbol activo de una categoría"""
+    tree = tree or get_category_tree()
+    if category_id not in tree['nodes']:
+        return [category_id] if include_self else []
+
+    ids = []
+    pending = [category_id]
+    while pending:
+        current = pending.pop()
+        ids.append(current)
+        pending.extend(tree['nodes'][current]['children'])
+    return ids if include_self else ids[1:]
+
+
+def find_category_id(slug, tree=None):
+    """
+    ID de una categoría activa por slug. Se busca primero en el árbol (sin
+    consultar la base de datos); una categoría activa bajo un padre inactivo
+    queda fuera del árbol pero se sigue resolviendo, como con get_object()
+    """
+    tree = tree or get_category_tree()
+    for node in tree['nodes'].values():
+        if node['slug'] == slug:
+            return node['id']
+    return Category.objects.filter(slug=slug, is_active=True).values_list('id', flat=True).first()
+
+
+def serialize_category_node(tree, category_id, request=None):
+    """Representación de un nodo con la misma forma que CategorySerializer"""
+    node = tree['nodes'][category_id]
+    image = None
+    if node['image']:
+        image = default_storage.url(node['image'])
+        if request:
+            image = request.build_absolute_uri(image)
+
+    return {
+        'id': node['id'],
+        'name': node['name'],
+        'slug': node['slug'],
+        'description': node['description'],
+        'image': image,
+        'parent': node['parent_id'],
+        'subcategories': [
+            serialize_category_node(tree, child_id, request) for child_id in node['children']
+        ],
+        'is_active': node['is_active'],
+        'order': node['order'],
+        'product_count': node['product_count'],
+        'subtree_product_count': node['subtree_product_count'],
+    }
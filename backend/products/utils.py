@@ -0,0 +1,55 @@
+from django.core.files.storage import default_storage
+from django.db.models import Avg, Count, IntegerField, OuterRef, Prefetch, Subquery, FloatField
+from .models import Product, ProductImage, Review
+
+
+def get_catalog_queryset(queryset=None, detail=False):
+    """
+    Queryset compartido del catálogo.
+
+    Anota rating promedio, cantidad de reseñas aprobadas y la ruta de la
+    imagen principal con subconsultas correlacionadas, y trae categoría y
+    marca en el mismo SELECT. Así los serializers de listado no disparan
+    consultas por fila. Con detail=True además precarga imágenes, variantes
+    y reseñas para ProductDetailSerializer.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+
+    approved_reviews = Review.objects.filter(
+        product=OuterRef('pk'),
+        is_approved=True
+    ).order_by().values('product')
+
+    primary_image = ProductImage.objects.filter(
+        product=OuterRef('pk'),
+        is_primary=True
+    ).order_by('order', 'id').values('image')[:1]
+
+    queryset = queryset.select_related('category', 'brand').defer('search_vector').annotate(
+        rating_avg=Subquery(
+            approved_reviews.annotate(value=Avg('rating')).values('value'),
+            output_field=FloatField()
+        ),
+        rating_count=Subquery(
+            approved_reviews.annotate(value=Count('id')).values('value'),
+            output_field=IntegerField()
+        ),
+        primary_image_path=Subquery(primary_image),
+    )
+
+    if detail:
+        queryset = queryset.prefetch_related(
+            'images',
+            'variants',
+            Prefetch('reviews', queryset=Review.objects.select_related('user')),
+        )
+
+    return queryset
+
+
+def build_image_url(request, path):
+    """Construir URL absoluta de una imagen a partir de su ruta en storage"""
+    if not path or not request:
+        return None
+    return request.build_absolute_uri(default_storage.url(path))
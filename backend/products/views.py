@@ -4,13 +4,31 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.exceptions import NotFound
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Avg
+from django.db.models import Avg
 from .models import Category, Brand, Product, ProductImage, Review
 from .serializers import (
     CategorySerializer, BrandSerializer,
     ProductListSerializer, ProductDetailSerializer,
     ProductWriteSerializer, ReviewSerializer
 )
+from .utils import get_catalog_queryset
+from .search import search_products, ProductSearchFilter, ProductOrderingFilter
+from .counters import record_view, get_view_rates, get_trending_ids
+from .tree import get_category_tree, get_descendant_ids, serialize_category_node, find_category_id
+from .autocomplete import autocomplete
+from .facets import wants_facets, get_facets
+from .cache import cached_response, get_versions
+from core.conditional import make_etag, check_not_modified, set_validators
+
+
+def get_autocomplete_params(request, default_limit):
+    """Término (?search= o ?q=) y límite (máximo 20) para endpoints de autocomplete"""
+    query = request.query_params.get('search') or request.query_params.get('q', '')
+    try:
+        limit = min(int(request.query_params.get('limit', default_limit)), 20)
+    except ValueError:
+        limit = default_limit
+    return query, limit
 
 
 class IsAdminOrReadOnly(IsAuthenticatedOrReadOnly):
@@ -29,8 +47,10 @@ class CategoryViewSet(viewsets.ModelViewSet):
     """
     API endpoint para categorías
     GET /api/categories/ - Lista todas las categorías (paginado)
-    GET /api/categories/{id}/ - Detalle de una categoría
+    GET /api/categories/{id}/ - Detalle de una categoría (con ETag)
     GET /api/categories/autocomplete/?search=term - Para autocomplete (sin paginar)
+    GET /api/categories/tree/ - Árbol completo de categorías activas (cacheado)
+    GET /api/categories/{slug}/products/?include_descendants=true - Productos del subárbol (cacheado)
     POST /api/categories/ - Crear categoría (solo admin)
     PUT/PATCH /api/categories/{id}/ - Actualizar categoría (solo admin)
     DELETE /api/categories/{id}/ - Eliminar categoría (solo admin)
@@ -44,39 +64,68 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'order']
     ordering = ['order', 'name']
 
-    @action(detail=False, methods=['get'])
-    def autocomplete(self, request):
-        """Endpoint para autocomplete sin paginación"""
-        search = request.query_params.get('search', '')
-        queryset = self.get_queryset()
+    def retrieve(self, request, *args, **kwargs):
+        """Detalle con ETag: responde 304 si no cambió la categoría ni sus conteos"""
+        row = self.get_queryset().filter(slug=kwargs.get('slug')).values_list('id', 'updated_at').first()
+        if row is None:
+            return super().retrieve(request, *args, **kwargs)
 
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search)
-            )
+        etag = make_etag('category', *row, *get_versions(('taxonomy', 'storefront')))
+        not_modified = check_not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        return set_validators(super().retrieve(request, *args, **kwargs), etag)
 
-        # Limitar a 20 resultados para autocomplete
-        queryset = queryset[:20]
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Endpoint para autocomplete sin paginación (ver autocomplete.py)"""
+        query, limit = get_autocomplete_params(request, default_limit=20)
+        return Response(autocomplete('category', query, limit, request))
 
-        # Serializar solo id y name para optimizar
-        data = [{'id': cat.id, 'name': cat.name, 'slug': cat.slug} for cat in queryset]
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """Árbol completo de categorías activas con conteos directos y del subárbol"""
+        tree = get_category_tree()
+        data = [serialize_category_node(tree, root_id, request) for root_id in tree['roots']]
         return Response(data)
 
     @action(detail=True, methods=['get'])
     def products(self, request, slug=None):
-        """Obtener productos de una categoría"""
-        category = self.get_object()
-        products = Product.objects.filter(
-            category=category,
-            is_active=True
-        )
+        """
+        Obtener productos de una categoría (opcionalmente de todo su subárbol).
+        La respuesta se cachea por categoría; el slug se resuelve con el árbol
+        cacheado, así que un acierto no consulta la base de datos.
+        """
+        include_descendants = request.query_params.get('include_descendants', '').lower() in ('1', 'true')
+        category_id = find_category_id(slug)
+        if category_id is None:
+            raise NotFound('Categoría no encontrada')
+
+        def build():
+            if include_descendants:
+                category_filter = {'category_id__in': get_descendant_ids(category_id)}
+            else:
+                category_filter = {'category_id': category_id}
+
+            products = get_catalog_queryset(Product.objects.filter(
+                is_active=True,
+                **category_filter
+            ))
+
+            serializer = ProductListSerializer(
+                products,
+                many=True,
+                context={'request': request}
+            )
+            return serializer.data
 
-        serializer = ProductListSerializer(
-            products,
-            many=True,
-            context={'request': request}
+        data = cached_response(
+            'category_products', request,
+            scopes=('taxonomy', f'category:{category_id}'),
+            build=build,
+            params=[('category', category_id), ('include_descendants', include_descendants)],
         )
-        return Response(serializer.data)
+        return Response(data)
 
 
 class BrandViewSet(viewsets.ModelViewSet):
@@ -100,19 +149,9 @@ class BrandViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def autocomplete(self, request):
-        """Endpoint para autocomplete sin paginación"""
-        search = request.query_params.get('search', '')
-        queryset = self.get_queryset()
-
-        if search:
-            queryset = queryset.filter(name__icontains=search)
-
-        # Limitar a 20 resultados para autocomplete
-        queryset = queryset[:20]
-
-        # Serializar solo id y name para optimizar
-        data = [{'id': brand.id, 'name': brand.name, 'slug': brand.slug} for brand in queryset]
-        return Response(data)
+        """Endpoint para autocomplete sin paginación (ver autocomplete.py)"""
+        query, limit = get_autocomplete_params(request, default_limit=20)
+        return Response(autocomplete('brand', query, limit, request))
 
 
 class ProductViewSet(viewsets.ModelViewSet):
@@ -120,17 +159,20 @@ class ProductViewSet(viewsets.ModelViewSet):
     API endpoint para productos con CRUD completo
     GET /api/products/ - Lista todos los productos
     POST /api/products/ - Crear producto (solo admin)
-    GET /api/products/{id}/ - Detalle de un producto (acepta ID o slug)
+    GET /api/products/{id}/ - Detalle de un producto (acepta ID o slug, con ETag)
     PUT/PATCH /api/products/{id}/ - Actualizar producto (solo admin)
     DELETE /api/products/{id}/ - Eliminar producto (solo admin)
+    GET /api/products/trending/ - Productos con más vistas por hora
+    GET /api/products/autocomplete/?q=term - Sugerencias para el buscador
     """
     queryset = Product.objects.all()
     permission_classes = [IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, ProductOrderingFilter]
     filterset_fields = ['category', 'brand', 'is_featured', 'is_active']
     search_fields = ['name', 'description', 'sku']
     ordering_fields = ['price', 'created_at', 'sales_count', 'name']
     ordering = ['-created_at']
+    cursor_ordering_fields = ('created_at', 'price', 'sales_count')
 
     def get_queryset(self):
         """
@@ -143,7 +185,8 @@ class ProductViewSet(viewsets.ModelViewSet):
         if not (self.request.user and self.request.user.is_staff):
             queryset = queryset.filter(is_active=True)
         
-        return queryset
+        # Anotaciones y joins del catálogo para evitar consultas por fila
+        return get_catalog_queryset(queryset, detail=self.action == 'retrieve')
 
     def get_object(self):
         """
@@ -180,17 +223,56 @@ class ProductViewSet(viewsets.ModelViewSet):
             return ProductDetailSerializer
         return ProductListSerializer
 
+    def list(self, request, *args, **kwargs):
+        """Listado paginado; con ?facets=true incluye conteos por faceta"""
+        queryset = self.filter_queryset(self.get_queryset())
+        facets = get_facets(queryset, request) if wants_facets(request) else None
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+        else:
+            serializer = self.get_serializer(queryset, many=True)
+            response = Response({'results': serializer.data} if facets is not None else serializer.data)
+
+        if facets is not None:
+            response.data['facets'] = facets
+        return response
+
     def retrieve(self, request, *args, **kwargs):
-        """Incrementar vistas al ver detalle del producto"""
+        """
+        Incrementar vistas al ver detalle del producto.
+        Responde 304 si el ETag coincide, sin cargar ni serializar el detalle.
+        """
+        row = self.get_lookup_row()
+
+        # Solo contar vistas si no es admin (se escriben en lote, ver counters.py)
+        if row and not (request.user and request.user.is_staff):
+            record_view(row[0])
+
+        etag = None
+        if row:
+            # El detalle incluye imágenes, variantes, reseñas, categoría, marca y relacionados;
+            # product:<id> cambia con el stock vendido en el checkout
+            etag = make_etag('product', *row, *get_versions(('storefront', 'taxonomy', f'product:{row[0]}')))
+            not_modified = check_not_modified(request, etag)
+            if not_modified:
+                return not_modified
+
         instance = self.get_object()
-        
-        # Solo incrementar vistas si no es admin
-        if not (request.user and request.user.is_staff):
-            instance.views += 1
-            instance.save(update_fields=['views'])
-        
         serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        return set_validators(response, etag) if etag else response
+
+    def get_lookup_row(self):
+        """(id, updated_at) del producto pedido, sin joins ni prefetch"""
+        lookup_value = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field or 'pk') or ''
+        queryset = Product.objects.all()
+        if not (self.request.user and self.request.user.is_staff):
+            queryset = queryset.filter(is_active=True)
+        lookup = {'id': int(lookup_value)} if lookup_value.isdigit() else {'slug': lookup_value}
+        return queryset.filter(**lookup).values_list('id', 'updated_at').first()
 
     def create(self, request, *args, **kwargs):
         """Crear producto"""
@@ -219,22 +301,54 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        """Obtener productos destacados"""
-        products = self.get_queryset().filter(is_featured=True, is_active=True)[:8]
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        """Obtener productos destacados (respuesta cacheada, ver cache.py)"""
+        def build():
+            products = get_catalog_queryset(Product.objects.filter(is_featured=True, is_active=True))[:8]
+            return ProductListSerializer(products, many=True, context={'request': request}).data
+
+        return Response(cached_response('featured', request, ('taxonomy', 'storefront'), build))
 
     @action(detail=False, methods=['get'])
     def on_sale(self, request):
-        """Obtener productos en oferta"""
-        products = self.get_queryset().filter(
-            is_active=True,
-            compare_price__isnull=False
-        ).exclude(
-            compare_price__lte=0
-        )[:12]
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        """Obtener productos en oferta (respuesta cacheada, ver cache.py)"""
+        def build():
+            products = get_catalog_queryset(Product.objects.filter(
+                is_active=True,
+                compare_price__isnull=False
+            ).exclude(
+                compare_price__lte=0
+            ))[:12]
+            return ProductListSerializer(products, many=True, context={'request': request}).data
+
+        return Response(cached_response('on_sale', request, ('taxonomy', 'storefront'), build))
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Sugerencias de productos para el buscador (sin paginación)"""
+        query, limit = get_autocomplete_params(request, default_limit=10)
+        return Response(autocomplete('product', query, limit, request))
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Productos con más vistas recientes (vistas por hora)"""
+        try:
+            limit = min(int(request.query_params.get('limit', 12)), 50)
+        except ValueError:
+            limit = 12
+
+        rates = get_view_rates()
+        trending_ids = get_trending_ids(limit)
+        products = {p.id: p for p in self.get_queryset().filter(id__in=trending_ids)}
+        ranked = [products[product_id] for product_id in trending_ids if product_id in products]
+
+        # Sin datos recientes: usar el total histórico de vistas
+        if not ranked:
+            ranked = list(self.get_queryset().order_by('-views')[:limit])
+
+        data = ProductListSerializer(ranked, many=True, context={'request': request}).data
+        for item in data:
+            item['views_per_hour'] = rates.get(item['id'], 0)
+        return Response(data)
 
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -247,12 +361,8 @@ class ProductViewSet(viewsets.ModelViewSet):
 
         products = self.get_queryset()
 
-        if query:
-            products = products.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(sku__icontains=query)
-            )
+        # Texto completo con ranking en PostgreSQL, icontains en otros motores
+        products = search_products(products, query)
 
         if min_price:
             products = products.filter(price__gte=min_price)
@@ -266,14 +376,20 @@ class ProductViewSet(viewsets.ModelViewSet):
         if brand_id:
             products = products.filter(brand_id=brand_id)
 
+        facets = get_facets(products, request, scope='search') if wants_facets(request) else None
+
         # Paginar resultados
         page = self.paginate_queryset(products)
         if page is not None:
             serializer = ProductListSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
+            response = self.get_paginated_response(serializer.data)
+        else:
+            serializer = ProductListSerializer(products, many=True, context={'request': request})
+            response = Response({'results': serializer.data} if facets is not None else serializer.data)
 
-        serializer = ProductListSerializer(products, many=True, context={'request': request})
-        return Response(serializer.data)
+        if facets is not None:
+            response.data['facets'] = facets
+        return response
 
 
 class ReviewViewSet(viewsets.ModelViewSet):
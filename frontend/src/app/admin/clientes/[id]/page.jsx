@@ -243,7 +243,7 @@ export default function ClienteDetailPage() {
                                                             {new Date(order.created_at).toLocaleDateString('es-PE')}
                                                         </span>
                                                         <span>•</span>
-                                                        <span>{order.items?.length || 0} productos</span>
+                                                        <span>{order.item_count || 0} productos</span>
                                                     </div>
                                                 </div>
                                                 <div className="flex items-center space-x-4">
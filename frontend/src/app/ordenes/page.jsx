@@ -164,29 +164,28 @@ export default function OrdersPage() {
                                         <div className="flex-1 mb-4 lg:mb-0">
                                             <div className="flex items-center space-x-4">
                                                 <div className="flex -space-x-2">
-                                                    {order.items.slice(0, 3).map((item, index) => (
+                                                    {order.first_item && (
                                                         <div
-                                                            key={item.id}
                                                             className="relative w-12 h-12 bg-gray-200 rounded-lg border-2 border-white overflow-hidden"
-                                                            style={{ zIndex: 3 - index }}
+                                                            style={{ zIndex: 1 }}
                                                         >
                                                             <Image
-                                                                src={item.product_detail?.primary_image || '/placeholder.png'}
-                                                                alt={item.product_name}
+                                                                src={order.first_item.primary_image || '/placeholder.png'}
+                                                                alt={order.first_item.product_name}
                                                                 fill
                                                                 className="object-cover"
                                                             />
                                                         </div>
-                                                    ))}
-                                                    {order.items.length > 3 && (
+                                                    )}
+                                                    {order.item_count > 1 && (
                                                         <div className="relative w-12 h-12 bg-gray-300 rounded-lg border-2 border-white flex items-center justify-center text-sm font-semibold text-gray-600">
-                                                            +{order.items.length - 3}
+                                                            +{order.item_count - 1}
                                                         </div>
                                                     )}
                                                 </div>
                                                 <div>
                                                     <p className="font-medium text-gray-900">
-                                                        {order.items.length} {order.items.length === 1 ? 'producto' : 'productos'}
+                                                        {order.item_count} {order.item_count === 1 ? 'producto' : 'productos'}
                                                     </p>
                                                     <p className="text-sm text-gray-600">
                                                         {order.payment_method_display}